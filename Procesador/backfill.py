@@ -0,0 +1,163 @@
+import os
+import glob
+import logging
+import argparse
+from collections import deque
+from datetime import datetime, timezone
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from netCDF4 import Dataset
+
+from src.helpers import GetRegionExtent, GetRegionMask, LoadDictionary, GetScanStartTime
+from src.acumulador import PersistenciaMovil
+from src.render import CrearSnapshot, GetImageMetadata, RenderizarMapa
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+json_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/conf/SMN_dict.conf")
+confData = LoadDictionary(json_file_path)
+
+
+def leer_mascara(image_file, extent, umbral):
+    """
+    Lee, recorta y umbraliza una imagen. Se ejecuta en los procesos del pool.
+
+    :return: Tupla (máscara empaquetada por filas, ancho, img_extent, metadatos de la imagen).
+    """
+    with Dataset(image_file, 'r') as netCDFread:
+        img_extent, mascara = GetRegionMask(netCDFread, confData, extent, umbral)
+        metadata = GetImageMetadata(netCDFread)
+    return np.packbits(mascara, axis=1), mascara.shape[1], img_extent, metadata
+
+
+def leer_mascara_o_nada(image_file, extent, umbral):
+    """
+    Como leer_mascara, pero un archivo que no se puede leer se informa y devuelve None
+    en lugar de interrumpir el backfill.
+    """
+    try:
+        return leer_mascara(image_file, extent, umbral)
+    except Exception as e:
+        logging.error(f"No se pudo leer {image_file}, se omite: {e}")
+        return None
+
+
+def filtrar_leidos(archivos, leidos, previas):
+    """
+    Descarta los archivos que no se pudieron leer y los que tienen un recorte de otra
+    forma que el primero leído, y ajusta cuántos archivos solo completan la ventana.
+
+    :param archivos: Archivos en orden cronológico.
+    :param leidos: Resultado de leer_mascara_o_nada para cada archivo (None si falló).
+    :param previas: Cantidad de archivos iniciales que solo completan la ventana.
+    :return: Tupla (archivos, leidos, previas) con solo los archivos válidos.
+    """
+    referencia = next((leido for leido in leidos if leido is not None), None)
+    validos = []
+    for i, (image_file, leido) in enumerate(zip(archivos, leidos)):
+        if leido is not None and (leido[0].shape, leido[1]) != (referencia[0].shape, referencia[1]):
+            logging.error(f"El recorte de {image_file} tiene forma {leido[0].shape} y se esperaba {referencia[0].shape}; se omite.")
+            leido = None
+        if leido is None:
+            previas -= i < previas
+            continue
+        validos.append((image_file, leido))
+    return [f for f, _ in validos], [leido for _, leido in validos], previas
+
+
+def esperar_render(future):
+    try:
+        future.result()
+        return 1
+    except Exception as e:
+        logging.error(f"Error al renderizar el mapa: {e}")
+        return 0
+
+
+def parse_fecha(texto):
+    return datetime.strptime(texto, '%Y-%m-%dT%H:%M').replace(tzinfo=timezone.utc)
+
+
+def seleccionar_archivos(entrada, desde, hasta, ventana):
+    """
+    Devuelve los archivos a leer, en orden cronológico, y cuántos de ellos solo
+    completan la ventana de la primera imagen pedida.
+    """
+    archivos = [(GetScanStartTime(f), f) for f in glob.glob(os.path.join(entrada, '*.nc'))]
+    archivos = sorted((t, f) for t, f in archivos if t is not None and (hasta is None or t <= hasta))
+    primero = next((i for i, (t, _) in enumerate(archivos) if desde is None or t >= desde), len(archivos))
+    inicio = max(0, primero - (ventana - 1))
+    return [f for _, f in archivos[inicio:]], primero - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera los mapas de permanencia de un período histórico.')
+    parser.add_argument('--entrada', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), confData['inbox']),
+                        help='Directorio con los archivos GOES (por defecto, el inbox).')
+    parser.add_argument('--desde', type=parse_fecha, default=None, help='Primera imagen a generar (AAAA-MM-DDTHH:MM, UTC).')
+    parser.add_argument('--hasta', type=parse_fecha, default=None, help='Última imagen a generar (AAAA-MM-DDTHH:MM, UTC).')
+    parser.add_argument('--salida', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), confData['workdir'], 'backfill'),
+                        help='Directorio de salida de los mapas.')
+    parser.add_argument('--region', default='ARG')
+    parser.add_argument('--umbral', type=float, default=-53, help='Umbral de temperatura de brillo en °C.')
+    parser.add_argument('--ventana', type=int, default=144, help='Cantidad de imágenes de la ventana (144 = 24 horas).')
+    parser.add_argument('--cada', type=int, default=1, help='Generar un mapa cada N imágenes.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Procesos para lectura y render.')
+    parser.add_argument('--bloque', type=int, default=36, help='Imágenes de salida por bloque de cálculo.')
+    parser.add_argument('--filas', type=int, default=256, help='Filas por bloque de cálculo.')
+    args = parser.parse_args()
+
+    extent = GetRegionExtent(confData, args.region)
+    if extent is None:
+        return
+    archivos, previas = seleccionar_archivos(args.entrada, args.desde, args.hasta, args.ventana)
+    if len(archivos) <= previas:
+        logging.warning("No se encontraron archivos en el período pedido.")
+        return
+    os.makedirs(args.salida, exist_ok=True)
+    logging.info(f"Leyendo {len(archivos)} archivos ({previas} solo para completar la ventana inicial).")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # 1. Lectura y umbralizado en paralelo: cubo temporal de máscaras empaquetadas por filas
+        leidos = list(executor.map(partial(leer_mascara_o_nada, extent=extent, umbral=args.umbral), archivos, chunksize=4))
+        archivos, leidos, previas = filtrar_leidos(archivos, leidos, previas)
+        if len(archivos) <= previas:
+            logging.warning("No se pudo leer ningún archivo del período pedido.")
+            return
+        cubo = np.stack([packed for packed, _, _, _ in leidos])
+        ancho = leidos[0][1]
+        n_tiempos, n_filas = cubo.shape[0], cubo.shape[1]
+
+        # 2. Conteos de la ventana móvil por bloques de tiempo y de filas, con sumas acumuladas
+        renders = deque()
+        generados = 0
+        for b0 in range(previas, n_tiempos, args.bloque):
+            b1 = min(b0 + args.bloque, n_tiempos)
+            s0 = max(0, b0 - (args.ventana - 1))
+            conteos = np.empty((b1 - b0, n_filas, ancho), dtype=np.uint8 if args.ventana <= 255 else np.uint16)
+            for r0 in range(0, n_filas, args.filas):
+                r1 = min(r0 + args.filas, n_filas)
+                mascaras = np.unpackbits(cubo[s0:b1, r0:r1], axis=2, count=ancho)
+                conteos[:, r0:r1] = PersistenciaMovil(mascaras, args.ventana, previas=b0 - s0)
+
+            # 3. Render en paralelo de los mapas pedidos
+            for t in range(b0, b1):
+                if (t - previas) % args.cada:
+                    continue
+                _, _, img_extent, metadata = leidos[t]
+                scan_time = GetScanStartTime(archivos[t])
+                output_path = os.path.join(args.salida, f"permanencia_{scan_time.strftime('%Y%m%d_%H%M%S')}.png")
+                renders.append(executor.submit(RenderizarMapa, CrearSnapshot(conteos[t - b0], metadata, img_extent, extent, output_path), confData))
+                # Se acota la cantidad de fotos en vuelo para no retener en memoria todo el período
+                while len(renders) > 2 * args.workers:
+                    generados += esperar_render(renders.popleft())
+            logging.info(f"Conteos calculados hasta la imagen {b1} de {n_tiempos}.")
+
+        while renders:
+            generados += esperar_render(renders.popleft())
+    logging.info(f"Backfill completado: {generados} mapas en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
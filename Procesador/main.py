@@ -1,20 +1,24 @@
 import os
+import sys
 import json
 import logging
-import numpy as np
-from netCDF4 import Dataset
 from datetime import datetime
-import matplotlib
 import glob
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import time
-from PIL import Image
 
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-from src.helpers import GetCroppedImage, GetPlotObject, GetCalibratedImage, LoadDictionary, AddImageFoot, AddLogo
+from src.helpers import LoadDictionary, GetScanStartTime
+from src.acumulador import AcumuladorPersistencia
+from src.almacen import AlmacenAcumulado
+from src.animacion import Animacion
+from src.render import CrearSnapshot, GetImageMetadata, RenderizadorAsincrono
+from src.productos import AgrupadorEscaneos, BandasRequeridas, CalcularProductos, EscaneoMultibanda, NombreCapaUmbral
+from src.regiones import RegistroRegiones, Vista
+
+# Las métricas se comparten con la descarga desde la raíz del proyecto
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import metricas  # noqa: E402
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -23,6 +27,7 @@ confData = LoadDictionary(json_file_path)
 workdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), confData['workdir'])
 inboxdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), confData['inbox'])
 gif_path = os.path.join(workdir, 'conae.gif')
+statedir = os.path.join(workdir, 'estado')
 
 if not os.path.exists(workdir):
     os.makedirs(workdir)
@@ -32,168 +37,235 @@ if not os.path.exists(inboxdir):
 logging.info(f"Directorio de trabajo: {workdir}")
 logging.info(f"Directorio de entrada: {inboxdir}")
 
-T_U = -53  # Umbral de temperatura de brillo
+T_U = -53  # Umbral de temperatura de brillo por omisión
 num_images_initial = 6  # Número de imágenes para acumulado inicial
 num_images_max = 144  # Número de imágenes para 24 horas
 
-# Inicialización de matrices globales
-accum_data = None
-image_queue = []
-
-
-
-def actualizar_gif(imagenes, gif_path):
+# Productos calculados de cada escaneo; el de tipo 'permanencia' alimenta el acumulador
+productos = confData.get('productos', {'permanencia': {'tipo': 'permanencia', 'banda': 13, 'umbral': T_U}})
+producto_permanencia = next(nombre for nombre, parametros in productos.items() if parametros['tipo'] == 'permanencia')
+# Con una lista de 'umbrales' el acumulador lleva un plano de conteo por umbral, calculados con una sola
+# calibración del recorte; el mapa y la animación usan el plano de 'umbral' (o el primero de la lista)
+umbrales = productos[producto_permanencia].get('umbrales')
+umbral_mapa = productos[producto_permanencia].get('umbral', T_U)
+plano_mapa = umbrales.index(umbral_mapa) if umbrales and umbral_mapa in umbrales else 0
+bandas = BandasRequeridas(productos)
+agrupador = AgrupadorEscaneos(bandas)
+logging.info(f"Productos: {', '.join(productos)} (bandas {bandas})")
+
+# Regiones de salida: cada escaneo se procesa una vez sobre su unión y cada región es una vista del acumulado.
+# Los mapas de la región principal van a workdir y los de las demás a workdir/<región>, cada una con su animación
+regiones = RegistroRegiones(confData, confData.get('regiones'))
+
+# El acumulador, las animaciones y el pool de render se crean en iniciar(), no al importar el
+# módulo, para que el procesador pueda ejecutarse dentro de otro proceso (run_all.py)
+acumulador = None
+almacen = None
+animaciones = {}
+renderizador = None
+
+# Reloj UTC de las latencias; run_all.py lo reemplaza por el de la descarga al reproducir un espejo local
+reloj = datetime.utcnow
+
+
+def directorio_region(nombre):
     """
-    Actualiza el GIF con una lista de imágenes y una duración específica entre cuadros usando Pillow.
-
-    :param imagenes: Lista de rutas a las imágenes.
-    :param gif_path: Ruta del archivo GIF de salida.
+    Devuelve el directorio de los mapas y la animación de una región.
     """
-    # Leer la duración desde el archivo de configuración o fijar un valor predeterminado
-    frame_duration = confData.get('gif_frame_duration', 1.0)  # Valor predeterminado: 1.0 segundos si no está definido
-    frame_duration_ms = int(frame_duration * 1000)  # Convertir segundos a milisegundos
+    return workdir if nombre == regiones.principal else os.path.join(workdir, nombre)
 
-    logging.info(f"Configurando duración por cuadro en {frame_duration} segundos.")
 
-    try:
-        # Cargar todas las imágenes usando PIL
-        frames = [Image.open(imagen) for imagen in imagenes]
-
-        if frames:
-            # Crear el GIF usando PIL, especificando la duración entre cuadros
-            frames[0].save(
-                gif_path,
-                save_all=True,
-                append_images=frames[1:],
-                duration=frame_duration_ms,  # Duración en milisegundos
-                loop=0  # Repetir infinitamente
-            )
-            logging.info(f"GIF generado correctamente: {gif_path}")
-        else:
-            logging.warning("No se encontraron imágenes para generar el GIF.")
-    except Exception as e:
-        logging.error(f"Error al generar el GIF: {e}")
+def agrupar_inbox(files):
+    """
+    Agrupa los archivos del inbox por escaneo y devuelve los escaneos completos en orden cronológico.
+    """
+    grupos = {}
+    for image_file in files:
+        grupo = agrupador.agregar(image_file)
+        if grupo is not None:
+            grupos[GetScanStartTime(image_file)] = grupo
+    return [grupos[t] for t in sorted(grupos)]
 
 
+def calcular_escaneo(archivos, extent):
+    """
+    Abre las bandas de un escaneo y calcula todos los productos con un único recorte.
 
-def inicializar_acumulado():
-    global accum_data, image_queue
+    :return: Tupla (escaneo abierto, máscaras por producto). El escaneo debe cerrarse.
+    """
+    escaneo = EscaneoMultibanda(archivos, confData, extent, metricas=metricas.REGISTRO)
+    try:
+        return escaneo, CalcularProductos(escaneo, productos)
+    except Exception:
+        escaneo.cerrar()
+        raise
 
-    files = sorted(glob.glob(os.path.join(inboxdir, '*.nc')))[:num_images_initial]
 
-    if not files:
-        logging.warning("No se encontraron archivos iniciales para procesar.")
-        return
+def acumular(mascara, tiempo):
+    """
+    Agrega la máscara de permanencia de un escaneo a la ventana. Si la ventana guardada tiene
+    otra forma (cambió la región o la lista de umbrales), se descarta y se empieza de nuevo.
+    """
+    if acumulador.forma is not None and acumulador.forma != mascara.shape:
+        logging.warning(f"La ventana guardada {acumulador.forma} no coincide con las máscaras {mascara.shape}; se descarta.")
+        acumulador.descartar()
+    acumulador.agregar(mascara, tiempo)
 
-    for image_file in files:
-        logging.info(f'Procesando archivo inicial {image_file}')
-        netCDFread = Dataset(image_file, 'r')
-        region = 'ARG'
-        if region == 'SuA_ARG':
-            extent = [confData['sudamerica_lon_W'], confData['sudamerica_lon_E'], confData['sudamerica_lat_S'], confData['sudamerica_lat_N']]
-        elif region == 'SuA':
-            extent = [confData['sudamerica_lon_W'], confData['sudamerica_lon_E'], confData['sudamerica_lat_S'], confData['sudamerica_lat_N']]
-        elif region == 'ARG':
-            extent = [confData['argentina_lon_W'], confData['argentina_lon_E'], confData['argentina_lat_S'], confData['argentina_lat_N']]
-        else:
-            logging.error('Debe seleccionar una de las siguientes áreas: SuA_ARG, SuA, ARG, custom!')
-            return
 
-        img_extent, img_indexes = GetCroppedImage(netCDFread, 
-                                    extent[0] + confData['delta_lon_W_for_graph'],
-                                    extent[1],
-                                    extent[2] + confData['delta_lat_S_for_graph'],
-                                    extent[3] + confData['delta_lat_N_for_graph'])
-
-        imagedata = netCDFread.variables['Rad'][img_indexes[2]:img_indexes[3], img_indexes[0]:img_indexes[1]][::1,::1]
-        image_cal, _ = GetCalibratedImage(netCDFread, imagedata)
-        del imagedata
-
-        new_data = np.where(image_cal < T_U, 1, 0)
-
-        if accum_data is None:
-            accum_data = np.zeros_like(new_data)
-        
-        accum_data += new_data
-        image_queue.append(new_data)
-        logging.info(f"Archivo {image_file} procesado y acumulado inicial actualizado.")
-
-def update_accumulation(new_image_path):
-    global accum_data, image_queue
-
-    logging.info(f'Procesando nueva imagen {new_image_path}')
-    netCDFread = Dataset(new_image_path, 'r')
-
-    region = 'ARG'
-    if region == 'SuA_ARG':
-        extent = [confData['sudamerica_lon_W'], confData['sudamerica_lon_E'], confData['sudamerica_lat_S'], confData['sudamerica_lat_N']]
-    elif region == 'SuA':
-        extent = [confData['sudamerica_lon_W'], confData['sudamerica_lon_E'], confData['sudamerica_lat_S'], confData['sudamerica_lat_N']]
-    elif region == 'ARG':
-        extent = [confData['argentina_lon_W'], confData['argentina_lon_E'], confData['argentina_lat_S'], confData['argentina_lat_N']]
-    else:
-        logging.error('Debe seleccionar una de las siguientes áreas: SuA_ARG, SuA, ARG, custom!')
-        return
+def conteo_mapa():
+    """
+    Devuelve el conteo del umbral que se muestra en el mapa.
+    """
+    return acumulador.conteo[plano_mapa] if umbrales else acumulador.conteo
 
-    img_extent, img_indexes = GetCroppedImage(netCDFread, 
-                                extent[0] + confData['delta_lon_W_for_graph'],
-                                extent[1],
-                                extent[2] + confData['delta_lat_S_for_graph'],
-                                extent[3] + confData['delta_lat_N_for_graph'])
 
-    imagedata = netCDFread.variables['Rad'][img_indexes[2]:img_indexes[3], img_indexes[0]:img_indexes[1]][::1,::1]
-    image_cal, _ = GetCalibratedImage(netCDFread, imagedata)
-    del imagedata
+def capas_conteo():
+    """
+    Devuelve las capas del conteo para el almacén: 'conteo' (el del mapa) y una por umbral.
+    """
+    capas = {'conteo': conteo_mapa()}
+    if umbrales:
+        capas.update((NombreCapaUmbral(umbral), acumulador.conteo[i]) for i, umbral in enumerate(umbrales))
+    return capas
 
-    new_data = np.where(image_cal < T_U, 1, 0)
 
-    if len(image_queue) >= num_images_max:
-        oldest_data = image_queue.pop(0)
-        accum_data -= oldest_data
+def inicializar_acumulado():
+    files = sorted(glob.glob(os.path.join(inboxdir, '*.nc')))
+    ultimo = acumulador.ultimo_tiempo()
+    if ultimo is not None:
+        # Ventana reanudada: solo se procesan las imágenes posteriores a la última acumulada
+        files = [f for f in files if GetScanStartTime(f) is None or GetScanStartTime(f).timestamp() > ultimo]
+        escaneos = agrupar_inbox(files)
+        logging.info(f"Acumulado reanudado con {len(acumulador)} imágenes; {len(escaneos)} escaneos nuevos en el inbox.")
+    elif len(acumulador) > 0:
+        logging.info(f"Acumulado reanudado con {len(acumulador)} imágenes.")
+        return
+    else:
+        escaneos = agrupar_inbox(files)[:num_images_initial]
 
-    accum_data += new_data
-    image_queue.append(new_data)
+    if not escaneos:
+        logging.warning("No se encontraron archivos iniciales para procesar.")
+        return
 
-    # Guardar el nuevo acumulado
-    np.save(os.path.join(workdir, 'accum.npy'), accum_data)
+    for archivos in escaneos:
+        logging.info(f'Procesando escaneo inicial {sorted(archivos.values())}')
+        escaneo, mascaras = calcular_escaneo(archivos, regiones.union)
+        escaneo.cerrar()
 
-    # Crear y guardar la imagen actualizada
-    accum_hours = accum_data * (10 / 60.0)  # Cada imagen representa 10 minutos
+        acumular(mascaras[producto_permanencia], escaneo.tiempo())
+        logging.info(f"Escaneo {escaneo.tiempo()} procesado y acumulado inicial actualizado.")
 
-    crs = ccrs.Geostationary(central_longitude=netCDFread.variables['goes_imager_projection'].longitude_of_projection_origin, satellite_height=netCDFread.variables['goes_imager_projection'].perspective_point_height)
+def update_accumulation(archivos):
+    logging.info(f'Procesando nuevo escaneo {sorted(archivos.values())}')
 
-    fig = plt.figure(clear=True)
-    fig.set_size_inches(np.shape(accum_hours)[1] / confData['figure_resolution_dpi'], np.shape(accum_hours)[0] / confData['figure_resolution_dpi'])
-    ax = GetPlotObject(confData, extent)
+    escaneo, mascaras = calcular_escaneo(archivos, regiones.union)
+    try:
+        with metricas.REGISTRO.medir('acumulacion'):
+            acumular(mascaras[producto_permanencia], escaneo.tiempo())
+
+        # Guardar el nuevo acumulado y la última máscara de los demás productos, solo en los tiles que cambiaron
+        banda = productos[producto_permanencia].get('banda', 13)
+        capas = capas_conteo()
+        capas.update((nombre, mascara) for nombre, mascara in mascaras.items() if nombre != producto_permanencia)
+        with metricas.REGISTRO.medir('guardado_acumulado'):
+            almacen.escribir(capas, escaneo.tiempo(), escaneo.georreferencia(banda))
+
+        # El render y la animación se hacen fuera del hilo de ingesta, a partir de una foto de la vista
+        # del acumulador de cada región
+        scan_time = escaneo.tiempo() or datetime.now()
+        metadata = GetImageMetadata(escaneo.dataset(banda))
+        conteo = conteo_mapa()
+        for nombre, ventana in regiones.ventanas(escaneo, banda).items():
+            output_path = os.path.join(directorio_region(nombre), f"permanencia_{scan_time.strftime('%Y%m%d_%H%M%S')}.png")
+            renderizador.enviar(CrearSnapshot(Vista(conteo, ventana), metadata, ventana[2], regiones.extents[nombre],
+                                              output_path))
+    finally:
+        escaneo.cerrar()
+
+
+def publicar_mapa(output_path):
+    """
+    Agrega el mapa generado a la animación de su región. Se llama en el orden de ingesta de las imágenes.
+    """
+    animacion = animaciones[os.path.dirname(output_path)]
+    with metricas.REGISTRO.medir('gif'):
+        animacion.agregar(output_path)
+        animacion.guardar()
+    # Demora desde el inicio del escaneo hasta que el mapa queda publicado
+    try:
+        scan_time = datetime.strptime(os.path.basename(output_path), 'permanencia_%Y%m%d_%H%M%S.png')
+        metricas.REGISTRO.registrar_latencia('png', (reloj() - scan_time).total_seconds())
+    except ValueError:
+        pass
 
-    # Fondo blanco
-    ax.set_facecolor('white')
 
-    # Ajustar la escala de colores para 24 horas
-    cmap = matplotlib.colors.ListedColormap(['white', 'lightblue', 'blue', 'green', 'yellow', 'orange', 'red', 'darkred'])
-    bounds = [0, 2, 4, 6, 8, 12, 16, 20, 24]
-    norm = matplotlib.colors.BoundaryNorm(bounds, cmap.N)
+def iniciar():
+    """
+    Carga el acumulado (o lo inicializa con el inbox), las animaciones y el pool de render.
+    """
+    global acumulador, almacen, renderizador
+    # Ventana deslizante de 24 horas con las máscaras empaquetadas y el conteo por píxel,
+    # persistida en workdir/estado para reanudar sin volver a procesar el inbox
+    acumulador = AcumuladorPersistencia(num_images_max, statedir)
+
+    # Acumulado georreferenciado, en tiles comprimidos y con overviews, para los usuarios de SIG
+    conf_almacen = confData.get('almacen', {})
+    almacen = AlmacenAcumulado(os.path.join(workdir, conf_almacen.get('archivo', 'acumulado.nc')),
+                               tamano_tile=conf_almacen.get('tamano_tile', 256),
+                               nivel_compresion=conf_almacen.get('nivel_compresion', 4),
+                               overviews=conf_almacen.get('overviews', [2, 4, 8]))
+
+    # Una animación por región con los últimos mapas generados, con los cuadros ya decodificados en memoria
+    animaciones.clear()
+    for nombre in regiones:
+        directorio = directorio_region(nombre)
+        os.makedirs(directorio, exist_ok=True)
+        animaciones[directorio] = Animacion(gif_path if nombre == regiones.principal else os.path.join(directorio, 'conae.gif'),
+                                            max_frames=confData.get('gif_max_frames', num_images_max),
+                                            frame_duration=confData.get('gif_frame_duration', 1.0),
+                                            scale=confData.get('gif_scale', 1.0),
+                                            formato=confData.get('animation_format', 'gif'))
+
+    # Render en un pool de procesos alimentado por una cola acotada
+    renderizador = RenderizadorAsincrono(confData, publicar_mapa,
+                                         workers=confData.get('render_workers', 2),
+                                         queue_size=confData.get('render_queue_size', 4),
+                                         metricas=metricas.REGISTRO)
+    metricas.REGISTRO.medidor('cola_render', 'Mapas en espera de ser renderizados.', renderizador.pendientes)
 
-    img = ax.imshow(accum_hours, transform=crs, extent=img_extent, origin='upper', cmap=cmap, norm=norm, aspect='auto')
-    cbar = plt.colorbar(img, ax=ax, fraction=0.02, pad=0.04, boundaries=bounds, ticks=bounds)
-    cbar.set_label('Horas de permanencia')
+    inicializar_acumulado()
+    for directorio, animacion in animaciones.items():
+        animacion.cargar(sorted(glob.glob(os.path.join(directorio, 'permanencia_*.png'))))
 
-    # Obtener la fecha y hora del archivo NetCDF
-    timestamp = netCDFread.time_coverage_start
-    # Ajustar el formato de fecha y hora para eliminar las fracciones de segundo
-    if '.' in timestamp:
-        timestamp = timestamp.split('.')[0] + 'Z'
-    formatted_timestamp = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').strftime('%d/%m/%Y-%H:%Mhs')
-    title = f"Mapa de permanencia de topes de nubes {formatted_timestamp}"
-    AddImageFoot(ax, title, size=8.0)
-    AddLogo(ax)
 
-    output_path = os.path.join(workdir, f"permanencia_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-    plt.savefig(output_path, dpi=confData['figure_resolution_dpi'])
-    logging.info(f"Imagen guardada en {output_path}")
+def procesar_archivo(path):
+    """
+    Agrega un archivo nuevo del inbox a su escaneo y, si el escaneo quedó completo, lo procesa.
 
-    imagenes_existentes = sorted(glob.glob(os.path.join(workdir, '*.png')))
-    actualizar_gif(imagenes_existentes, gif_path)
+    :param path: Ruta del archivo en el inbox.
+    :return: True si se procesó un escaneo.
+    """
+    archivos = agrupador.agregar(path)
+    if archivos is None:
+        return False
+    tiempo = GetScanStartTime(path)
+    ultimo = acumulador.ultimo_tiempo()
+    if ultimo is not None and tiempo is not None and tiempo.timestamp() <= ultimo:
+        # Ya acumulado (por ejemplo, en la inicialización con el inbox)
+        logging.info(f"Se omite el escaneo {tiempo}: ya está acumulado.")
+        return False
+    update_accumulation(archivos)
+    return True
+
+
+def cerrar():
+    """
+    Termina de renderizar los mapas pendientes, libera el pool de render y cierra el almacén del acumulado.
+    """
+    if renderizador is not None:
+        renderizador.cerrar()
+    if almacen is not None:
+        almacen.cerrar()
 
 
 class NewImageHandler(FileSystemEventHandler):
@@ -202,13 +274,17 @@ class NewImageHandler(FileSystemEventHandler):
             return
         if event.src_path.endswith('.nc'):
             logging.info("Esperando nueva imagen para la generación del mapa.")
-            update_accumulation(event.src_path)
-            logging.info("Generando mapa.")
-            logging.info("Mapa generado. Esperando nueva imagen para la generación del mapa.")
+            # Se procesa cuando llegan todas las bandas del escaneo
+            if procesar_archivo(event.src_path):
+                logging.info("Mapa generado. Esperando nueva imagen para la generación del mapa.")
 
-if __name__ == "__main__":
+
+def main():
+    """
+    Procesa las imágenes que aparecen en el inbox, detectadas con watchdog.
+    """
     logging.info("Inicio del procesamiento de archivos.")
-    inicializar_acumulado()
+    iniciar()
     observer = Observer()
     event_handler = NewImageHandler()
     observer.schedule(event_handler, inboxdir, recursive=False)
@@ -219,9 +295,20 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
+    cerrar()
     logging.info("Procesamiento de archivos completado.")
 
 
+if __name__ == "__main__":
+    # Endpoint Prometheus y archivo rotativo de métricas, si están habilitados en SMN_dict.conf
+    exportadores = metricas.IniciarExportacion(confData.get('metricas', {}), os.path.dirname(os.path.abspath(__file__)))
+    try:
+        main()
+    finally:
+        for exportador in exportadores:
+            exportador.cerrar()
+
+
 
 
 
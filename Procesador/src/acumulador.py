@@ -0,0 +1,241 @@
+import os
+import json
+import numpy as np
+import logging
+
+
+class AcumuladorPersistencia:
+    """
+    Ventana deslizante de máscaras binarias para el mapa de permanencia.
+
+    Cada máscara se guarda empaquetada a 1 bit por píxel (np.packbits) en un
+    anillo de tamaño fijo, y un contador entero (uint8 o uint16 según la
+    capacidad) lleva la suma de las máscaras presentes en la ventana. Agregar
+    una máscara y descartar la más antigua cuesta lo mismo sin importar
+    cuántas máscaras haya en la ventana.
+
+    Si se indica un directorio, el anillo, los tiempos de cada máscara y el
+    contador viven en archivos .npy mapeados en memoria y una cabecera JSON,
+    reemplazada de forma atómica en cada actualización, indica qué lugares son
+    válidos. El anillo tiene un lugar libre extra y el contador dos planos: la
+    máscara nueva y el contador actualizado se escriben en el lugar y el plano
+    libres antes de confirmar la cabecera, de modo que una caída a mitad de
+    camino deja siempre la ventana anterior intacta y al reanudar no hace falta
+    desempaquetar el anillo.
+    """
+
+    CABECERA = 'acumulador.json'
+    ANILLO = 'acumulador_anillo.npy'
+    TIEMPOS = 'acumulador_tiempos.npy'
+    CONTEO = 'acumulador_conteo.npy'
+
+    def __init__(self, capacidad, directorio=None):
+        """
+        :param capacidad: Cantidad máxima de máscaras en la ventana (144 para 24 horas).
+        :param directorio: Directorio donde persistir el estado, o None para mantenerlo solo en memoria.
+        """
+        self.capacidad = capacidad
+        self.lugares = capacidad + 1
+        self.dtype = np.uint8 if capacidad <= np.iinfo(np.uint8).max else np.uint16
+        self.directorio = directorio
+        self.forma = None
+        self.anillo = None
+        self.tiempos = None
+        self.conteo = None
+        self.conteos = None
+        self.plano = 0
+        self.inicio = 0
+        self.cantidad = 0
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+            self._cargar()
+
+    def __len__(self):
+        return self.cantidad
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def _reservar(self, forma):
+        self.forma = tuple(forma)
+        nbytes = (int(np.prod(self.forma)) + 7) // 8
+        if self.directorio is None:
+            self.anillo = np.zeros((self.lugares, nbytes), dtype=np.uint8)
+            self.tiempos = np.zeros(self.lugares, dtype=np.int64)
+        else:
+            self.anillo = np.lib.format.open_memmap(self._ruta(self.ANILLO), mode='w+', dtype=np.uint8, shape=(self.lugares, nbytes))
+            self.tiempos = np.lib.format.open_memmap(self._ruta(self.TIEMPOS), mode='w+', dtype=np.int64, shape=(self.lugares,))
+            self.conteos = np.lib.format.open_memmap(self._ruta(self.CONTEO), mode='w+', dtype=self.dtype, shape=(2,) + self.forma)
+        self.plano = 0
+        self.conteo = self.conteos[0] if self.conteos is not None else np.zeros(self.forma, dtype=self.dtype)
+        logging.info(f"Acumulador reservado: {self.capacidad} máscaras de {self.forma} ({self.anillo.nbytes / 2**20:.1f} MB empaquetados)")
+
+    def _cargar(self):
+        try:
+            with open(self._ruta(self.CABECERA), 'r') as f:
+                cabecera = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.error(f"Cabecera del acumulador ilegible, se descarta el estado guardado: {e}")
+            self._reiniciar()
+            return
+        if cabecera.get('capacidad') != self.capacidad:
+            logging.warning(f"El estado guardado tiene capacidad {cabecera.get('capacidad')} y se esperaba {self.capacidad}; se descarta.")
+            self._reiniciar()
+            return
+        try:
+            forma = tuple(int(n) for n in cabecera['forma'])
+            inicio, cantidad = int(cabecera['inicio']), int(cabecera['cantidad'])
+            nbytes = (int(np.prod(forma)) + 7) // 8
+            anillo = np.load(self._ruta(self.ANILLO), mmap_mode='r+')
+            tiempos = np.load(self._ruta(self.TIEMPOS), mmap_mode='r+')
+            if anillo.shape != (self.lugares, nbytes) or anillo.dtype != np.uint8:
+                raise ValueError(f"anillo {anillo.shape} {anillo.dtype}, se esperaba {(self.lugares, nbytes)} uint8")
+            if tiempos.shape != (self.lugares,) or tiempos.dtype != np.int64:
+                raise ValueError(f"tiempos {tiempos.shape} {tiempos.dtype}, se esperaba {(self.lugares,)} int64")
+            if not (0 <= inicio < self.lugares and 0 <= cantidad <= self.capacidad):
+                raise ValueError(f"inicio {inicio} y cantidad {cantidad} fuera del anillo")
+            conteos = None
+            if os.path.exists(self._ruta(self.CONTEO)):
+                conteos = np.load(self._ruta(self.CONTEO), mmap_mode='r+')
+                if conteos.shape != (2,) + forma or conteos.dtype != self.dtype or cabecera.get('plano') not in (0, 1):
+                    raise ValueError(f"conteo {conteos.shape} {conteos.dtype}, se esperaba {(2,) + forma} {np.dtype(self.dtype)}")
+        except Exception as e:
+            logging.error(f"El estado guardado del acumulador no coincide con su cabecera, se descarta: {e}")
+            self._reiniciar()
+            return
+        self.forma, self.inicio, self.cantidad = forma, inicio, cantidad
+        self.anillo, self.tiempos = anillo, tiempos
+        if conteos is None:
+            # Estado de una versión sin contador guardado: se reconstruye una única vez desde el anillo
+            self.conteos = np.lib.format.open_memmap(self._ruta(self.CONTEO), mode='w+', dtype=self.dtype, shape=(2,) + forma)
+            self.plano = 0
+            for slot in self.slots():
+                np.add(self.conteos[0], self._desempaquetar(slot), out=self.conteos[0])
+            self.conteos.flush()
+            self._guardar_cabecera()
+        else:
+            self.conteos, self.plano = conteos, cabecera['plano']
+        self.conteo = self.conteos[self.plano]
+        logging.info(f"Acumulador reanudado desde {self.directorio}: {self.cantidad} máscaras en la ventana.")
+
+    def _reiniciar(self):
+        # Se empieza de cero: la próxima máscara vuelve a crear los archivos del estado
+        for nombre in (self.CABECERA, self.ANILLO, self.TIEMPOS, self.CONTEO):
+            try:
+                os.remove(self._ruta(nombre))
+            except FileNotFoundError:
+                pass
+
+    def _guardar_cabecera(self):
+        cabecera = {'capacidad': self.capacidad, 'forma': list(self.forma),
+                    'inicio': self.inicio, 'cantidad': self.cantidad, 'plano': self.plano}
+        ruta = self._ruta(self.CABECERA)
+        with open(ruta + '.tmp', 'w') as f:
+            json.dump(cabecera, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta + '.tmp', ruta)
+
+    def _desempaquetar(self, slot):
+        total = int(np.prod(self.forma))
+        return np.unpackbits(self.anillo[slot], count=total).reshape(self.forma)
+
+    def agregar(self, mascara, tiempo=None):
+        """
+        Agrega una máscara a la ventana, descartando la más antigua si está llena.
+
+        :param mascara: Arreglo booleano (o 0/1) con la forma del recorte, o (N, alto, ancho) con un plano
+                        por umbral (el conteo tiene entonces un plano por umbral).
+        :param tiempo: Fecha y hora (datetime) de inicio del escaneo de la imagen, opcional.
+        :return: Índice del lugar del anillo donde quedó guardada la máscara.
+        """
+        mascara = np.asarray(mascara, dtype=bool)
+        if self.forma is None:
+            self._reservar(mascara.shape)
+        elif mascara.shape != self.forma:
+            raise ValueError(f"La máscara {mascara.shape} no coincide con el acumulador {self.forma}")
+
+        # La máscara nueva va siempre al lugar libre, sin pisar ninguna de la ventana actual
+        slot = (self.inicio + self.cantidad) % self.lugares
+        self.anillo[slot] = np.packbits(mascara, axis=None)
+        self.tiempos[slot] = int(tiempo.timestamp()) if tiempo is not None else 0
+        if self.directorio is not None:
+            self.anillo.flush()
+            self.tiempos.flush()
+
+        # En disco, el contador nuevo va al plano libre; en memoria se actualiza en el lugar
+        plano = 1 - self.plano if self.conteos is not None else self.plano
+        conteo = self.conteos[plano] if self.conteos is not None else self.conteo
+        if self.cantidad == self.capacidad:
+            np.subtract(self.conteo, self._desempaquetar(self.inicio), out=conteo)
+            self.inicio = (self.inicio + 1) % self.lugares
+        else:
+            if conteo is not self.conteo:
+                np.copyto(conteo, self.conteo)
+            self.cantidad += 1
+        np.add(conteo, mascara, out=conteo, casting='unsafe')
+        self.plano, self.conteo = plano, conteo
+
+        if self.directorio is not None:
+            self.conteos.flush()
+            self._guardar_cabecera()
+        return slot
+
+    def descartar(self):
+        """
+        Vacía la ventana (por ejemplo, si cambió la región o la cantidad de umbrales
+        y las máscaras nuevas ya no tienen la forma de las guardadas).
+        """
+        self.forma = None
+        self.anillo = None
+        self.tiempos = None
+        self.conteo = None
+        self.conteos = None
+        self.plano = 0
+        self.inicio = 0
+        self.cantidad = 0
+        if self.directorio is not None:
+            self._reiniciar()
+
+    def slots(self):
+        """
+        Devuelve los lugares ocupados del anillo, de la máscara más antigua a la más nueva.
+        """
+        return [(self.inicio + i) % self.lugares for i in range(self.cantidad)]
+
+    def mascara(self, slot):
+        """
+        Devuelve la máscara desempaquetada guardada en un lugar del anillo.
+        """
+        return self._desempaquetar(slot).astype(bool)
+
+    def ultimo_tiempo(self):
+        """
+        Devuelve el tiempo (segundos desde epoch, UTC) de la máscara más nueva, o None si no hay.
+        """
+        if self.cantidad == 0:
+            return None
+        tiempo = int(self.tiempos[(self.inicio + self.cantidad - 1) % self.lugares])
+        return tiempo or None
+
+
+def PersistenciaMovil(mascaras, ventana, previas=0):
+    """
+    Calcula de una sola vez el conteo de la ventana deslizante para cada instante
+    de un cubo temporal de máscaras, con sumas acumuladas en el eje del tiempo:
+    conteo[t] = C[t] - C[t - ventana], en lugar de sumar y restar imagen por imagen.
+
+    :param mascaras: Arreglo (T, ...) de máscaras booleanas o 0/1, en orden cronológico.
+    :param ventana: Cantidad de imágenes de la ventana (144 para 24 horas).
+    :param previas: Cantidad de imágenes iniciales que solo completan la ventana y
+                    para las que no se devuelve conteo.
+    :return: Arreglo (T - previas, ...) con el conteo de cada instante.
+    """
+    dtype = np.uint8 if ventana <= np.iinfo(np.uint8).max else np.uint16
+    acumulada = np.cumsum(mascaras, axis=0, dtype=np.uint32 if len(mascaras) > np.iinfo(np.uint16).max else np.uint16)
+    conteo = acumulada[previas:].copy()
+    inicio = max(previas, ventana)
+    conteo[inicio - previas:] -= acumulada[inicio - ventana:len(mascaras) - ventana]
+    return conteo.astype(dtype)
@@ -0,0 +1,207 @@
+import os
+import logging
+from datetime import timezone
+import numpy as np
+from netCDF4 import Dataset
+
+# Atributos de 'goes_imager_projection' que se copian al archivo de salida
+ATRIBUTOS_PROYECCION = ('grid_mapping_name', 'perspective_point_height', 'semi_major_axis', 'semi_minor_axis',
+                        'inverse_flattening', 'latitude_of_projection_origin', 'longitude_of_projection_origin',
+                        'sweep_angle_axis')
+
+
+def TilesModificados(nuevo, previo, tile):
+    """
+    Devuelve los tiles (fila, columna) de tamaño tile x tile en los que difieren dos arreglos.
+
+    :param nuevo: Arreglo 2D.
+    :param previo: Arreglo 2D de la misma forma, o None (todos los tiles se consideran modificados).
+    :param tile: Lado del tile en píxeles.
+    :return: Arreglo (N, 2) con los índices de los tiles modificados.
+    """
+    filas, columnas = -(-nuevo.shape[0] // tile), -(-nuevo.shape[1] // tile)
+    if previo is None:
+        return np.argwhere(np.ones((filas, columnas), dtype=bool))
+    distinto = np.zeros((filas * tile, columnas * tile), dtype=bool)
+    np.not_equal(nuevo, previo, out=distinto[:nuevo.shape[0], :nuevo.shape[1]])
+    return np.argwhere(distinto.reshape(filas, tile, columnas, tile).any(axis=(1, 3)))
+
+
+def PromedioBloques(arreglo, factor):
+    """
+    Reduce un arreglo 2D promediando bloques de factor x factor (los bloques del borde pueden ser incompletos).
+    """
+    alto, ancho = arreglo.shape
+    filas, columnas = -(-alto // factor), -(-ancho // factor)
+    if alto % factor or ancho % factor:
+        arreglo = np.pad(arreglo, ((0, filas * factor - alto), (0, columnas * factor - ancho)))
+    # Suma separable (primero las filas de cada bloque, después las columnas) y división por los píxeles válidos
+    suma = arreglo.reshape(filas, factor, columnas * factor).sum(axis=1, dtype=np.float32)
+    suma = suma.reshape(filas, columnas, factor).sum(axis=2)
+    validos_filas = np.minimum(factor, alto - np.arange(filas) * factor)
+    validos_columnas = np.minimum(factor, ancho - np.arange(columnas) * factor)
+    return suma / np.outer(validos_filas, validos_columnas).astype(np.float32)
+
+
+class AlmacenAcumulado:
+    """
+    El acumulado y las máscaras de los productos en un NetCDF-4 georreferenciado.
+
+    Cada capa es una variable 2D comprimida (zlib) y dividida en tiles internos
+    (chunks de HDF5) de 'tamano_tile' píxeles, con las coordenadas x/y del
+    recorte (ángulos de escaneo en radianes) y la variable
+    'goes_imager_projection' del archivo original, según las convenciones CF,
+    de modo que un SIG puede leer una ventana sin cargar la imagen completa.
+    Cada capa tiene además versiones reducidas (overviews) por promedio de
+    bloques redondeado al tipo de la capa, como las de un GeoTIFF, en las
+    variables '<capa>_ov<factor>'.
+
+    La escritura es incremental: se compara cada capa con la escrita en el
+    cuadro anterior y solo se reescriben los tiles (y las zonas de las
+    overviews) en los que cambió algún valor.
+    """
+
+    def __init__(self, path, tamano_tile=256, nivel_compresion=4, overviews=(2, 4, 8)):
+        """
+        :param path: Ruta del archivo NetCDF.
+        :param tamano_tile: Lado de los tiles internos en píxeles (múltiplo de los factores de las overviews).
+        :param nivel_compresion: Nivel de compresión zlib (1 a 9).
+        :param overviews: Factores de reducción de las overviews.
+        """
+        if any(tamano_tile % factor for factor in overviews):
+            raise ValueError(f"El tamaño de tile {tamano_tile} debe ser múltiplo de los factores de las overviews {overviews}")
+        self.path = path
+        self.tamano_tile = tamano_tile
+        self.nivel_compresion = nivel_compresion
+        self.overviews = tuple(overviews)
+        self.nc = None
+        self.previas = {}
+
+    def _crear(self, georreferencia):
+        logging.info(f"Creando el almacén del acumulado {self.path}")
+        nc = Dataset(self.path + '.tmp', 'w', format='NETCDF4')
+        nc.Conventions = 'CF-1.7'
+        nc.title = 'Permanencia de topes nubosos fríos'
+        nc.tamano_tile = self.tamano_tile
+        proyeccion = nc.createVariable('goes_imager_projection', 'i4')
+        proyeccion.setncatts({k: v for k, v in georreferencia['proyeccion'].items() if k in ATRIBUTOS_PROYECCION})
+        for factor in (1,) + self.overviews:
+            sufijo = '' if factor == 1 else f'_ov{factor}'
+            for eje, valores in (('y', georreferencia['y']), ('x', georreferencia['x'])):
+                valores = np.asarray(valores, dtype=np.float64)
+                if factor > 1:
+                    valores = PromedioBloques(valores[np.newaxis, :], factor)[0]
+                nc.createDimension(eje + sufijo, len(valores))
+                coordenada = nc.createVariable(eje + sufijo, 'f8', (eje + sufijo,))
+                coordenada.units = 'rad'
+                coordenada.axis = eje.upper()
+                coordenada.standard_name = f'projection_{eje}_coordinate'
+                coordenada[:] = valores
+        tiempo = nc.createVariable('tiempo', 'i8')
+        tiempo.units = 'seconds since 1970-01-01 00:00:00'
+        tiempo.standard_name = 'time'
+        nc.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def _abrir(self, georreferencia):
+        forma = (len(georreferencia['y']), len(georreferencia['x']))
+        if self.nc is None and os.path.exists(self.path):
+            try:
+                self.nc = Dataset(self.path, 'a')
+                self.nc.set_auto_mask(False)
+                if (len(self.nc.dimensions['y']), len(self.nc.dimensions['x'])) != forma \
+                        or not np.allclose(self.nc.variables['x'][:], georreferencia['x']) \
+                        or not np.allclose(self.nc.variables['y'][:], georreferencia['y']):
+                    logging.warning(f"El almacén {self.path} corresponde a otra región; se crea de nuevo.")
+                    self.nc.close()
+                    self.nc = None
+            except Exception as e:
+                logging.error(f"No se pudo abrir el almacén {self.path}, se crea de nuevo: {e}")
+                self.nc = None
+            if self.nc is not None:
+                # Las capas ya escritas son la referencia para la escritura incremental
+                self.previas = {nombre: var[:] for nombre, var in self.nc.variables.items() if var.dimensions == ('y', 'x')}
+        if self.nc is None:
+            self._crear(georreferencia)
+            self.nc = Dataset(self.path, 'a')
+            self.nc.set_auto_mask(False)
+            self.previas = {}
+
+    def _variable(self, nombre, dtype, factor=1):
+        sufijo = '' if factor == 1 else f'_ov{factor}'
+        variable = self.nc.variables.get(nombre + sufijo)
+        if variable is None:
+            dimensiones = ('y' + sufijo, 'x' + sufijo)
+            chunks = tuple(min(self.tamano_tile, len(self.nc.dimensions[d])) for d in dimensiones)
+            variable = self.nc.createVariable(nombre + sufijo, dtype, dimensiones,
+                                              zlib=True, complevel=self.nivel_compresion, shuffle=True,
+                                              chunksizes=chunks, fill_value=False)
+            variable.grid_mapping = 'goes_imager_projection'
+            if factor > 1:
+                variable.overview_factor = factor
+                variable.resampling = 'average'
+        return variable
+
+    def escribir(self, capas, tiempo, georreferencia):
+        """
+        Escribe las capas de un cuadro, reescribiendo solo los tiles que cambiaron.
+
+        :param capas: Diccionario nombre -> arreglo 2D con la forma del recorte.
+        :param tiempo: Inicio del escaneo (datetime UTC) del cuadro.
+        :param georreferencia: Diccionario con 'x' e 'y' (radianes) y 'proyeccion' (atributos de goes_imager_projection).
+        :return: Cantidad de tiles escritos, sumando todas las capas (sin las overviews).
+        """
+        self._abrir(georreferencia)
+        escritos = 0
+        tile = self.tamano_tile
+        for nombre, arreglo in capas.items():
+            arreglo = np.asarray(arreglo)
+            if arreglo.dtype == bool:
+                arreglo = arreglo.astype(np.uint8)
+            variable = self._variable(nombre, arreglo.dtype)
+            tiles = TilesModificados(arreglo, self.previas.get(nombre), tile)
+            for fila, columna in tiles:
+                y0, x0 = fila * tile, columna * tile
+                variable[y0:y0 + tile, x0:x0 + tile] = arreglo[y0:y0 + tile, x0:x0 + tile]
+            for factor in self.overviews:
+                # Cada tile de la overview se calcula y se escribe completo una sola vez, aunque
+                # lo afecten varios tiles modificados (sin reescribir chunks a medias)
+                overview = self._variable(nombre, arreglo.dtype, factor)
+                lado = tile * factor
+                for fila, columna in np.unique(tiles // factor, axis=0):
+                    y0, x0 = fila * lado, columna * lado
+                    promedio = PromedioBloques(arreglo[y0:y0 + lado, x0:x0 + lado], factor)
+                    overview[fila * tile:(fila + 1) * tile, columna * tile:(columna + 1) * tile] = \
+                        np.rint(promedio).astype(arreglo.dtype)
+            escritos += len(tiles)
+            self.previas[nombre] = arreglo.copy()
+        if tiempo is not None:
+            self.nc.variables['tiempo'].assignValue(int(tiempo.replace(tzinfo=tiempo.tzinfo or timezone.utc).timestamp()))
+            self.nc.time_coverage_end = tiempo.strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.nc.sync()
+        return escritos
+
+    def cerrar(self):
+        if self.nc is not None:
+            self.nc.close()
+            self.nc = None
+
+
+def LeerVentana(path, filas, columnas, capa='conteo', overview=1):
+    """
+    Lee una ventana de una capa del almacén sin cargar la imagen completa.
+
+    :param path: Ruta del archivo NetCDF del almacén.
+    :param filas: Tupla (inicio, fin) de filas, en píxeles del nivel pedido.
+    :param columnas: Tupla (inicio, fin) de columnas, en píxeles del nivel pedido.
+    :param capa: Nombre de la capa.
+    :param overview: Factor de reducción (1 = resolución completa).
+    :return: Tupla (datos, x, y) de la ventana, con x e y en radianes.
+    """
+    sufijo = '' if overview == 1 else f'_ov{overview}'
+    with Dataset(path, 'r') as nc:
+        nc.set_auto_mask(False)
+        datos = nc.variables[capa + sufijo][filas[0]:filas[1], columnas[0]:columnas[1]]
+        x = nc.variables['x' + sufijo][columnas[0]:columnas[1]]
+        y = nc.variables['y' + sufijo][filas[0]:filas[1]]
+    return np.asarray(datos), np.asarray(x), np.asarray(y)
@@ -0,0 +1,167 @@
+import io
+import os
+import struct
+import logging
+from collections import deque
+from PIL import Image
+
+
+def _SubBloques(datos, pos):
+    # Recorre los sub-bloques de datos de un GIF hasta el terminador (bloque de tamaño 0)
+    while datos[pos]:
+        pos += datos[pos] + 1
+    return pos + 1
+
+
+def _BloqueGIF(frame, duracion_ms):
+    """
+    Codifica un cuadro como bloque de imagen de GIF89a: extensión de control con la
+    duración, descriptor de imagen con la paleta del cuadro como tabla local y datos LZW.
+    """
+    buffer = io.BytesIO()
+    frame.save(buffer, format='GIF')
+    datos = buffer.getvalue()
+    empaquetado = datos[10]
+    pos = 13
+    tabla = b''
+    if empaquetado & 0x80:
+        largo_tabla = 3 * 2 ** ((empaquetado & 0x07) + 1)
+        tabla = datos[pos:pos + largo_tabla]
+        pos += largo_tabla
+    # Se omiten las extensiones del archivo de un solo cuadro; la de control se escribe aparte
+    while datos[pos] == 0x21:
+        pos = _SubBloques(datos, pos + 2)
+    if datos[pos] != 0x2C:
+        raise ValueError("GIF sin descriptor de imagen")
+    descriptor = bytearray(datos[pos:pos + 10])
+    pos += 10
+    if descriptor[9] & 0x80:
+        largo_tabla = 3 * 2 ** ((descriptor[9] & 0x07) + 1)
+        tabla = datos[pos:pos + largo_tabla]
+        pos += largo_tabla
+    elif tabla:
+        descriptor[9] = (descriptor[9] & 0x40) | 0x80 | (empaquetado & 0x07)
+    fin = _SubBloques(datos, pos + 1)
+    control = b'\x21\xF9\x04\x00' + struct.pack('<H', duracion_ms // 10) + b'\x00\x00'
+    return control + bytes(descriptor) + tabla + datos[pos:fin]
+
+
+def _ChunkRIFF(nombre, datos):
+    return nombre + struct.pack('<I', len(datos)) + datos + (b'\x00' if len(datos) % 2 else b'')
+
+
+def _Entero24(valor):
+    return struct.pack('<I', valor)[:3]
+
+
+def _BloqueWebP(frame, duracion_ms):
+    """
+    Codifica un cuadro como chunk ANMF de WebP animado, con la duración del cuadro.
+    """
+    buffer = io.BytesIO()
+    frame.save(buffer, format='WEBP')
+    datos = buffer.getvalue()
+    pos = 12
+    imagen = b''
+    while pos < len(datos):
+        nombre, largo = datos[pos:pos + 4], struct.unpack('<I', datos[pos + 4:pos + 8])[0]
+        if nombre in (b'ALPH', b'VP8 ', b'VP8L'):
+            imagen += datos[pos:pos + 8 + largo + largo % 2]
+        pos += 8 + largo + largo % 2
+    cabecera = (_Entero24(0) + _Entero24(0) + _Entero24(frame.width - 1) + _Entero24(frame.height - 1)
+                + _Entero24(duracion_ms) + b'\x02')  # Sin mezcla con el cuadro anterior
+    return _ChunkRIFF(b'ANMF', cabecera + imagen)
+
+
+class Animacion:
+    """
+    Animación de los últimos N mapas generados.
+
+    Cada cuadro se decodifica, reduce y codifica una sola vez al agregarse: en
+    memoria queda una ventana de tamaño fijo de bloques ya codificados (bloques
+    de imagen de GIF89a o chunks ANMF de WebP). Al llegar un cuadro nuevo solo
+    se codifica ese cuadro y se descarta el bloque más antiguo; emitir la
+    animación solo concatena los bloques con la cabecera del archivo, por lo
+    que el costo por imagen nueva no crece con la cantidad de cuadros.
+    """
+
+    def __init__(self, output_path, max_frames=144, frame_duration=1.0, scale=1.0, formato='gif'):
+        """
+        :param output_path: Ruta del archivo de animación (la extensión se ajusta al formato).
+        :param max_frames: Cantidad máxima de cuadros en la animación.
+        :param frame_duration: Duración de cada cuadro en segundos.
+        :param scale: Factor de reducción de tamaño de los cuadros (1.0 = tamaño original).
+        :param formato: 'gif' o 'webp'.
+        """
+        self.formato = formato.lower()
+        if self.formato not in ('gif', 'webp'):
+            raise ValueError(f"Formato de animación desconocido: {formato} (opciones: gif, webp)")
+        self.output_path = os.path.splitext(output_path)[0] + '.' + self.formato
+        # Cada cuadro es (ancho, alto, bloque codificado)
+        self.frames = deque(maxlen=max_frames)
+        self.frame_duration_ms = int(frame_duration * 1000)
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _preparar(self, imagen):
+        with Image.open(imagen) as img:
+            frame = img.convert('RGB')
+        if self.scale != 1.0:
+            size = (max(1, int(frame.width * self.scale)), max(1, int(frame.height * self.scale)))
+            frame = frame.resize(size, Image.LANCZOS)
+        if self.formato == 'gif':
+            frame = frame.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            return frame.width, frame.height, _BloqueGIF(frame, self.frame_duration_ms)
+        return frame.width, frame.height, _BloqueWebP(frame, self.frame_duration_ms)
+
+    def _archivo(self):
+        ancho = max(w for w, _, _ in self.frames)
+        alto = max(h for _, h, _ in self.frames)
+        bloques = b''.join(bloque for _, _, bloque in self.frames)
+        if self.formato == 'gif':
+            # Pantalla lógica sin tabla global y bucle infinito (extensión NETSCAPE2.0)
+            return (b'GIF89a' + struct.pack('<HHBBB', ancho, alto, 0, 0, 0)
+                    + b'\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00' + bloques + b'\x3B')
+        vp8x = _ChunkRIFF(b'VP8X', b'\x02\x00\x00\x00' + _Entero24(ancho - 1) + _Entero24(alto - 1))
+        anim = _ChunkRIFF(b'ANIM', b'\x00\x00\x00\x00' + struct.pack('<H', 0))
+        cuerpo = b'WEBP' + vp8x + anim + bloques
+        return b'RIFF' + struct.pack('<I', len(cuerpo)) + cuerpo
+
+    def agregar(self, imagen):
+        """
+        Agrega un cuadro a la animación, descartando el más antiguo si la ventana está llena.
+
+        :param imagen: Ruta a la imagen PNG.
+        """
+        self.frames.append(self._preparar(imagen))
+
+    def cargar(self, imagenes):
+        """
+        Carga los últimos cuadros de una lista de imágenes (por ejemplo, las ya existentes en workdir).
+
+        :param imagenes: Lista de rutas a las imágenes, en orden cronológico.
+        """
+        for imagen in imagenes[-self.frames.maxlen:]:
+            try:
+                self.agregar(imagen)
+            except Exception as e:
+                logging.warning(f"No se pudo cargar el cuadro {imagen}: {e}")
+
+    def guardar(self):
+        """
+        Escribe la animación con los cuadros actuales. El archivo se reemplaza de
+        forma atómica, de modo que nunca se publica una animación a medio escribir.
+        """
+        if not self.frames:
+            logging.warning("No se encontraron imágenes para generar la animación.")
+            return
+        try:
+            tmp_path = self.output_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(self._archivo())
+            os.replace(tmp_path, self.output_path)
+            logging.info(f"Animación generada correctamente ({len(self.frames)} cuadros): {self.output_path}")
+        except Exception as e:
+            logging.error(f"Error al generar la animación: {e}")
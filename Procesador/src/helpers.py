@@ -4,40 +4,401 @@ from netCDF4 import Dataset
 import cartopy.crs as ccrs
 import matplotlib.pyplot as plt
 import cartopy.io.shapereader as shpreader
+import shapely
 from matplotlib.patches import Rectangle
 import json
 import cartopy
 import os
+import re
+import types
+import hashlib
 import logging
+from datetime import datetime, timezone
+
+
+# Cache de índices de recorte: en memoria y persistido en data/grids/
+_crop_cache = None
+CROP_CACHE_FILE = 'crop_index_cache.json'
+
+# Cache de geometrías vectoriales recortadas y simplificadas: en memoria y en data/shp/cache/
+_overlay_cache = {}
+
+# Cache de tablas de remuestreo geoestacionaria -> PlateCarree: en memoria y en data/grids/lut/
+_lut_cache = {}
+
+
+def _GetGridsDir():
+    return os.path.abspath(__file__).split('/src')[0] + '/data/grids/'
+
+
+def _GetOverlayCacheDir():
+    return os.path.abspath(__file__).split('/src')[0] + '/data/shp/cache/'
+
+
+def LoadGrid(name):
+    """
+    Carga una grilla de referencia como arreglo mapeado en memoria.
+
+    La primera vez convierte el archivo de texto (.txt) a binario (.npy), de
+    modo que las siguientes lecturas no vuelven a parsear el texto.
+
+    :param name: Nombre base de la grilla (por ejemplo 'g16_lons_8km').
+    :return: Arreglo de solo lectura, o None si la grilla no existe.
+    """
+    filepath = _GetGridsDir()
+    npy_path = filepath + name + '.npy'
+    txt_path = filepath + name + '.txt'
+    if not os.path.exists(npy_path):
+        if not os.path.exists(txt_path):
+            return None
+        grid = np.loadtxt(txt_path)
+        tmp_path = npy_path + f'.{os.getpid()}.tmp.npy'
+        np.save(tmp_path, grid)
+        os.replace(tmp_path, npy_path)
+        logging.info(f"Grilla {txt_path} convertida a {npy_path}")
+    return np.load(npy_path, mmap_mode='r')
+
+
+def _LoadCropCache():
+    global _crop_cache
+    if _crop_cache is None:
+        _crop_cache = {}
+        cache_path = _GetGridsDir() + CROP_CACHE_FILE
+        if os.path.exists(cache_path):
+            try:
+                _crop_cache = LoadDictionary(cache_path)
+                if not isinstance(_crop_cache, dict):
+                    raise ValueError(f"se esperaba un diccionario y se encontró {type(_crop_cache).__name__}")
+            except Exception:
+                logging.warning(f"Cache de recortes corrupta, se regenera: {cache_path}")
+                _crop_cache = {}
+    return _crop_cache
+
+
+def _SaveCropCache():
+    filepath = _GetGridsDir()
+    os.makedirs(filepath, exist_ok=True)
+    tmp_path = filepath + CROP_CACHE_FILE + f'.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(_crop_cache, f)
+    os.replace(tmp_path, filepath + CROP_CACHE_FILE)
+
+
+def GetGeosScanAngles(lon, lat, proj, visible=False):
+    """
+    Convierte coordenadas geográficas a ángulos de escaneo (x, y) en radianes
+    de la proyección geoestacionaria del ABI (GOES-R PUG, vol. 3, sec. 5.1.2.8).
+
+    :param lon: Longitud(es) en grados.
+    :param lat: Latitud(es) en grados.
+    :param proj: Variable 'goes_imager_projection' del netCDF.
+    :param visible: Si es True, devuelve además si cada punto es visible desde el satélite.
+    :return: Tupla (x, y) de ángulos de escaneo, o (x, y, visible).
+    """
+    r_eq = proj.semi_major_axis
+    r_pol = proj.semi_minor_axis
+    H = proj.perspective_point_height + r_eq
+    lon_0 = np.radians(proj.longitude_of_projection_origin)
+    lat_c = np.arctan((r_pol ** 2 / r_eq ** 2) * np.tan(np.radians(lat)))
+    e2 = (r_eq ** 2 - r_pol ** 2) / r_eq ** 2
+    r_c = r_pol / np.sqrt(1 - e2 * np.cos(lat_c) ** 2)
+    s_x = H - r_c * np.cos(lat_c) * np.cos(np.radians(lon) - lon_0)
+    s_y = -r_c * np.cos(lat_c) * np.sin(np.radians(lon) - lon_0)
+    s_z = r_c * np.sin(lat_c)
+    x = np.arcsin(-s_y / np.sqrt(s_x ** 2 + s_y ** 2 + s_z ** 2))
+    y = np.arctan(s_z / s_x)
+    if visible:
+        # Los puntos del otro lado del limbo tienen ángulos dentro del disco pero no se ven
+        return x, y, H * (H - s_x) >= s_y ** 2 + (r_eq ** 2 / r_pol ** 2) * s_z ** 2
+    return x, y
+
+
+def _GetFullDiskIndex(variable, angle):
+    # Las coordenadas x/y del ABI son enteros escalados sobre la grilla fija del disco completo
+    scale = float(variable.scale_factor)
+    offset = float(variable.add_offset)
+    size = int(round(2 * abs(offset) / abs(scale))) + 1
+    return int(np.clip(np.rint((angle - offset) / scale), 0, size - 1))
+
+
+def _GetCropIndexesFromGrids(band_resolution_km, min_lon, max_lon, min_lat, max_lat):
+    lons = LoadGrid('g16_lons_8km')
+    lats = LoadGrid('g16_lats_8km')
+    if lons is None or lats is None:
+        return None
+    ref_grid_resolution_km = 8
+    half = int(np.shape(lons)[0]/2)
+    lons_row = np.asarray(lons[half, :])
+    lats_col = np.asarray(lats[:, half])
+    min_lon_idx = (abs(lons_row - min_lon)).argmin()
+    max_lon_idx = (abs(lons_row - max_lon)).argmin()
+    max_lat_idx = (abs(lats_col - min_lat)).argmin()
+    min_lat_idx = (abs(lats_col - max_lat)).argmin()
+    frac = int(ref_grid_resolution_km/band_resolution_km)
+    return [int(min_lon_idx) * frac, int(max_lon_idx) * frac, int(min_lat_idx) * frac, int(max_lat_idx) * frac]
+
+
+def _GetCropIndexesFromProjection(netCDFread, min_lon, max_lon, min_lat, max_lat):
+    # Igual que con las grillas: longitudes sobre el ecuador y latitudes sobre el meridiano del satélite
+    proj = netCDFread.variables['goes_imager_projection']
+    lon_0 = proj.longitude_of_projection_origin
+    xs, _ = GetGeosScanAngles(np.array([min_lon, max_lon]), np.zeros(2), proj)
+    _, ys = GetGeosScanAngles(np.full(2, lon_0), np.array([max_lat, min_lat]), proj)
+    x_var = netCDFread.variables['x']
+    y_var = netCDFread.variables['y']
+    return [_GetFullDiskIndex(x_var, xs[0]), _GetFullDiskIndex(x_var, xs[1]),
+            _GetFullDiskIndex(y_var, ys[0]), _GetFullDiskIndex(y_var, ys[1])]
+
+
+def _ToLocalIndexes(netCDFread, img_indexes):
+    # Los archivos regionales (descarga con recorte) indican su posición dentro del disco completo
+    row_offset = int(getattr(netCDFread, 'recorte_fila_inicio', 0))
+    col_offset = int(getattr(netCDFread, 'recorte_col_inicio', 0))
+    n_rows, n_cols = netCDFread.variables['Rad'].shape
+    min_lon_idx, max_lon_idx, min_lat_idx, max_lat_idx = img_indexes
+    return [min(max(min_lon_idx - col_offset, 0), n_cols), min(max(max_lon_idx - col_offset, 0), n_cols),
+            min(max(min_lat_idx - row_offset, 0), n_rows), min(max(max_lat_idx - row_offset, 0), n_rows)]
+
+
+def GetCropExtent(netCDFread, local_indexes):
+    """
+    Calcula la extensión (en metros) de un recorte a partir de sus índices en el archivo.
+
+    La extensión sale de los índices del disco completo (índice local + posición del
+    recorte) y de la escala de x/y, que es la de la grilla fija del disco completo
+    también en los archivos regionales.
+
+    :param netCDFread: Dataset netCDF abierto.
+    :param local_indexes: Índices [col_inicio, col_fin, fila_inicio, fila_fin] en el archivo.
+    :return: Lista [x_min, x_max, y_min, y_max] en metros.
+    """
+    row_offset = int(getattr(netCDFread, 'recorte_fila_inicio', 0))
+    col_offset = int(getattr(netCDFread, 'recorte_col_inicio', 0))
+    min_lon_idx, max_lon_idx, min_lat_idx, max_lat_idx = local_indexes
+    if max_lon_idx <= min_lon_idx or max_lat_idx <= min_lat_idx:
+        raise ValueError(f"La región no se superpone con el archivo (índices locales {local_indexes})")
+    sat_h = netCDFread.variables['goes_imager_projection'].perspective_point_height
+    extent = []
+    for name, first, last in (('x', min_lon_idx + col_offset, max_lon_idx - 1 + col_offset),
+                              ('y', min_lat_idx + row_offset, max_lat_idx - 1 + row_offset)):
+        variable = netCDFread.variables[name]
+        scale = float(variable.scale_factor)
+        offset = float(variable.add_offset)
+        angles = (offset + first * scale, offset + last * scale)
+        extent += [min(angles) * sat_h, max(angles) * sat_h]
+    return extent
 
 
 def GetCroppedImage(netCDFread, min_lon, max_lon, min_lat, max_lat):
+    """
+    Calcula la extensión (en metros) y los índices de recorte de la región pedida.
+
+    Los índices del disco completo se calculan una sola vez por satélite,
+    resolución de banda y región, a partir de las grillas de referencia (.npy
+    mapeadas en memoria) o, si no están disponibles, de la proyección. El
+    resultado se guarda en data/grids/crop_index_cache.json y las llamadas
+    siguientes solo lo consultan. Los índices y la extensión devueltos se
+    ajustan a la posición de cada archivo dentro del disco completo, por lo que
+    también sirven para los netCDF regionales generados por la descarga con recorte.
+    """
     try:
         band_resolution_km = float(getattr(netCDFread, 'spatial_resolution').split("km")[0])
-        filepath = os.path.abspath(__file__).split('/src')[0] + '/data/grids/'
-        lons = np.loadtxt(filepath + 'g16_lons_8km.txt')
-        lats = np.loadtxt(filepath + 'g16_lats_8km.txt')
-        ref_grid_resolution_km = 8
-        half = int(np.shape(lons)[0]/2)
-        min_lon_idx = (abs(lons - min_lon)[half,:]).argmin()
-        max_lon_idx = (abs(lons - max_lon)[half,:]).argmin()
-        max_lat_idx = (abs(lats - min_lat)[:,half]).argmin()
-        min_lat_idx = (abs(lats - max_lat)[:,half]).argmin()
-        frac = int(ref_grid_resolution_km/band_resolution_km)
-        min_lat_idx = min_lat_idx * frac
-        min_lon_idx = min_lon_idx * frac
-        max_lat_idx = max_lat_idx * frac
-        max_lon_idx = max_lon_idx * frac
-        sat_h = netCDFread.variables['goes_imager_projection'].perspective_point_height
-        x = netCDFread.variables['x'][min_lon_idx:max_lon_idx] * sat_h
-        y = netCDFread.variables['y'][min_lat_idx:max_lat_idx] * sat_h
-        img_extent = (x.min(), x.max(), y.min(), y.max())
-        img_indexes = [min_lon_idx, max_lon_idx, min_lat_idx, max_lat_idx]
+        proj = netCDFread.variables['goes_imager_projection']
+        satellite = getattr(netCDFread, 'platform_ID', 'G16')
+        key = f"{satellite}_{proj.longitude_of_projection_origin}_{band_resolution_km}_{min_lon}_{max_lon}_{min_lat}_{max_lat}"
+        cache = _LoadCropCache()
+        if not isinstance(cache.get(key), dict) or len(cache[key].get('img_indexes', ())) != 4:
+            img_indexes = _GetCropIndexesFromGrids(band_resolution_km, min_lon, max_lon, min_lat, max_lat)
+            if img_indexes is None:
+                img_indexes = _GetCropIndexesFromProjection(netCDFread, min_lon, max_lon, min_lat, max_lat)
+            cache[key] = {'img_indexes': [int(i) for i in img_indexes]}
+            _SaveCropCache()
+            logging.info(f"Índices de recorte calculados y guardados en cache: {key}")
+        img_indexes = _ToLocalIndexes(netCDFread, cache[key]['img_indexes'])
+        img_extent = tuple(GetCropExtent(netCDFread, img_indexes))
         return img_extent, img_indexes
     except Exception as e:
         logging.error(f"Error al recortar la imagen: {e}")
         raise
 
+# Regiones predefinidas: nombre -> prefijo de sus límites en SMN_dict.conf
+REGIONES_PREDEFINIDAS = {
+    'ARG': 'argentina',
+    'SuA': 'sudamerica',
+    'SuA_ARG': 'sudamerica',
+}
+
+
+def GetRegionExtent(confData, region):
+    """
+    Devuelve la extensión [lon_W, lon_E, lat_S, lat_N] de la región, o None si no es válida.
+    """
+    prefijo = REGIONES_PREDEFINIDAS.get(region)
+    if prefijo is None:
+        logging.error(f"Debe seleccionar una de las siguientes áreas: {', '.join(REGIONES_PREDEFINIDAS)} o una región con extensión propia en 'regiones'!")
+        return None
+    return [confData[f'{prefijo}_lon_W'], confData[f'{prefijo}_lon_E'], confData[f'{prefijo}_lat_S'], confData[f'{prefijo}_lat_N']]
+
+
+def GetRegionCrop(netCDFread, confData, extent):
+    """
+    Calcula el recorte de la región, ampliada con los márgenes del gráfico.
+
+    :return: Tupla (img_extent, img_indexes) de GetCroppedImage.
+    """
+    return GetCroppedImage(netCDFread,
+                           extent[0] + confData['delta_lon_W_for_graph'],
+                           extent[1],
+                           extent[2] + confData['delta_lat_S_for_graph'],
+                           extent[3] + confData['delta_lat_N_for_graph'])
+
+
+def GetRegionMask(netCDFread, confData, extent, threshold):
+    """
+    Recorta la imagen y devuelve la máscara de píxeles más fríos que el umbral.
+    El umbral se aplica en espacio de radiancia, sin calibrar toda la imagen.
+
+    :return: Tupla (img_extent, mascara booleana).
+    """
+    img_extent, img_indexes = GetRegionCrop(netCDFread, confData, extent)
+
+    imagedata = netCDFread.variables['Rad'][img_indexes[2]:img_indexes[3], img_indexes[0]:img_indexes[1]][::1,::1]
+    mask = GetThresholdMask(netCDFread, imagedata, threshold)
+    del imagedata
+
+    return img_extent, mask
+
+
+def GetScanStartTime(path):
+    """
+    Obtiene la fecha y hora de inicio del escaneo a partir del nombre del archivo ABI
+    (campo '_sAAAAJJJHHMMSSs').
+
+    :param path: Ruta o nombre del archivo.
+    :return: datetime en UTC, o None si el nombre no sigue la convención de la NOAA.
+    """
+    match = re.search(r'_s(\d{13})', os.path.basename(path))
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), '%Y%j%H%M%S').replace(tzinfo=timezone.utc)
+
+
+def GetOverlayGeometries(shapefile, extent, tolerance):
+    """
+    Devuelve las geometrías de un shapefile recortadas a la región y simplificadas
+    a la resolución de salida.
+
+    Se calculan una sola vez por proceso y se guardan en data/shp/cache/ como WKB
+    (un .npz con los bytes y los desplazamientos de cada geometría); el cache en
+    disco se regenera si el shapefile es más nuevo o si el archivo está dañado.
+
+    :param shapefile: Ruta al .shp.
+    :param extent: Región [lon_W, lon_E, lat_S, lat_N] en grados.
+    :param tolerance: Tolerancia de simplificación en grados.
+    :return: Lista de geometrías de shapely.
+    """
+    key = (shapefile, tuple(round(float(e), 4) for e in extent), round(float(tolerance), 6))
+    if key in _overlay_cache:
+        return _overlay_cache[key]
+
+    cachedir = _GetOverlayCacheDir()
+    name = os.path.splitext(os.path.basename(shapefile))[0]
+    cache_path = cachedir + f"{name}_{'_'.join(str(v) for v in key[1])}_{key[2]}.npz"
+    geoms = None
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(shapefile):
+        try:
+            with np.load(cache_path) as cached:
+                data, offsets = cached['data'].tobytes(), cached['offsets']
+            geoms = list(shapely.from_wkb([data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]))
+        except Exception as e:
+            logging.warning(f"Cache de geometrías corrupta, se regenera: {cache_path}: {e}")
+    if geoms is None:
+        geoms = np.array(list(shpreader.Reader(shapefile).geometries()), dtype=object)
+        geoms = shapely.clip_by_rect(geoms, extent[0], extent[2], extent[1], extent[3])
+        geoms = shapely.simplify(geoms, tolerance)
+        geoms = [g for g in geoms if not g.is_empty]
+        wkbs = [shapely.to_wkb(g) for g in geoms]
+        offsets = np.cumsum([0] + [len(w) for w in wkbs], dtype=np.int64)
+        os.makedirs(cachedir, exist_ok=True)
+        tmp_path = cache_path[:-len('.npz')] + f'.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, data=np.frombuffer(b''.join(wkbs), dtype=np.uint8), offsets=offsets)
+        os.replace(tmp_path, cache_path)
+        logging.info(f"Geometrías de {shapefile} recortadas y guardadas en {cache_path}")
+    _overlay_cache[key] = geoms
+    return geoms
+
+
+def GetResamplingLUT(proj, img_extent, shape, map_extent, grid_shape):
+    """
+    Devuelve la tabla de remuestreo (vecino más cercano) de un recorte geoestacionario a una
+    grilla regular en PlateCarree: para cada píxel de salida, el índice plano del píxel del
+    recorte que lo contiene, o -1 si cae fuera del recorte o del disco visible.
+
+    La geometría del satélite no cambia entre imágenes, así que la tabla se calcula una sola
+    vez por satélite, recorte y grilla de salida, y se guarda en data/grids/lut/ como .npy
+    (se abre mapeado en memoria). Remuestrear un cuadro es entonces una indexación de numpy
+    (ApplyResamplingLUT) en lugar de reproyectar la imagen con cartopy.
+
+    :param proj: Diccionario con 'longitude_of_projection_origin', 'perspective_point_height',
+                 'semi_major_axis' y 'semi_minor_axis'.
+    :param img_extent: Extensión del recorte [x_min, x_max, y_min, y_max] en metros, tomada como bordes de los
+                       píxeles (como en imshow).
+    :param shape: Forma (filas, columnas) del recorte.
+    :param map_extent: Extensión de la grilla de salida [lon_W, lon_E, lat_S, lat_N] en grados.
+    :param grid_shape: Forma (filas, columnas) de la grilla de salida.
+    :return: Arreglo int32 con la forma de la grilla de salida.
+    """
+    key = (tuple(round(float(proj[k]), 6) for k in ('longitude_of_projection_origin', 'perspective_point_height',
+                                                    'semi_major_axis', 'semi_minor_axis')),
+           tuple(round(float(e), 3) for e in img_extent), tuple(int(n) for n in shape),
+           tuple(round(float(e), 6) for e in map_extent), tuple(int(n) for n in grid_shape))
+    if key in _lut_cache:
+        return _lut_cache[key]
+
+    lutdir = _GetGridsDir() + 'lut/'
+    lut_path = lutdir + 'lut_' + hashlib.sha1(repr(key).encode()).hexdigest()[:16] + '.npy'
+    if os.path.exists(lut_path):
+        lut = np.load(lut_path, mmap_mode='r')
+    else:
+        filas, columnas = key[4]
+        lon_W, lon_E, lat_S, lat_N = key[3]
+        # Centros de los píxeles de salida, de norte a sur y de oeste a este
+        lons = lon_W + (np.arange(columnas) + 0.5) * (lon_E - lon_W) / columnas
+        lats = lat_N - (np.arange(filas) + 0.5) * (lat_N - lat_S) / filas
+        lons, lats = np.meshgrid(lons, lats)
+        with np.errstate(invalid='ignore'):
+            x, y, visible = GetGeosScanAngles(lons, lats, types.SimpleNamespace(**proj), visible=True)
+        sat_h = float(proj['perspective_point_height'])
+        x_min, x_max, y_min, y_max = img_extent
+        alto, ancho = key[2]
+        # Igual que imshow con origin='upper': la fila 0 es el borde norte del recorte
+        col = np.floor((x * sat_h - x_min) / (x_max - x_min) * ancho)
+        fila = np.floor((y_max - y * sat_h) / (y_max - y_min) * alto)
+        valido = visible & (col >= 0) & (col < ancho) & (fila >= 0) & (fila < alto)
+        lut = np.full((filas, columnas), -1, dtype=np.int32)
+        lut[valido] = (fila[valido] * ancho + col[valido]).astype(np.int32)
+        os.makedirs(lutdir, exist_ok=True)
+        tmp_path = lut_path[:-len('.npy')] + f'.{os.getpid()}.tmp.npy'
+        np.save(tmp_path, lut)
+        os.replace(tmp_path, lut_path)
+        logging.info(f"Tabla de remuestreo {grid_shape} calculada y guardada en {lut_path}")
+    _lut_cache[key] = lut
+    return lut
+
+
+def ApplyResamplingLUT(image, lut):
+    """
+    Remuestrea una imagen (o cada plano de una pila (..., filas, columnas)) con una tabla de GetResamplingLUT.
+
+    :return: Arreglo enmascarado con la forma de la grilla de salida; los píxeles sin dato quedan enmascarados.
+    """
+    image = np.asarray(image)
+    plano = image.reshape(image.shape[:-2] + (-1,))
+    invalido = lut < 0
+    valores = np.take(plano, np.where(invalido, 0, lut), axis=-1)
+    return np.ma.masked_array(valores, mask=np.broadcast_to(invalido, valores.shape))
+
+
 def GetPlotObject(confData, extent):
     try:
         shapesdir = os.path.dirname(os.path.abspath(__file__)).split('/src')[0] + '/data/shp'
@@ -45,7 +406,12 @@ def GetPlotObject(confData, extent):
         extent = [extent[0], extent[1], extent[2] - 1.0, extent[3]]
         ax.set_extent(extent, ccrs.PlateCarree())
         cartopy.config['pre_existing_data_dir'] = shapesdir
-        ax.coastlines('10m', lw=confData['line_width_inches_for_coast'], color='black')
+        # Las geometrías se recortan con un margen y se simplifican a medio píxel de la figura
+        fig_width_px = ax.figure.get_size_inches()[0] * confData['figure_resolution_dpi']
+        tolerance = confData.get('overlay_simplify_tolerance_deg', (extent[1] - extent[0]) / fig_width_px / 2)
+        clip_extent = [extent[0] - 1.0, extent[1] + 1.0, extent[2] - 1.0, extent[3] + 1.0]
+        coast_shp = shpreader.natural_earth(resolution='10m', category='physical', name='coastline')
+        ax.add_geometries(GetOverlayGeometries(coast_shp, clip_extent, tolerance), ccrs.PlateCarree(), edgecolor='black', facecolor='none', linewidth=confData['line_width_inches_for_coast'])
         xlocs = np.arange(-90.0, -45 + 10, 10)
         ylocs = np.arange(-55.5, -15.5 + 10, 10)
         gl = ax.gridlines(xlocs=xlocs, ylocs=ylocs, linestyle='--', color='black', draw_labels=True, linewidth=0.3)
@@ -54,13 +420,11 @@ def GetPlotObject(confData, extent):
         gl.xlabel_style = {'size': 4}
         gl.ylabel_style = {'size': 4}
         shp_dir1 = shapesdir + '/limite_internacional2/ne_10m_admin_0_map_units_PLATE.shp'
-        paises = list(shpreader.Reader(shp_dir1).geometries())
-        for pais in paises:
-            ax.add_geometries([pais], ccrs.PlateCarree(), edgecolor='black', facecolor='none', linewidth=confData['line_width_inches_for_nation_limits'])
+        paises = GetOverlayGeometries(shp_dir1, clip_extent, tolerance)
+        ax.add_geometries(paises, ccrs.PlateCarree(), edgecolor='black', facecolor='none', linewidth=confData['line_width_inches_for_nation_limits'])
         shp_dir2 = shapesdir + '/limite_interprovincial2/008b_limites_provinciales_linea_PLATE.shp'
-        provincias = list(shpreader.Reader(shp_dir2).geometries())
-        for provincia in provincias:
-            ax.add_geometries([provincia], ccrs.PlateCarree(), edgecolor='black', facecolor='none', linewidth=confData['line_width_inches_for_province_limits'])
+        provincias = GetOverlayGeometries(shp_dir2, clip_extent, tolerance)
+        ax.add_geometries(provincias, ccrs.PlateCarree(), edgecolor='black', facecolor='none', linewidth=confData['line_width_inches_for_province_limits'])
         return ax
     except Exception as e:
         logging.error(f"Error al crear el objeto de la trama: {e}")
@@ -76,7 +440,18 @@ def LoadDictionary(path):
         logging.error(f"Error al cargar el diccionario desde {path}: {e}")
         raise
 
-def GetCalibratedImage(netCDFread, image):
+def GetCalibratedImage(netCDFread, image, inplace=False):
+    """
+    Calibra la imagen: temperatura de brillo en °C para las bandas emisivas
+    (7 a 16) y reflectancia para las bandas reflectivas.
+
+    :param netCDFread: Dataset netCDF abierto.
+    :param image: Radiancias recortadas (arreglo enmascarado de netCDF4).
+    :param inplace: Si es True, la calibración se hace en float32 reutilizando
+                    el buffer de 'image' (que queda modificado), sin crear
+                    arreglos intermedios del tamaño del recorte.
+    :return: Tupla (imagen calibrada, unidad).
+    """
     try:
         metaCDF = netCDFread.variables
         icanal = int(metaCDF['band_id'][:])
@@ -85,13 +460,31 @@ def GetCalibratedImage(netCDFread, image):
             fk2 = metaCDF['planck_fk2'][0]
             bc1 = metaCDF['planck_bc1'][0]
             bc2 = metaCDF['planck_bc2'][0]
-            mask = image <= 0
-            image_masked = np.ma.masked_array(image, mask=mask)
-            image_cal = (fk2 / (np.log((fk1 / image_masked) + 1)) - bc1 ) / bc2 - 273.15
+            if inplace:
+                data = np.ma.getdata(image)
+                if data.dtype != np.float32:
+                    data = data.astype(np.float32)
+                mask = np.ma.getmaskarray(image) | (data <= 0)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    np.divide(np.float32(fk1), data, out=data)
+                    np.log1p(data, out=data)
+                    np.divide(np.float32(fk2), data, out=data)
+                    data -= np.float32(bc1)
+                    data /= np.float32(bc2)
+                    data -= np.float32(273.15)
+                image_cal = np.ma.masked_array(data, mask=mask)
+            else:
+                mask = image <= 0
+                image_masked = np.ma.masked_array(image, mask=mask)
+                image_cal = (fk2 / (np.log((fk1 / image_masked) + 1)) - bc1 ) / bc2 - 273.15
             unit = 'Temperatura de Brillo [°C]'
         else:
             kappa0 = metaCDF['kappa0'][0]
-            image_cal = kappa0 * image
+            if inplace:
+                image *= kappa0
+                image_cal = image
+            else:
+                image_cal = kappa0 * image
             unit = 'Reflectancia'
         return image_cal, unit
     except Exception as e:
@@ -99,6 +492,86 @@ def GetCalibratedImage(netCDFread, image):
         raise
 
 
+def GetRadianceThreshold(netCDFread, threshold):
+    """
+    Convierte un umbral de temperatura de brillo (°C) a la radiancia equivalente,
+    invirtiendo la función de Planck del canal. Como la calibración es
+    monotónica creciente, T < umbral si y solo si 0 < Rad < radiancia de corte.
+
+    :param netCDFread: Dataset netCDF abierto de una banda emisiva.
+    :param threshold: Umbral de temperatura de brillo en °C.
+    :return: Radiancia de corte.
+    """
+    metaCDF = netCDFread.variables
+    fk1 = float(metaCDF['planck_fk1'][0])
+    fk2 = float(metaCDF['planck_fk2'][0])
+    bc1 = float(metaCDF['planck_bc1'][0])
+    bc2 = float(metaCDF['planck_bc2'][0])
+    t_eff = (threshold + 273.15) * bc2 + bc1
+    return fk1 / np.expm1(fk2 / t_eff)
+
+
+def GetThresholdMask(netCDFread, image, threshold, rtol=1e-4):
+    """
+    Devuelve la máscara de píxeles con temperatura de brillo menor que el umbral
+    sin calibrar toda la imagen (GetThresholdMasks con un único umbral).
+
+    :param netCDFread: Dataset netCDF abierto.
+    :param image: Radiancias recortadas (arreglo enmascarado de netCDF4).
+    :param threshold: Umbral en las unidades de la calibración (°C o reflectancia).
+    :param rtol: Ancho relativo de la franja alrededor del corte que se calibra exactamente.
+    :return: Máscara booleana.
+    """
+    return GetThresholdMasks(netCDFread, image, [threshold], rtol)[0]
+
+
+def GetThresholdMasks(netCDFread, image, thresholds, rtol=1e-4):
+    """
+    Devuelve una máscara de píxeles con temperatura de brillo menor que cada
+    umbral, sin calibrar toda la imagen.
+
+    Cada umbral se convierte a su radiancia de corte (GetRadianceThreshold) y el
+    recorte se compara contra todos los cortes a la vez (broadcasting). Solo los
+    píxeles cuya radiancia cae a menos de 'rtol' (relativo) de algún corte se
+    calibran, una sola vez, con la fórmula completa de GetCalibratedImage, por lo
+    que cada plano es idéntico, bit a bit, a np.ma.filled(image_cal < umbral, False).
+
+    :param netCDFread: Dataset netCDF abierto.
+    :param image: Radiancias recortadas (arreglo enmascarado de netCDF4).
+    :param thresholds: Lista de umbrales en las unidades de la calibración (°C o reflectancia).
+    :param rtol: Ancho relativo de la franja alrededor de cada corte que se calibra exactamente.
+    :return: Arreglo booleano (N, alto, ancho), un plano por umbral en el orden de 'thresholds'.
+    """
+    try:
+        icanal = int(netCDFread.variables['band_id'][:])
+        if icanal < 7:
+            image_cal, _ = GetCalibratedImage(netCDFread, image)
+            return np.stack([np.ma.filled(image_cal < float(t), False) for t in thresholds])
+        data = np.ma.getdata(image)
+        valid = ~np.ma.getmaskarray(image)
+        cuts = np.array([GetRadianceThreshold(netCDFread, float(t)) for t in thresholds])
+        low = (cuts * (1 - rtol)).astype(data.dtype)[:, np.newaxis, np.newaxis]
+        high = (cuts * (1 + rtol)).astype(data.dtype)[:, np.newaxis, np.newaxis]
+        masks = np.empty((len(cuts),) + data.shape, dtype=bool)
+        np.less(data[np.newaxis], low, out=masks)
+        near = np.less_equal(data[np.newaxis], high)
+        near &= ~masks
+        near &= valid
+        masks &= data > 0
+        masks &= valid
+        pixels = np.nonzero(near.any(axis=0))
+        if len(pixels[0]):
+            image_cal, _ = GetCalibratedImage(netCDFread, data[pixels])
+            for plane, threshold in enumerate(thresholds):
+                cerca = near[plane][pixels]
+                masks[plane][pixels] = np.where(cerca, np.ma.filled(image_cal < float(threshold), False),
+                                                masks[plane][pixels])
+        return masks
+    except Exception as e:
+        logging.error(f"Error al umbralizar la imagen: {e}")
+        raise
+
+
 def AddImageFoot(ax, title, institution=None, size=8.0):
     try:
         xlim = ax.get_xlim()
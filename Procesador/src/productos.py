@@ -0,0 +1,239 @@
+import os
+import re
+import logging
+import contextlib
+import numpy as np
+from netCDF4 import Dataset
+from src.helpers import GetRegionCrop, GetThresholdMasks, GetCalibratedImage, GetScanStartTime
+
+
+def GetBand(path):
+    """
+    Obtiene el número de banda a partir del nombre del archivo ABI (campo '-M6C13_').
+
+    :param path: Ruta o nombre del archivo.
+    :return: Número de banda, o None si el nombre no sigue la convención de la NOAA.
+    """
+    match = re.search(r'-M\dC(\d{2})_', os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+
+class EscaneoMultibanda:
+    """
+    Las bandas de un mismo escaneo, abiertas juntas.
+
+    El recorte de la región se calcula una sola vez por resolución de banda, y
+    la radiancia y la temperatura de brillo de cada banda se leen y calibran una
+    sola vez aunque las usen varios productos.
+    """
+
+    def __init__(self, archivos, confData, extent, metricas=None):
+        """
+        :param archivos: Diccionario banda -> ruta del netCDF.
+        :param confData: Diccionario de configuración.
+        :param extent: Región [lon_W, lon_E, lat_S, lat_N] en grados.
+        :param metricas: Registro de métricas donde se mide la duración de cada etapa, opcional.
+        """
+        self.archivos = dict(archivos)
+        self.confData = confData
+        self.extent = extent
+        self.metricas = metricas
+        self.datasets = {}
+        self._recortes = {}
+        self._radiancias = {}
+        self._temperaturas = {}
+        try:
+            for banda, path in self.archivos.items():
+                with self.medir('apertura_netcdf'):
+                    self.datasets[banda] = Dataset(path, 'r')
+        except Exception:
+            self.cerrar()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+    def medir(self, etapa):
+        """
+        Mide la duración de una etapa en el registro de métricas, si se indicó uno.
+        """
+        return self.metricas.medir(etapa) if self.metricas is not None else contextlib.nullcontext()
+
+    def dataset(self, banda):
+        return self.datasets[banda]
+
+    def recorte(self, banda):
+        """
+        Devuelve (img_extent, img_indexes) de la banda, compartido entre las bandas de igual resolución.
+        """
+        resolucion = getattr(self.datasets[banda], 'spatial_resolution', None)
+        if resolucion not in self._recortes:
+            with self.medir('recorte'):
+                self._recortes[resolucion] = GetRegionCrop(self.datasets[banda], self.confData, self.extent)
+        return self._recortes[resolucion]
+
+    def radiancia(self, banda):
+        """
+        Devuelve la radiancia recortada de la banda (se lee una sola vez).
+        """
+        if banda not in self._radiancias:
+            _, img_indexes = self.recorte(banda)
+            with self.medir('lectura_rad'):
+                self._radiancias[banda] = self.datasets[banda].variables['Rad'][img_indexes[2]:img_indexes[3], img_indexes[0]:img_indexes[1]]
+        return self._radiancias[banda]
+
+    def temperatura(self, banda):
+        """
+        Devuelve la banda calibrada en float32 (se calibra una sola vez, sin modificar la radiancia).
+        """
+        if banda not in self._temperaturas:
+            radiancia = self.radiancia(banda)
+            with self.medir('calibracion'):
+                self._temperaturas[banda], _ = GetCalibratedImage(self.datasets[banda], radiancia.astype(np.float32), inplace=True)
+        return self._temperaturas[banda]
+
+    def img_extent(self, banda):
+        return self.recorte(banda)[0]
+
+    def georreferencia(self, banda):
+        """
+        Devuelve las coordenadas del recorte de la banda ('x' e 'y', ángulos de escaneo en radianes)
+        y los atributos de su proyección ('proyeccion'), para georreferenciar los productos.
+        """
+        _, img_indexes = self.recorte(banda)
+        dataset = self.datasets[banda]
+        proyeccion = dataset.variables['goes_imager_projection']
+        return {
+            'x': np.asarray(dataset.variables['x'][img_indexes[0]:img_indexes[1]], dtype=np.float64),
+            'y': np.asarray(dataset.variables['y'][img_indexes[2]:img_indexes[3]], dtype=np.float64),
+            'proyeccion': {nombre: proyeccion.getncattr(nombre) for nombre in proyeccion.ncattrs()},
+        }
+
+    def tiempo(self):
+        """
+        Devuelve el inicio del escaneo (UTC), a partir del nombre de cualquiera de sus archivos.
+        """
+        return next((GetScanStartTime(p) for p in self.archivos.values() if GetScanStartTime(p) is not None), None)
+
+    def cerrar(self):
+        for ds in self.datasets.values():
+            ds.close()
+        self.datasets = {}
+        self._radiancias = {}
+        self._temperaturas = {}
+
+
+def NombreCapaUmbral(umbral):
+    """
+    Nombre de la capa del conteo de un umbral en el almacén (por ejemplo, -53 -> 'conteo_m53').
+    """
+    return f'conteo_{umbral:g}'.replace('-', 'm').replace('.', 'p')
+
+
+def ProductoPermanencia(escaneo, banda=13, umbral=-53, umbrales=None):
+    """
+    Máscara de topes nubosos más fríos que el umbral (°C), umbralizada en espacio de radiancia.
+
+    Con una lista de 'umbrales' devuelve una máscara (N, alto, ancho) con un plano
+    por umbral. Uno o varios umbrales se calculan igual, con GetThresholdMasks sobre
+    la radiancia del recorte, de modo que cada plano es idéntico a la máscara de ese
+    umbral solo.
+    """
+    masks = GetThresholdMasks(escaneo.dataset(banda), escaneo.radiancia(banda), umbrales or [umbral])
+    return masks if umbrales else masks[0]
+
+
+def ProductoDiferencia(escaneo, bandas=(8, 13), umbral=0.0):
+    """
+    Máscara de píxeles donde la diferencia de temperatura de brillo entre dos bandas
+    supera el umbral (°C). Con C08 - C13 > 0 se marcan los topes que penetran la
+    capa de vapor de agua.
+    """
+    banda_a, banda_b = bandas
+    if escaneo.radiancia(banda_a).shape != escaneo.radiancia(banda_b).shape:
+        raise ValueError(f"Las bandas {banda_a} y {banda_b} tienen resoluciones distintas")
+    diferencia = escaneo.temperatura(banda_a) - escaneo.temperatura(banda_b)
+    return np.ma.filled(diferencia > umbral, False)
+
+
+# Registro de tipos de producto: agregar un producto no agrega otra lectura de los archivos
+PRODUCTOS = {
+    'permanencia': ProductoPermanencia,
+    'diferencia': ProductoDiferencia,
+}
+
+
+def BandasProducto(parametros):
+    """
+    Devuelve las bandas que usa un producto a partir de sus parámetros.
+    """
+    if 'bandas' in parametros:
+        return list(parametros['bandas'])
+    return [parametros.get('banda', 13)]
+
+
+def BandasRequeridas(productos):
+    """
+    Devuelve las bandas que necesitan todos los productos configurados, ordenadas.
+
+    :param productos: Diccionario nombre -> parámetros (con la clave 'tipo').
+    """
+    return sorted({banda for parametros in productos.values() for banda in BandasProducto(parametros)})
+
+
+def CalcularProductos(escaneo, productos):
+    """
+    Calcula todos los productos de un escaneo.
+
+    :param escaneo: EscaneoMultibanda abierto.
+    :param productos: Diccionario nombre -> parámetros (con la clave 'tipo').
+    :return: Diccionario nombre -> máscara booleana.
+    """
+    resultados = {}
+    for nombre, parametros in productos.items():
+        parametros = dict(parametros)
+        tipo = parametros.pop('tipo')
+        if tipo not in PRODUCTOS:
+            raise ValueError(f"Tipo de producto desconocido: {tipo}")
+        with escaneo.medir(f'producto_{nombre}'):
+            resultados[nombre] = PRODUCTOS[tipo](escaneo, **parametros)
+    return resultados
+
+
+class AgrupadorEscaneos:
+    """
+    Agrupa los archivos que llegan al inbox por escaneo, hasta tener todas las bandas.
+    """
+
+    def __init__(self, bandas):
+        """
+        :param bandas: Bandas que debe tener cada escaneo.
+        """
+        self.bandas = set(bandas)
+        self.pendientes = {}
+
+    def agregar(self, path):
+        """
+        Agrega un archivo al grupo de su escaneo.
+
+        :param path: Ruta del archivo.
+        :return: Diccionario banda -> ruta si el escaneo quedó completo, o None.
+        """
+        banda = GetBand(path)
+        tiempo = GetScanStartTime(path)
+        if banda not in self.bandas or tiempo is None:
+            logging.warning(f"Se ignora el archivo {path}: banda {banda} no requerida o nombre sin fecha.")
+            return None
+        grupo = self.pendientes.setdefault(tiempo, {})
+        grupo[banda] = path
+        if set(grupo) != self.bandas:
+            return None
+        del self.pendientes[tiempo]
+        # Un escaneo anterior que sigue incompleto ya no va a completarse
+        for anterior in [t for t in self.pendientes if t < tiempo]:
+            logging.warning(f"Se descarta el escaneo incompleto {anterior}: faltan las bandas {sorted(self.bandas - set(self.pendientes[anterior]))}")
+            del self.pendientes[anterior]
+        return grupo
@@ -0,0 +1,92 @@
+import logging
+from src.helpers import GetCropExtent, GetRegionExtent, GetRegionCrop
+
+
+def UnionExtents(extents):
+    """
+    Devuelve la extensión [lon_W, lon_E, lat_S, lat_N] más chica que contiene a todas las extensiones.
+    """
+    extents = list(extents)
+    return [min(e[0] for e in extents), max(e[1] for e in extents),
+            min(e[2] for e in extents), max(e[3] for e in extents)]
+
+
+def Vista(arreglo, ventana):
+    """
+    Devuelve la parte de un arreglo de la unión que corresponde a una región, sin copiarla.
+
+    :param arreglo: Arreglo (..., alto, ancho) con la forma del recorte de la unión (por ejemplo, el conteo).
+    :param ventana: Ventana de la región (RegistroRegiones.ventanas).
+    :return: Vista del arreglo (comparte la memoria del original).
+    """
+    filas, columnas, _ = ventana
+    return arreglo[..., filas, columnas]
+
+
+class RegistroRegiones:
+    """
+    Las regiones de salida del procesador (ARG, SuA y regiones con extensión propia).
+
+    Cada escaneo se lee, umbraliza y acumula una sola vez sobre la unión de
+    todas las regiones; cada región es una vista (sin copia) del recorte de la
+    unión, por lo que agregar una región solo agrega su render. La ubicación de
+    cada región dentro de la unión se calcula una vez por resolución de banda.
+    """
+
+    def __init__(self, confData, regiones=None):
+        """
+        :param confData: Diccionario de configuración.
+        :param regiones: Diccionario nombre -> extensión [lon_W, lon_E, lat_S, lat_N] en grados, o None en
+                         lugar de la extensión para las regiones predefinidas (GetRegionExtent).
+                         Sin regiones se usa solo 'ARG'. La primera región es la principal.
+        """
+        self.confData = confData
+        self.extents = {}
+        for nombre, extent in (regiones or {'ARG': None}).items():
+            if extent is None:
+                extent = GetRegionExtent(confData, nombre)
+                if extent is None:
+                    raise ValueError(f"Región desconocida: {nombre}")
+            if len(extent) != 4 or extent[0] >= extent[1] or extent[2] >= extent[3]:
+                raise ValueError(f"La extensión de la región {nombre} debe ser [lon_W, lon_E, lat_S, lat_N]: {extent}")
+            self.extents[nombre] = [float(v) for v in extent]
+        self.principal = next(iter(self.extents))
+        self.union = UnionExtents(self.extents.values())
+        self._ventanas = {}
+        logging.info(f"Regiones: {', '.join(self.extents)} (unión {self.union})")
+
+    def __iter__(self):
+        return iter(self.extents)
+
+    def __len__(self):
+        return len(self.extents)
+
+    def ventanas(self, escaneo, banda):
+        """
+        Ubica cada región dentro del recorte de la unión de un escaneo.
+
+        :param escaneo: EscaneoMultibanda abierto con la extensión de la unión.
+        :param banda: Banda cuyo recorte se usa.
+        :return: Diccionario nombre -> (filas, columnas, img_extent), con filas y columnas como slices
+                 relativos al recorte de la unión e img_extent la extensión de la ventana en metros
+                 (la de la región o, si la región excede la unión, la de la parte que queda dentro).
+        """
+        dataset = escaneo.dataset(banda)
+        _, union_indexes = escaneo.recorte(banda)
+        clave = (getattr(dataset, 'spatial_resolution', None), tuple(union_indexes))
+        if clave not in self._ventanas:
+            ancho = union_indexes[1] - union_indexes[0]
+            alto = union_indexes[3] - union_indexes[2]
+            ventanas = {}
+            for nombre, extent in self.extents.items():
+                img_extent, img_indexes = GetRegionCrop(dataset, self.confData, extent)
+                c0, c1 = (min(max(i - union_indexes[0], 0), ancho) for i in img_indexes[:2])
+                f0, f1 = (min(max(i - union_indexes[2], 0), alto) for i in img_indexes[2:])
+                if (c1 - c0, f1 - f0) != (img_indexes[1] - img_indexes[0], img_indexes[3] - img_indexes[2]):
+                    # La extensión se recalcula para la ventana recortada, con las coordenadas de la unión
+                    logging.warning(f"La región {nombre} excede el recorte de la unión; se recorta.")
+                    img_extent = GetCropExtent(dataset, [union_indexes[0] + c0, union_indexes[0] + c1,
+                                                         union_indexes[2] + f0, union_indexes[2] + f1])
+                ventanas[nombre] = (slice(f0, f1), slice(c0, c1), tuple(img_extent))
+            self._ventanas[clave] = ventanas
+        return self._ventanas[clave]
@@ -0,0 +1,352 @@
+import io
+import time
+import multiprocessing
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import cartopy.crs as ccrs
+from matplotlib import font_manager
+from PIL import Image, ImageDraw, ImageFont
+from src.helpers import GetPlotObject, AddImageFoot, AddLogo, GetResamplingLUT, ApplyResamplingLUT
+
+# Escala de colores del mapa de permanencia (horas en 24 horas)
+COLORES_PERMANENCIA = ['white', 'lightblue', 'blue', 'green', 'yellow', 'orange', 'red', 'darkred']
+LIMITES_PERMANENCIA = [0, 2, 4, 6, 8, 12, 16, 20, 24]
+
+# Capas fijas del renderizador raster (mapa base, barra de colores, logo y pie), una por región y tamaño de
+# imagen; se arman una vez por proceso de render
+_capas_raster = {}
+
+
+def GetImageMetadata(netCDFread):
+    """
+    Extrae del netCDF los datos de la imagen que necesita el renderizador.
+
+    :return: Diccionario con la proyección y la fecha de la imagen.
+    """
+    proj = netCDFread.variables['goes_imager_projection']
+    return {
+        'central_longitude': float(proj.longitude_of_projection_origin),
+        'satellite_height': float(proj.perspective_point_height),
+        'semi_major_axis': float(getattr(proj, 'semi_major_axis', 6378137.0)),
+        'semi_minor_axis': float(getattr(proj, 'semi_minor_axis', 6356752.31414)),
+        'time_coverage_start': netCDFread.time_coverage_start,
+    }
+
+
+def CrearSnapshot(conteo, metadata, img_extent, extent, output_path):
+    """
+    Arma la foto del acumulador que necesita el renderizador, independiente del
+    netCDF abierto y del acumulador (que sigue cambiando en el hilo de ingesta).
+
+    :param conteo: Conteo de imágenes por píxel del acumulador.
+    :param metadata: Datos de la imagen más nueva (GetImageMetadata).
+    :param img_extent: Extensión del recorte en metros de la proyección geoestacionaria.
+    :param extent: Región [lon_W, lon_E, lat_S, lat_N] en grados.
+    :param output_path: Ruta del PNG a generar.
+    :return: Diccionario serializable para enviar a otro proceso.
+    """
+    snapshot = dict(metadata)
+    snapshot.update({
+        'conteo': np.array(conteo, copy=True),
+        'img_extent': tuple(img_extent),
+        'extent': list(extent),
+        'output_path': output_path,
+    })
+    return snapshot
+
+
+def _Proyeccion(snapshot):
+    return {'longitude_of_projection_origin': snapshot['central_longitude'],
+            'perspective_point_height': snapshot['satellite_height'],
+            'semi_major_axis': snapshot.get('semi_major_axis', 6378137.0),
+            'semi_minor_axis': snapshot.get('semi_minor_axis', 6356752.31414)}
+
+
+def _Titulo(snapshot):
+    # Fecha y hora del archivo NetCDF, sin las fracciones de segundo
+    timestamp = snapshot['time_coverage_start']
+    if '.' in timestamp:
+        timestamp = timestamp.split('.')[0] + 'Z'
+    formatted_timestamp = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').strftime('%d/%m/%Y-%H:%Mhs')
+    return f"Mapa de permanencia de topes de nubes {formatted_timestamp}"
+
+
+def RenderizarMapa(snapshot, confData):
+    """
+    Genera el PNG del mapa de permanencia a partir de una foto del acumulador.
+
+    :param snapshot: Diccionario creado con CrearSnapshot.
+    :param confData: Diccionario de configuración.
+    :return: Ruta del PNG generado.
+    """
+    conteo = snapshot['conteo']
+
+    fig = plt.figure(clear=True)
+    fig.set_size_inches(np.shape(conteo)[1] / confData['figure_resolution_dpi'], np.shape(conteo)[0] / confData['figure_resolution_dpi'])
+    ax = GetPlotObject(confData, snapshot['extent'])
+
+    # Fondo blanco
+    ax.set_facecolor('white')
+
+    # Ajustar la escala de colores para 24 horas
+    cmap = matplotlib.colors.ListedColormap(COLORES_PERMANENCIA)
+    bounds = LIMITES_PERMANENCIA
+    norm = matplotlib.colors.BoundaryNorm(bounds, cmap.N)
+
+    # El acumulado se remuestrea a la grilla PlateCarree de los ejes con una tabla precalculada
+    # (una indexación por cuadro) en lugar de que cartopy reproyecte el recorte en cada imagen.
+    # La grilla se mide con los ejes ya ubicados junto a la barra de colores
+    map_extent = ax.get_extent(ccrs.PlateCarree())
+    img = ax.imshow(np.ma.masked_all((1, 1)), transform=ax.projection, extent=map_extent, origin='upper', cmap=cmap,
+                    norm=norm, aspect='auto', interpolation='nearest')
+    cbar = plt.colorbar(img, ax=ax, fraction=0.02, pad=0.04, boundaries=bounds, ticks=bounds)
+    cbar.set_label('Horas de permanencia')
+    ax.apply_aspect()
+    posicion = ax.get_position()
+    grid_shape = (max(1, int(round(posicion.height * fig.get_figheight() * confData['figure_resolution_dpi']))),
+                  max(1, int(round(posicion.width * fig.get_figwidth() * confData['figure_resolution_dpi']))))
+    lut = GetResamplingLUT(_Proyeccion(snapshot), snapshot['img_extent'], np.shape(conteo), map_extent, grid_shape)
+    img.set_data(ApplyResamplingLUT(conteo, lut) * (10 / 60.0))  # Cada imagen representa 10 minutos
+
+    AddImageFoot(ax, _Titulo(snapshot), size=8.0)
+    AddLogo(ax)
+
+    output_path = snapshot['output_path']
+    plt.savefig(output_path, dpi=confData['figure_resolution_dpi'])
+    plt.close(fig)
+    logging.info(f"Imagen guardada en {output_path}")
+    return output_path
+
+
+def TablaColores(maximo):
+    """
+    Tabla RGBA (uint8) de la escala de permanencia indexada directamente por el conteo de imágenes.
+
+    Cada conteo se convierte a horas y se clasifica con el mismo BoundaryNorm que el render con
+    matplotlib, por lo que los colores son idénticos. La última entrada (maximo + 1) es
+    transparente, para los píxeles sin dato.
+
+    :param maximo: Conteo máximo posible (el máximo del tipo del contador).
+    :return: Arreglo (maximo + 2, 4) de uint8.
+    """
+    cmap = matplotlib.colors.ListedColormap(COLORES_PERMANENCIA)
+    norm = matplotlib.colors.BoundaryNorm(LIMITES_PERMANENCIA, cmap.N)
+    tabla = np.zeros((maximo + 2, 4), dtype=np.uint8)
+    tabla[:-1] = cmap(norm(np.arange(maximo + 1) * (10 / 60.0)), bytes=True)
+    return tabla
+
+
+def _CapaFija(snapshot, confData):
+    """
+    Arma con matplotlib, una sola vez por región y tamaño, todo lo que no cambia entre cuadros:
+    el mapa base (costas, límites y grilla), la barra de colores, el logo y el pie sin título.
+
+    :return: Diccionario con el fondo (RGB, ya compuesto sobre blanco), la parte de la capa que cae
+             sobre los ejes (RGBA), la caja de los ejes en píxeles, la grilla y la extensión del mapa,
+             la tabla de colores, la posición del título y su fuente.
+    """
+    dpi = confData['figure_resolution_dpi']
+    forma = np.shape(snapshot['conteo'])
+    clave = (tuple(round(float(e), 4) for e in snapshot['extent']), forma, dpi, snapshot['conteo'].dtype.str)
+    if clave in _capas_raster:
+        return _capas_raster[clave]
+
+    fig = plt.figure(clear=True)
+    fig.set_size_inches(forma[1] / dpi, forma[0] / dpi)
+    fig.set_dpi(dpi)
+    ax = GetPlotObject(confData, snapshot['extent'])
+    ax.set_aspect('auto')
+    cmap = matplotlib.colors.ListedColormap(COLORES_PERMANENCIA)
+    norm = matplotlib.colors.BoundaryNorm(LIMITES_PERMANENCIA, cmap.N)
+    cbar = plt.colorbar(matplotlib.cm.ScalarMappable(norm=norm, cmap=cmap), ax=ax, fraction=0.02, pad=0.04,
+                        boundaries=LIMITES_PERMANENCIA, ticks=LIMITES_PERMANENCIA)
+    cbar.set_label('Horas de permanencia')
+    AddImageFoot(ax, '', size=8.0)
+    AddLogo(ax)
+    fig.canvas.draw()
+
+    # Caja de los ejes y anclaje del título (izquierda, línea de base, como en AddImageFoot) en píxeles
+    # de la imagen, con el origen arriba a la izquierda
+    alto = int(round(fig.get_figheight() * dpi))
+    caja = ax.get_window_extent()
+    caja = (int(round(caja.x0)), alto - int(round(caja.y1)), int(round(caja.x1)), alto - int(round(caja.y0)))
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    altura_pie = 0.035 * (abs(ylim[0]) + abs(ylim[1]))
+    titulo_x, titulo_y = ax.transData.transform((xlim[0], ylim[1] - altura_pie / 1.5))
+    map_extent = ax.get_extent(ccrs.PlateCarree())
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, dpi=dpi, transparent=True)
+    plt.close(fig)
+    buffer.seek(0)
+    capa = Image.open(buffer).convert('RGBA')
+
+    fondo = Image.new('RGBA', capa.size, 'white')
+    fondo.alpha_composite(capa)
+    fuente = ImageFont.truetype(font_manager.findfont(font_manager.FontProperties()), size=max(1, round(8.0 * dpi / 72)))
+    _capas_raster[clave] = {
+        'fondo': fondo.convert('RGB'),
+        'capa_ejes': capa.crop(caja),
+        'caja': caja,
+        'grid_shape': (caja[3] - caja[1], caja[2] - caja[0]),
+        'map_extent': map_extent,
+        'colores': TablaColores(int(np.iinfo(snapshot['conteo'].dtype).max)),
+        'titulo': (float(titulo_x), alto - float(titulo_y)),
+        'fuente': fuente,
+    }
+    logging.info(f"Capa fija del mapa {clave} armada para el render raster")
+    return _capas_raster[clave]
+
+
+def RenderizarMapaRaster(snapshot, confData):
+    """
+    Genera el PNG del mapa de permanencia sin armar una figura de matplotlib en cada cuadro.
+
+    El conteo se remuestrea con la tabla de GetResamplingLUT a la grilla de los ejes, se
+    colorea con TablaColores (una indexación), se compone debajo de la capa fija
+    (_CapaFija), se escribe el título con PIL y se guarda con compresión PNG rápida
+    ('render_png_compresion', 1 por defecto). El resultado es el mismo mapa que
+    RenderizarMapa, salvo el antialias del título.
+
+    :param snapshot: Diccionario creado con CrearSnapshot.
+    :param confData: Diccionario de configuración.
+    :return: Ruta del PNG generado.
+    """
+    capa = _CapaFija(snapshot, confData)
+    conteo = np.asarray(snapshot['conteo'])
+    lut = GetResamplingLUT(_Proyeccion(snapshot), snapshot['img_extent'], conteo.shape, capa['map_extent'],
+                           capa['grid_shape'])
+    # Los píxeles sin dato (-1) toman el último valor agregado, que apunta al color transparente
+    valores = np.empty(conteo.size + 1, dtype=np.int32)
+    valores[:-1] = conteo.ravel()
+    valores[-1] = len(capa['colores']) - 1
+    # Cada color RGBA se copia como un solo uint32
+    colores = capa['colores'].view(np.uint32).ravel()
+    datos = Image.fromarray(colores[valores[lut]].view(np.uint8).reshape(lut.shape + (4,)), 'RGBA')
+
+    ejes = Image.new('RGBA', datos.size, 'white')
+    ejes.alpha_composite(datos)
+    ejes.alpha_composite(capa['capa_ejes'])
+    imagen = capa['fondo'].copy()
+    imagen.paste(ejes.convert('RGB'), capa['caja'][:2])
+    ImageDraw.Draw(imagen).text(capa['titulo'], _Titulo(snapshot), fill='black', font=capa['fuente'], anchor='ls')
+
+    output_path = snapshot['output_path']
+    imagen.save(output_path, format='PNG', compress_level=confData.get('render_png_compresion', 1))
+    logging.info(f"Imagen guardada en {output_path}")
+    return output_path
+
+
+# Renderizadores disponibles, según 'render_backend' en la configuración
+RENDERIZADORES = {
+    'matplotlib': RenderizarMapa,
+    'raster': RenderizarMapaRaster,
+}
+
+
+def _RenderizarMedido(snapshot, confData):
+    # Se cronometra en el proceso de render: el tiempo no incluye la espera en la cola ni el despacho
+    inicio = time.perf_counter()
+    output_path = RENDERIZADORES[confData.get('render_backend', 'matplotlib')](snapshot, confData)
+    return output_path, time.perf_counter() - inicio
+
+
+class RenderizadorAsincrono:
+    """
+    Renderiza los mapas en un pool de procesos, desacoplado de la ingesta.
+
+    El hilo de ingesta solo encola fotos del acumulador en una cola acotada
+    (si la cola está llena, espera: contrapresión). Un hilo despachador envía
+    las fotos al pool y entrega los PNG terminados a 'al_terminar' en el mismo
+    orden en que se encolaron, para que la animación conserve el orden de las
+    imágenes. Con workers=0 el render se hace en el mismo hilo que encola.
+
+    Los procesos de render se inician con 'forkserver' (o 'spawn' donde no
+    existe), no con fork: el proceso principal ya tiene hilos (descarga,
+    despachador, exportador de métricas) y un fork copiaría sus locks tomados.
+    """
+
+    _FIN = object()
+
+    def __init__(self, confData, al_terminar, workers=2, queue_size=4, metricas=None):
+        """
+        :param confData: Diccionario de configuración.
+        :param al_terminar: Función que recibe la ruta de cada PNG generado.
+        :param workers: Cantidad de procesos de render (0 = render sincrónico).
+        :param queue_size: Tamaño máximo de la cola de fotos pendientes.
+        :param metricas: Registro de métricas donde se mide la duración del render, opcional.
+        """
+        if confData.get('render_backend', 'matplotlib') not in RENDERIZADORES:
+            raise ValueError(f"Renderizador desconocido: {confData['render_backend']} (opciones: {', '.join(RENDERIZADORES)})")
+        self.confData = confData
+        self.al_terminar = al_terminar
+        self.metricas = metricas
+        self.workers = workers
+        self.cola = queue.Queue(maxsize=queue_size)
+        self.executor = None
+        self.hilo = None
+        if workers > 0:
+            metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(metodo))
+            self.hilo = threading.Thread(target=self._despachar, name='render', daemon=True)
+            self.hilo.start()
+
+    def enviar(self, snapshot):
+        """
+        Encola una foto del acumulador para renderizar.
+        """
+        if self.executor is None:
+            self._entregar(lambda: _RenderizarMedido(snapshot, self.confData))
+        else:
+            self.cola.put(snapshot)
+
+    def pendientes(self):
+        """
+        Devuelve la cantidad de fotos que esperan ser enviadas al pool.
+        """
+        return self.cola.qsize()
+
+    def _entregar(self, obtener_resultado):
+        try:
+            output_path, segundos = obtener_resultado()
+            if self.metricas is not None:
+                self.metricas.observar('render', segundos)
+            self.al_terminar(output_path)
+        except Exception as e:
+            logging.error(f"Error al renderizar el mapa: {e}")
+
+    def _despachar(self):
+        en_vuelo = deque()
+        while True:
+            try:
+                snapshot = self.cola.get(timeout=0.5)
+            except queue.Empty:
+                snapshot = None
+            if snapshot is self._FIN:
+                break
+            if snapshot is not None:
+                # No se envían al pool más trabajos que procesos: el resto espera en la cola acotada
+                while len(en_vuelo) >= self.workers:
+                    self._entregar(en_vuelo.popleft().result)
+                en_vuelo.append(self.executor.submit(_RenderizarMedido, snapshot, self.confData))
+            while en_vuelo and en_vuelo[0].done():
+                self._entregar(en_vuelo.popleft().result)
+        while en_vuelo:
+            self._entregar(en_vuelo.popleft().result)
+
+    def cerrar(self):
+        """
+        Termina de renderizar lo pendiente y libera el pool de procesos.
+        """
+        if self.executor is not None:
+            self.cola.put(self._FIN)
+            self.hilo.join()
+            self.executor.shutdown()
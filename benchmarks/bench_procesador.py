@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+
+benchdir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(benchdir, '..', 'Procesador'))
+sys.path.insert(0, benchdir)
+
+import src.helpers as helpers
+import src.render as render
+from src.helpers import GetCroppedImage, GetCalibratedImage, GetThresholdMask, GetThresholdMasks, GetRegionExtent, LoadDictionary
+from src.acumulador import AcumuladorPersistencia
+from src.almacen import AlmacenAcumulado
+from src.animacion import Animacion
+from sintetico import CrearArchivoABI, NombreArchivoABI, TAMANO_DISCO_COMPLETO_2KM
+from medicion import Medir, GuardarResultados, Comparar, Version
+
+confData = LoadDictionary(os.path.join(benchdir, '..', 'Procesador', 'data', 'conf', 'SMN_dict.conf'))
+T_U = -53
+UMBRALES = [-32, -53, -70]
+
+
+class Cronometro:
+    """
+    Reemplaza temporalmente una función de un módulo por una versión que acumula
+    su tiempo de ejecución, para medir una etapa dentro de una función mayor.
+    """
+
+    def __init__(self, modulo, nombre):
+        self.modulo = modulo
+        self.nombre = nombre
+        self.original = getattr(modulo, nombre)
+        self.segundos = []
+
+    def __enter__(self):
+        def cronometrada(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return self.original(*args, **kwargs)
+            finally:
+                self.segundos.append(time.perf_counter() - inicio)
+        setattr(self.modulo, self.nombre, cronometrada)
+        return self
+
+    def __exit__(self, *args):
+        setattr(self.modulo, self.nombre, self.original)
+
+
+def ArchivoSintetico(datos, banda, tamano, tiempo):
+    """
+    Devuelve la ruta de un archivo sintético, generándolo si no existe en el directorio de datos.
+    """
+    path = os.path.join(datos, str(tamano), NombreArchivoABI(banda, tiempo))
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logging.info(f"Generando archivo sintético {path}")
+        CrearArchivoABI(path + '.tmp', banda, tiempo, tamano)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def EjecutarSuite(datos, tamano, repeticiones, repeticiones_render, cuadros):
+    """
+    Mide por separado cada etapa del procesamiento de una imagen.
+
+    :return: Diccionario etapa -> resultado de Medir, o {'error': ...} si la etapa no se pudo ejecutar.
+    """
+    etapas = {}
+    tiempo = datetime(2024, 11, 26, 12, 0, 20)
+    image_file = ArchivoSintetico(datos, 13, tamano, tiempo)
+    extent = GetRegionExtent(confData, 'ARG')
+    limites = (extent[0] + confData['delta_lon_W_for_graph'], extent[1],
+               extent[2] + confData['delta_lat_S_for_graph'], extent[3] + confData['delta_lat_N_for_graph'])
+    trabajo = tempfile.mkdtemp(prefix='bench_procesador_')
+
+    # El cache de índices de recorte se aísla en el directorio de trabajo para no tocar data/grids
+    grids_dir = os.path.join(trabajo, 'grids') + '/'
+    get_grids_dir = helpers._GetGridsDir
+    helpers._GetGridsDir = lambda: grids_dir
+
+    def limpiar_cache_recorte():
+        helpers._crop_cache = None
+        shutil.rmtree(grids_dir, ignore_errors=True)
+
+    try:
+        netCDFread = Dataset(image_file, 'r')
+
+        etapas['GetCroppedImage_sin_cache'] = Medir(lambda: GetCroppedImage(netCDFread, *limites), repeticiones,
+                                                    preparar=limpiar_cache_recorte)
+        etapas['GetCroppedImage'] = Medir(lambda: GetCroppedImage(netCDFread, *limites), repeticiones)
+        img_extent, img_indexes = GetCroppedImage(netCDFread, *limites)
+
+        def leer():
+            with Dataset(image_file, 'r') as nc:
+                return nc.variables['Rad'][img_indexes[2]:img_indexes[3], img_indexes[0]:img_indexes[1]]
+        etapas['lectura_rad'] = Medir(leer, repeticiones)
+        image = leer()
+
+        etapas['GetCalibratedImage'] = Medir(lambda: GetCalibratedImage(netCDFread, image), repeticiones)
+        copia = {}
+        etapas['GetCalibratedImage_inplace'] = Medir(lambda: GetCalibratedImage(netCDFread, copia['imagen'], inplace=True),
+                                                     repeticiones,
+                                                     preparar=lambda: copia.update(imagen=image.astype(np.float32)))
+        etapas['GetThresholdMask'] = Medir(lambda: GetThresholdMask(netCDFread, image, T_U), repeticiones)
+        mascara = GetThresholdMask(netCDFread, image, T_U)
+        # Varios umbrales en una sola pasada sobre la radiancia del recorte
+        etapas[f'GetThresholdMasks_{len(UMBRALES)}'] = Medir(lambda: GetThresholdMasks(netCDFread, image, UMBRALES), repeticiones)
+
+        # Acumulación en régimen: ventana de 24 horas llena y persistida en disco
+        acumulador = AcumuladorPersistencia(144, os.path.join(trabajo, 'estado'))
+        rng = np.random.default_rng(0)
+        for i in range(144):
+            acumulador.agregar(np.roll(mascara, rng.integers(0, 50), axis=1), tiempo - timedelta(minutes=10 * (144 - i)))
+        siguiente = {'tiempo': tiempo}
+
+        def acumular():
+            siguiente['tiempo'] += timedelta(minutes=10)
+            acumulador.agregar(mascara, siguiente['tiempo'])
+        etapas['acumulacion'] = Medir(acumular, repeticiones)
+
+        # Guardado del acumulado en cada cuadro: el arreglo completo con np.save contra el almacén en tiles
+        proyeccion = netCDFread.variables['goes_imager_projection']
+        georreferencia = {'x': netCDFread.variables['x'][img_indexes[0]:img_indexes[1]],
+                          'y': netCDFread.variables['y'][img_indexes[2]:img_indexes[3]],
+                          'proyeccion': {nombre: proyeccion.getncattr(nombre) for nombre in proyeccion.ncattrs()}}
+        etapas['guardado_npy'] = Medir(lambda: np.save(os.path.join(trabajo, 'accum.npy'), acumulador.conteo),
+                                       repeticiones, preparar=acumular)
+        almacen = AlmacenAcumulado(os.path.join(trabajo, 'acumulado.nc'))
+        almacen.escribir({'conteo': acumulador.conteo}, siguiente['tiempo'], georreferencia)
+        etapas['guardado_almacen'] = Medir(lambda: almacen.escribir({'conteo': acumulador.conteo}, siguiente['tiempo'],
+                                                                    georreferencia),
+                                           repeticiones, preparar=acumular)
+        almacen.cerrar()
+        metadata = render.GetImageMetadata(netCDFread)
+        netCDFread.close()
+
+        # Render: GetPlotObject y savefig se miden dentro de RenderizarMapa
+        png = os.path.join(trabajo, 'permanencia.png')
+        snapshot = render.CrearSnapshot(acumulador.conteo, metadata, img_extent, extent, png)
+        try:
+            with Cronometro(render, 'GetPlotObject') as plot, Cronometro(render.plt, 'savefig') as savefig:
+                etapas['render_total'] = Medir(lambda: render.RenderizarMapa(snapshot, confData), repeticiones_render)
+            etapas['GetPlotObject'] = Resumir(plot.segundos)
+            etapas['savefig'] = Resumir(savefig.segundos)
+        except Exception as e:
+            logging.error(f"No se pudo medir el render: {e}")
+            for nombre in ('render_total', 'GetPlotObject', 'savefig'):
+                etapas[nombre] = {'error': f'{type(e).__name__}: {e}'}
+            # Cuadro de reemplazo del mismo tamaño que el mapa, para medir la animación de todas formas
+            render.plt.imsave(png, acumulador.conteo, cmap='jet')
+
+        # Render raster: la capa fija y la tabla de remuestreo se arman en la primera llamada, fuera de la medición
+        snapshot_raster = dict(snapshot, output_path=os.path.join(trabajo, 'permanencia_raster.png'))
+        try:
+            render.RenderizarMapaRaster(snapshot_raster, confData)
+            etapas['render_raster'] = Medir(lambda: render.RenderizarMapaRaster(snapshot_raster, confData), repeticiones)
+        except Exception as e:
+            logging.error(f"No se pudo medir el render raster: {e}")
+            etapas['render_raster'] = {'error': f'{type(e).__name__}: {e}'}
+
+        # Animación con la ventana de cuadros llena
+        animacion = Animacion(os.path.join(trabajo, 'conae.gif'), max_frames=cuadros,
+                              frame_duration=confData.get('gif_frame_duration', 1.0),
+                              scale=confData.get('gif_scale', 1.0), formato=confData.get('animation_format', 'gif'))
+        animacion.cargar([png] * cuadros)
+
+        def actualizar_gif():
+            animacion.agregar(png)
+            animacion.guardar()
+        etapas['actualizar_gif'] = Medir(actualizar_gif, repeticiones_render)
+    finally:
+        helpers._GetGridsDir = get_grids_dir
+        helpers._crop_cache = None
+        shutil.rmtree(trabajo, ignore_errors=True)
+    return etapas
+
+
+def Resumir(segundos):
+    """
+    Estadísticas de tiempos tomados con Cronometro (sin pico de memoria propio).
+    """
+    segundos = segundos[:-1] if len(segundos) > 1 else segundos  # La última llamada es la de la medición de memoria
+    return {
+        'segundos': [round(s, 6) for s in segundos],
+        'minimo': round(min(segundos), 6),
+        'mediana': round(float(np.median(segundos)), 6),
+        'media': round(float(np.mean(segundos)), 6),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de las etapas del procesador con imágenes GOES-16 sintéticas.')
+    parser.add_argument('--tamano', type=int, default=TAMANO_DISCO_COMPLETO_2KM,
+                        help='Filas y columnas del disco completo sintético (5424 = 2 km).')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones de las etapas rápidas.')
+    parser.add_argument('--repeticiones-render', type=int, default=3, help='Repeticiones del render y de la animación.')
+    parser.add_argument('--cuadros', type=int, default=confData.get('gif_max_frames', 144), help='Cuadros de la animación.')
+    parser.add_argument('--datos', default=os.path.join(benchdir, 'datos'), help='Directorio de los archivos sintéticos.')
+    parser.add_argument('--salida', default=None, help='Archivo JSON de resultados.')
+    parser.add_argument('--comparar', default=None, help='Archivo JSON de una ejecución anterior para comparar.')
+    parser.add_argument('--tolerancia', type=float, default=0.10,
+                        help='Aumento relativo de la mediana que se considera una regresión.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+
+    etapas = EjecutarSuite(args.datos, args.tamano, args.repeticiones, args.repeticiones_render, args.cuadros)
+    salida = args.salida or os.path.join(benchdir, 'resultados',
+                                         f"procesador_{Version() or 'sin_version'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    resultados = GuardarResultados(salida, 'procesador', etapas, {
+        'tamano': args.tamano, 'repeticiones': args.repeticiones,
+        'repeticiones_render': args.repeticiones_render, 'cuadros': args.cuadros})
+
+    for nombre, resultado in etapas.items():
+        if 'error' in resultado:
+            print(f"{nombre:<32}{'error: ' + resultado['error']}")
+        else:
+            print(f"{nombre:<32}{resultado['mediana']:>10.4f} s{resultado.get('memoria_pico_mb', float('nan')):>10.1f} MB")
+    print(f"Resultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar) as fp:
+            lineas, regresiones = Comparar(resultados, json.load(fp), args.tolerancia)
+        print('\n'.join(lineas))
+        if regresiones:
+            sys.exit(1)
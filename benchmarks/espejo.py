@@ -0,0 +1,85 @@
+import os
+import shutil
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+from netCDF4 import Dataset
+
+from sintetico import CrearArchivoABI, NombreArchivoABI, TAMANO_DISCO_COMPLETO_2KM
+
+raiz = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def RutaEspejo(directorio, banda, tiempo, producto='ABI-L1b-RadF', bucket='noaa-goes16'):
+    """
+    Devuelve la ruta de un archivo dentro del espejo local, con la estructura del bucket de la NOAA.
+
+    :param directorio: Directorio raíz del espejo.
+    :param banda: Número de banda.
+    :param tiempo: Inicio del escaneo (datetime).
+    """
+    return os.path.join(directorio, bucket, producto, tiempo.strftime('%Y'), tiempo.strftime('%j'),
+                        tiempo.strftime('%H'), NombreArchivoABI(banda, tiempo, producto))
+
+
+def CrearEspejo(directorio, desde, hasta, bandas=(8, 13), tamano=TAMANO_DISCO_COMPLETO_2KM, variantes=6,
+                periodo_minutos=10):
+    """
+    Llena un espejo local con un archivo sintético por banda para cada escaneo del período [desde, hasta).
+
+    Generar un archivo de disco completo lleva varios segundos, así que se generan
+    'variantes' campos distintos por banda y cada escaneo es una copia de uno de
+    ellos con su nombre y 'time_coverage_start' propios. Los archivos que ya
+    existen no se vuelven a escribir.
+
+    :param directorio: Directorio raíz del espejo.
+    :param desde: Inicio del primer escaneo (datetime).
+    :param hasta: Fin del período (datetime, excluido).
+    :param bandas: Bandas a generar.
+    :param tamano: Filas y columnas del disco completo.
+    :param variantes: Cantidad de campos distintos por banda.
+    :param periodo_minutos: Minutos entre escaneos (10 en el Modo 6).
+    :return: Cantidad de archivos escritos.
+    """
+    plantillas = os.path.join(directorio, 'plantillas', str(tamano))
+    os.makedirs(plantillas, exist_ok=True)
+    escritos = 0
+    tiempo = desde.replace(second=20, microsecond=0)
+    indice = 0
+    while tiempo < hasta:
+        for banda in bandas:
+            path = RutaEspejo(directorio, banda, tiempo)
+            if os.path.exists(path):
+                continue
+            plantilla = os.path.join(plantillas, f'C{banda:02d}_{indice % variantes}.nc')
+            if not os.path.exists(plantilla):
+                logging.info(f"Generando la plantilla {plantilla}")
+                CrearArchivoABI(plantilla + '.tmp', banda, tiempo, tamano, semilla=indice % variantes)
+                os.replace(plantilla + '.tmp', plantilla)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(plantilla, path + '.tmp')
+            with Dataset(path + '.tmp', 'a') as nc:
+                nc.time_coverage_start = tiempo.strftime('%Y-%m-%dT%H:%M:%S.') + f'{tiempo.microsecond // 100000}Z'
+            os.replace(path + '.tmp', path)
+            escritos += 1
+        tiempo += timedelta(minutes=periodo_minutos)
+        indice += 1
+    return escritos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Genera un espejo local del bucket noaa-goes16 con imágenes sintéticas.')
+    parser.add_argument('--directorio', default=os.path.join(raiz, 'espejo'), help='Directorio raíz del espejo.')
+    parser.add_argument('--desde', required=True, type=datetime.fromisoformat, help='Inicio del período (AAAA-MM-DDTHH:MM).')
+    parser.add_argument('--horas', type=float, default=24, help='Duración del período en horas.')
+    parser.add_argument('--bandas', type=int, nargs='+', default=[8, 13], help='Bandas a generar.')
+    parser.add_argument('--tamano', type=int, default=TAMANO_DISCO_COMPLETO_2KM,
+                        help='Filas y columnas del disco completo sintético (5424 = 2 km).')
+    parser.add_argument('--variantes', type=int, default=6, help='Campos distintos por banda.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+    escritos = CrearEspejo(args.directorio, args.desde, args.desde + timedelta(hours=args.horas), args.bandas,
+                           args.tamano, args.variantes)
+    print(f"Se escribieron {escritos} archivos en {args.directorio}")
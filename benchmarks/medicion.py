@@ -0,0 +1,135 @@
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import resource
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+raiz = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def Medir(funcion, repeticiones=5, preparar=None):
+    """
+    Mide el tiempo de una etapa y su pico de memoria.
+
+    Cada repetición se cronometra sin trazar la memoria; el pico de memoria se
+    mide en una repetición adicional con tracemalloc (numpy informa sus
+    arreglos a tracemalloc), para que el trazado no altere los tiempos.
+
+    :param funcion: Función sin argumentos a medir.
+    :param repeticiones: Cantidad de repeticiones cronometradas.
+    :param preparar: Función sin argumentos que se llama antes de cada repetición, fuera del cronómetro.
+    :return: Diccionario con los tiempos (segundos), sus estadísticas y el pico de memoria en MB.
+    """
+    segundos = []
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        gc.collect()
+        inicio = time.perf_counter()
+        funcion()
+        segundos.append(time.perf_counter() - inicio)
+
+    if preparar is not None:
+        preparar()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'segundos': [round(s, 6) for s in segundos],
+        'minimo': round(min(segundos), 6),
+        'mediana': round(statistics.median(segundos), 6),
+        'media': round(statistics.fmean(segundos), 6),
+        'memoria_pico_mb': round(pico / 2**20, 2),
+    }
+
+
+def Version():
+    """
+    Devuelve el commit actual del repositorio (con '-modificado' si hay cambios sin confirmar), o None.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=raiz, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        cambios = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=raiz,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-modificado' if cambios else '')
+    except Exception:
+        return None
+
+
+def Entorno():
+    """
+    Datos del entorno de ejecución, para comparar solo resultados comparables.
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def GuardarResultados(path, suite, etapas, parametros):
+    """
+    Escribe los resultados de una suite en JSON.
+
+    :param path: Ruta del archivo de resultados.
+    :param suite: Nombre de la suite.
+    :param etapas: Diccionario etapa -> resultado de Medir (o {'error': ...}).
+    :param parametros: Parámetros con los que se ejecutó la suite.
+    :return: Diccionario escrito.
+    """
+    resultados = {
+        'suite': suite,
+        'version': Version(),
+        'fecha': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'entorno': Entorno(),
+        'parametros': parametros,
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        'memoria_maxima_proceso_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                                           / (2**20 if sys.platform == 'darwin' else 2**10), 1),
+        'etapas': etapas,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as fp:
+        json.dump(resultados, fp, indent=2, ensure_ascii=False)
+    return resultados
+
+
+def Comparar(actual, base, tolerancia=0.10):
+    """
+    Compara la mediana de cada etapa con la de una ejecución anterior.
+
+    :param actual: Resultados actuales (diccionario de GuardarResultados).
+    :param base: Resultados de referencia.
+    :param tolerancia: Aumento relativo de la mediana a partir del cual una etapa se considera una regresión.
+    :return: Tupla (líneas de la tabla comparativa, lista de etapas con regresión).
+    """
+    lineas = [f"{'etapa':<32}{'base (s)':>12}{'actual (s)':>12}{'relación':>10}"]
+    regresiones = []
+    for nombre, resultado in actual['etapas'].items():
+        anterior = base['etapas'].get(nombre, {})
+        if 'mediana' not in resultado or 'mediana' not in anterior:
+            lineas.append(f"{nombre:<32}{'-':>12}{resultado.get('mediana', '-'):>12}{'-':>10}")
+            continue
+        relacion = resultado['mediana'] / anterior['mediana'] if anterior['mediana'] > 0 else float('inf')
+        marca = ''
+        if relacion > 1 + tolerancia:
+            regresiones.append(nombre)
+            marca = '  <- regresión'
+        lineas.append(f"{nombre:<32}{anterior['mediana']:>12.4f}{resultado['mediana']:>12.4f}{relacion:>10.2f}{marca}")
+    return lineas, regresiones
@@ -0,0 +1,149 @@
+import numpy as np
+from datetime import datetime
+from netCDF4 import Dataset
+
+# Coeficientes de Planck de GOES-16 para las bandas emisivas usadas por el procesador
+PLANCK = {
+    8: {'planck_fk1': 50805.2, 'planck_fk2': 2401.74, 'planck_bc1': 1.5, 'planck_bc2': 0.9969},
+    13: {'planck_fk1': 10803.3, 'planck_fk2': 1392.74, 'planck_bc1': 0.0755, 'planck_bc2': 0.99975},
+}
+
+# Proyección geoestacionaria de GOES-Este
+PROYECCION = {
+    'grid_mapping_name': 'geostationary',
+    'perspective_point_height': 35786023.0,
+    'semi_major_axis': 6378137.0,
+    'semi_minor_axis': 6356752.31414,
+    'inverse_flattening': 298.2572221,
+    'latitude_of_projection_origin': 0.0,
+    'longitude_of_projection_origin': -75.0,
+    'sweep_angle_axis': 'x',
+}
+
+# Ángulo de escaneo del borde de la grilla fija del disco completo (radianes)
+BORDE_DISCO = 0.151844
+TAMANO_DISCO_COMPLETO_2KM = 5424
+MAXIMO_CUENTAS = 4094
+FILL_VALUE = 4095
+
+
+def NombreArchivoABI(banda, tiempo, producto='ABI-L1b-RadF'):
+    """
+    Devuelve el nombre de archivo ABI L1b según la convención de la NOAA.
+
+    :param banda: Número de banda.
+    :param tiempo: Inicio del escaneo (datetime).
+    """
+    inicio = tiempo.strftime('%Y%j%H%M%S') + str(tiempo.microsecond // 100000)
+    return f"OR_{producto}-M6C{banda:02d}_G16_s{inicio}_e{inicio}_c{inicio}.nc"
+
+
+def Radiancia(temperatura_k, banda):
+    """
+    Inversa de la calibración del ABI: radiancia a partir de la temperatura de brillo en Kelvin.
+    """
+    c = PLANCK[banda]
+    return c['planck_fk1'] / (np.exp(c['planck_fk2'] / (c['planck_bc1'] + c['planck_bc2'] * temperatura_k)) - 1)
+
+
+def CampoTemperatura(tamano, banda=13, semilla=0, nubes=60):
+    """
+    Genera un campo de temperatura de brillo (K) con fondo cálido y sistemas
+    nubosos fríos de distintos tamaños, suave a la escala de unos pocos píxeles.
+
+    :param tamano: Filas y columnas del campo.
+    :param banda: Banda; en C08 (vapor de agua) el fondo es más frío y menos contrastado.
+    :param semilla: Semilla del generador aleatorio.
+    :param nubes: Cantidad de sistemas nubosos.
+    :return: Arreglo float32 de forma (tamano, tamano).
+    """
+    rng = np.random.default_rng(semilla)
+    # Se construye a baja resolución y se amplía, como un campo nuboso real sin ruido píxel a píxel
+    factor = max(1, tamano // 340)
+    n = -(-tamano // factor)
+    yy, xx = np.mgrid[0:n, 0:n].astype(np.float32) / n
+    fondo = 295.0 - 25.0 * np.abs(yy - 0.5) * 2
+    enfriamiento = np.zeros((n, n), dtype=np.float32)
+    for _ in range(nubes):
+        cy, cx = rng.uniform(0, 1, 2)
+        radio = rng.uniform(0.005, 0.06)
+        intensidad = rng.uniform(20, 110)
+        enfriamiento = np.maximum(enfriamiento, intensidad * np.exp(-((yy - cy) ** 2 + (xx - cx) ** 2) / (2 * radio ** 2)))
+    campo = fondo - enfriamiento + rng.normal(0, 1.0, (n, n)).astype(np.float32)
+    if banda == 8:
+        campo = 235.0 + (campo - 235.0) * 0.35
+    campo = np.repeat(np.repeat(campo, factor, axis=0), factor, axis=1)[:tamano, :tamano]
+    # Ruido del sensor a la escala del píxel: la compresión de 'Rad' queda en el orden de la de los archivos reales
+    campo += rng.normal(0, 0.3, campo.shape).astype(np.float32)
+    return np.clip(campo, 180.0, 320.0).astype(np.float32)
+
+
+def CrearArchivoABI(path, banda=13, tiempo=None, tamano=TAMANO_DISCO_COMPLETO_2KM, semilla=0):
+    """
+    Escribe un archivo sintético ABI L1b de disco completo con la estructura de los
+    archivos de la NOAA: 'Rad' en cuentas int16 comprimidas por chunks con
+    scale_factor/add_offset, coordenadas 'x'/'y' escaladas, 'goes_imager_projection',
+    coeficientes de Planck, 'band_id' y los atributos 'spatial_resolution' y
+    'time_coverage_start'. Los píxeles fuera del disco terrestre quedan sin dato.
+
+    :param path: Ruta del archivo a crear.
+    :param banda: Banda emisiva (8 o 13).
+    :param tiempo: Inicio del escaneo (datetime); por defecto 2024-11-26 12:00:20.
+    :param tamano: Filas y columnas del disco completo (5424 = 2 km en el nadir).
+    :param semilla: Semilla del generador aleatorio.
+    :return: Ruta del archivo creado.
+    """
+    tiempo = tiempo or datetime(2024, 11, 26, 12, 0, 20)
+    escala_xy = 2 * BORDE_DISCO / (tamano - 1)
+    resolucion_km = 2.0 * TAMANO_DISCO_COMPLETO_2KM / tamano
+
+    # Cuentas a partir de la temperatura de brillo, con la escala de radiancia del rango 180-330 K
+    radiancia_maxima = float(Radiancia(np.float64(330.0), banda))
+    scale_factor = np.float32(radiancia_maxima / MAXIMO_CUENTAS)
+    add_offset = np.float32(-scale_factor * 8)
+    cuentas = np.rint((Radiancia(CampoTemperatura(tamano, banda, semilla), banda) - add_offset) / scale_factor)
+    cuentas = np.clip(cuentas, 0, MAXIMO_CUENTAS).astype(np.int16)
+
+    angulos = (-BORDE_DISCO + escala_xy * np.arange(tamano)).astype(np.float32)
+    fuera_del_disco = np.hypot(angulos[None, :] / 0.1518, angulos[::-1, None] / 0.1513) > 1
+    cuentas[fuera_del_disco] = FILL_VALUE
+
+    with Dataset(path, 'w', format='NETCDF4') as nc:
+        nc.spatial_resolution = f'{resolucion_km:g}km at nadir'
+        nc.time_coverage_start = tiempo.strftime('%Y-%m-%dT%H:%M:%S.') + f'{tiempo.microsecond // 100000}Z'
+        nc.platform_ID = 'G16'
+        nc.scene_id = 'Full Disk'
+        nc.createDimension('y', tamano)
+        nc.createDimension('x', tamano)
+
+        x = nc.createVariable('x', 'i2', ('x',))
+        x.scale_factor = np.float32(escala_xy)
+        x.add_offset = np.float32(-BORDE_DISCO)
+        x.units = 'rad'
+        x[:] = angulos
+        y = nc.createVariable('y', 'i2', ('y',))
+        y.scale_factor = np.float32(-escala_xy)
+        y.add_offset = np.float32(BORDE_DISCO)
+        y.units = 'rad'
+        y[:] = angulos[::-1]
+
+        proj = nc.createVariable('goes_imager_projection', 'i4')
+        proj.setncatts(PROYECCION)
+
+        band_id = nc.createVariable('band_id', 'i1')
+        band_id[:] = banda
+        for nombre, valor in PLANCK[banda].items():
+            var = nc.createVariable(nombre, 'f4')
+            var[:] = valor
+
+        chunk = min(226, tamano)
+        rad = nc.createVariable('Rad', 'i2', ('y', 'x'), zlib=True, complevel=1, chunksizes=(chunk, chunk),
+                                fill_value=np.int16(FILL_VALUE))
+        rad.scale_factor = scale_factor
+        rad.add_offset = add_offset
+        rad.units = 'mW m-2 sr-1 (cm-1)-1'
+        rad.grid_mapping = 'goes_imager_projection'
+        rad.valid_range = np.array([0, MAXIMO_CUENTAS], dtype=np.int16)
+        rad.set_auto_maskandscale(False)
+        rad[:] = cuentas
+    return path
@@ -0,0 +1,285 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import datetime
+import contextlib
+from collections import deque
+import s3fs
+import helpers as help
+import recorte
+from ledger import getBand
+from schedule import getScanStart
+from verificacion import StreamVerifier, checkNetcdf
+
+
+class CatchUp:
+    """
+    Recuperación concurrente de horas pasadas.
+
+    Lista por adelantado varias horas y descarga los archivos de las próximas
+    a la vez, con un único límite global de descargas simultáneas y una sola
+    sesión S3 asíncrona (un único pool de conexiones). Los archivos se
+    descargan a la carpeta temporal y cada hora se confirma (se mueve al inbox
+    y se registra en el ledger) recién cuando ella y todas las anteriores están
+    completas, de modo que el procesador recibe las imágenes en orden. Como
+    máximo max_pending_hours horas quedan descargadas o en descarga sin
+    confirmar, lo que acota el espacio ocupado en la carpeta temporal.
+
+    La recuperación termina en la primera hora que no se pudo completar, o al
+    llegar a las horas que todavía se están publicando: desde ahí sigue el
+    bucle de descarga en vivo.
+    """
+
+    def __init__(self, ledger, product, bands, temp_path, final_path, root_path='s3://noaa-goes16/',
+                 max_concurrency=16, lookahead_hours=24, max_pending_hours=3, margin_minutes=20, region_crop=None,
+                 sync_fs=None, fs=None, block_size=4 * 2**20, on_scan=None, metrics=None, logger=None):
+        """
+        Args:
+            ledger (DownloadLedger): Registro de archivos descargados.
+            product (str): Producto a descargar (por ejemplo 'ABI-L1b-RadF').
+            bands (list): Bandas a descargar.
+            temp_path (str): Carpeta temporal de descarga.
+            final_path (str): Carpeta de entrada del procesador.
+            root_path (str): Raíz del repositorio remoto.
+            max_concurrency (int): Máximo de descargas simultáneas entre todas las horas.
+            lookahead_hours (int): Cantidad de horas que se listan por adelantado.
+            max_pending_hours (int): Máximo de horas descargadas o en descarga sin confirmar.
+            margin_minutes (int): Minutos después del fin de una hora a partir de los cuales se la considera publicada.
+            region_crop (dict): Configuración 'recorte' de setup.json, opcional.
+            sync_fs (s3fs.S3FileSystem): Sistema de archivos sincrónico, necesario para la descarga con recorte.
+            fs (s3fs.S3FileSystem): Sistema de archivos asíncrono; si no se indica, se crea uno anónimo.
+            block_size (int): Tamaño de los bloques de lectura en bytes.
+            on_scan (callable): Función que recibe el diccionario banda -> ruta en el inbox de cada escaneo entregado, opcional.
+            metrics (metricas.Registro): Registro donde se miden los listados y las descargas, opcional.
+            logger (logging.Logger): Logger a utilizar.
+        """
+        self.ledger = ledger
+        self.product = product
+        self.bands = bands
+        self.temp_path = temp_path
+        self.final_path = final_path
+        self.root_path = root_path
+        self.max_concurrency = max_concurrency
+        self.lookahead_hours = lookahead_hours
+        self.max_pending_hours = max(1, max_pending_hours)
+        self.margin = datetime.timedelta(minutes=margin_minutes)
+        self.region_crop = region_crop or {}
+        self.sync_fs = sync_fs
+        self.fs = fs
+        self.block_size = block_size
+        self.on_scan = on_scan
+        self.metrics = metrics
+        self.logger = logger or logging.getLogger(__name__)
+
+    def _timed(self, stage):
+        return self.metrics.medir(stage) if self.metrics is not None else contextlib.nullcontext()
+
+    def pastHours(self, start_datetime, end_datetime=None, now=None):
+        """
+        Devuelve las horas desde start_datetime que ya terminaron de publicarse.
+
+        Args:
+            start_datetime (datetime.datetime): Primera hora a recuperar.
+            end_datetime (datetime.datetime): Última fecha y hora a descargar, opcional.
+            now (datetime.datetime): Fecha y hora actual (UTC), opcional.
+
+        Returns:
+            list: Horas (datetime.datetime) en orden cronológico.
+        """
+        now = now or datetime.datetime.utcnow()
+        hours = []
+        current = start_datetime.replace(minute=0, second=0, microsecond=0)
+        while current + datetime.timedelta(hours=1) + self.margin <= now:
+            if end_datetime and current > end_datetime:
+                break
+            hours.append(current)
+            current += datetime.timedelta(hours=1)
+        return hours
+
+    def _expectedFiles(self, listing, year, day, hour):
+        prefixes = tuple(help.getFilePrefix(self.product, band, year, day, hour) for band in self.bands)
+        return {info['name']: info for info in listing if info['name'].split('/')[-1].startswith(prefixes)}
+
+    async def _list(self, semaphore, hour_datetime):
+        remotePath, year, day, hour = help.getRemotePath(self.root_path, self.product, hour_datetime)
+        async with semaphore:
+            try:
+                with self._timed('s3_listado'):
+                    listing = await self.fs._ls(remotePath, detail=True, refresh=True)
+            except FileNotFoundError:
+                listing = []
+        return self._expectedFiles(listing, year, day, hour)
+
+    async def _streamFile(self, f, info, temp_file_path):
+        # Los bytes se verifican a medida que llegan, sin releer el archivo
+        verifier = StreamVerifier(info['size'], info.get('ETag'))
+        src = await self.fs.open_async(f, 'rb')
+        try:
+            with open(temp_file_path, 'wb') as dst:
+                while True:
+                    data = await src.read(self.block_size)
+                    if not data:
+                        break
+                    verifier.update(data)
+                    dst.write(data)
+        finally:
+            await src.close()
+        verifier.verify()
+
+    @staticmethod
+    async def _inThread(func, *args):
+        # Cancelar la espera no detiene el hilo: se espera a que termine antes de
+        # seguir, para no borrar un archivo que el hilo todavía está escribiendo
+        future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait({future})
+            raise
+
+    async def _download(self, semaphore, f, info):
+        image_name = f.split('/')[-1]
+        temp_file_path = os.path.join(self.temp_path, image_name)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if self.region_crop.get('habilitado', False):
+                    await self._inThread(recorte.downloadRegion, self.sync_fs, f, temp_file_path, self.region_crop['extension'])
+                else:
+                    await self._streamFile(f, info, temp_file_path)
+                if self.metrics is not None:
+                    self.metrics.registrar_descarga(os.path.getsize(temp_file_path), time.perf_counter() - start)
+                with self._timed('verificacion_netcdf'):
+                    await self._inThread(checkNetcdf, temp_file_path)
+            except asyncio.CancelledError:
+                # Una descarga cancelada no deja su archivo parcial en la carpeta temporal
+                if os.path.exists(temp_file_path):
+                    os.remove(temp_file_path)
+                raise
+            except Exception as e:
+                self.logger.error(f'Error al descargar el archivo {image_name}: {str(e)}')
+                if os.path.exists(temp_file_path):
+                    os.remove(temp_file_path)
+                return None
+        return f, temp_file_path, os.path.getsize(temp_file_path)
+
+    async def _downloadHour(self, semaphore, hour_datetime, listing):
+        files = {f: info for f, info in (await listing).items() if not self.ledger.contains(f)}
+        downloads = [asyncio.ensure_future(self._download(semaphore, f, info)) for f, info in sorted(files.items())]
+        try:
+            results = await asyncio.gather(*downloads)
+        except asyncio.CancelledError:
+            # Se espera a que terminen de cancelarse y se borran los archivos que ya estaban completos
+            results = await asyncio.gather(*downloads, return_exceptions=True)
+            self._discard([r for r in results if isinstance(r, tuple)])
+            raise
+        return [r for r in results if r is not None]
+
+    @staticmethod
+    def _discard(downloads):
+        for download in downloads:
+            if os.path.exists(download[1]):
+                os.remove(download[1])
+
+    async def _cancel(self, tasks):
+        # Horas que no se van a confirmar: se cancelan y se borran sus archivos temporales
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, list):
+                self._discard(result)
+
+    def _commit(self, hour_datetime, downloads):
+        _, year, day, hour = help.getRemotePath(self.root_path, self.product, hour_datetime)
+        scans = {}
+        for f, temp_file_path, size in downloads:
+            scans.setdefault(getScanStart(f), []).append((getBand(f), f, temp_file_path, size))
+        # Cada escaneo se entrega con todas sus bandas juntas, en orden cronológico
+        for scan_start in sorted(scans, key=lambda t: (t is None, t)):
+            files = sorted(scans[scan_start])
+            # Las bandas ya registradas del escaneo cuentan para completarlo
+            registered = self.ledger.scanFiles(scan_start)
+            if not set(self.bands) <= {band for band, _, _, _ in files} | set(registered) and scan_start is not None:
+                self.logger.warning(f'El escaneo {scan_start} no tiene todas sus bandas; no se entrega')
+                for _, _, temp_file_path, _ in files:
+                    os.remove(temp_file_path)
+                continue
+            delivered = {band: os.path.join(self.final_path, os.path.basename(f)) for band, f in registered.items()
+                         if os.path.exists(os.path.join(self.final_path, os.path.basename(f)))}
+            for band, f, temp_file_path, size in files:
+                delivered[band] = os.path.join(self.final_path, os.path.basename(temp_file_path))
+                shutil.move(temp_file_path, delivered[band])
+                self.ledger.add(f, year, day, hour, band=band, size=size)
+            if self.on_scan is not None:
+                self.on_scan(delivered)
+        return self.ledger.countHour(year, day, hour) >= self.ledger.files_per_hour
+
+    async def run(self, start_datetime, end_datetime=None, now=None):
+        """
+        Recupera las horas pasadas desde start_datetime.
+
+        Args:
+            start_datetime (datetime.datetime): Primera hora a recuperar.
+            end_datetime (datetime.datetime): Última fecha y hora a descargar, opcional.
+            now (datetime.datetime): Fecha y hora actual (UTC), opcional.
+
+        Returns:
+            datetime.datetime: Primera hora que no quedó completa, desde donde debe seguir la descarga en vivo.
+        """
+        hours = self.pastHours(start_datetime, end_datetime, now)
+        if not hours:
+            return start_datetime
+        self.logger.info(f'Recuperando {len(hours)} horas pasadas desde {hours[0]} con hasta {self.max_concurrency} descargas simultáneas')
+
+        session = None
+        if self.fs is None:
+            self.fs = s3fs.S3FileSystem(anon=True, asynchronous=True, skip_instance_cache=True,
+                                        config_kwargs={'max_pool_connections': self.max_concurrency})
+            session = await self.fs.set_session()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        listings = []
+        # Horas descargadas o en descarga, todavía sin confirmar: (hora, tarea)
+        pending = deque()
+        launched = 0
+        try:
+            while launched < len(hours) or pending:
+                # Se listan hasta lookahead_hours horas por adelantado...
+                while len(listings) < min(len(hours), launched + self.lookahead_hours):
+                    listings.append(asyncio.ensure_future(self._list(semaphore, hours[len(listings)])))
+                # ...y se descargan a la vez como máximo max_pending_hours horas sin confirmar
+                while launched < len(hours) and len(pending) < self.max_pending_hours:
+                    pending.append((hours[launched], asyncio.ensure_future(
+                        self._downloadHour(semaphore, hours[launched], listings[launched]))))
+                    launched += 1
+                # Las horas se confirman en orden, hasta la primera incompleta
+                h, task = pending[0]
+                downloads = await task
+                pending.popleft()
+                if not self._commit(h, downloads):
+                    self.logger.warning(f'La hora {h} quedó incompleta; se continúa en modo en vivo desde ahí')
+                    return h
+                self.logger.info(f'Hora {h} recuperada')
+        finally:
+            # Las horas posteriores a una incompleta (o a un error o una cancelación) no se confirman
+            await self._cancel([task for _, task in pending] + listings[launched:])
+            if session is not None:
+                await session.close()
+        return hours[-1] + datetime.timedelta(hours=1)
+
+
+def runCatchUp(start_datetime, end_datetime=None, now=None, **kwargs):
+    """
+    Ejecuta la recuperación de horas pasadas en un bucle de eventos propio.
+
+    Args:
+        start_datetime (datetime.datetime): Primera hora a recuperar.
+        end_datetime (datetime.datetime): Última fecha y hora a descargar, opcional.
+        now (datetime.datetime): Fecha y hora actual (UTC), opcional.
+        **kwargs: Argumentos de CatchUp.
+
+    Returns:
+        datetime.datetime: Hora desde la que debe seguir la descarga en vivo.
+    """
+    return asyncio.run(CatchUp(**kwargs).run(start_datetime, end_datetime, now))
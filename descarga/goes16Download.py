@@ -1,17 +1,30 @@
 import logging
-import time
 import json
+import time
+import sys
 import s3fs
 import datetime
 import os
 import shutil
+import threading
 import helpers as help
+import recorte
+import catchup
+from replay import ReplayClock, LocalFileSystem
+from schedule import ScanSchedule, getScanStart
+from latencia import LatencyStats, toUtc
+from transfer import RangeDownloader
+from verificacion import StreamVerifier, VerificationError, checkNetcdf, streamCopy
+from ledger import DownloadLedger
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logging.basicConfig(level=logging.DEBUG)
 
 # Obtiene la ruta absoluta al directorio del script
 script_dir = os.path.dirname(os.path.abspath(__file__))
+# Las métricas se comparten con el procesador desde la raíz del proyecto
+sys.path.insert(0, os.path.join(script_dir, '..'))
+import metricas  # noqa: E402
 # Construye la ruta absoluta al archivo de configuración
 setup_file = os.path.join(script_dir, 'setup.json')
 
@@ -32,6 +45,25 @@ start_hour = data.get('start_hour', '00:00')  # Hora de inicio para realizar la
 end_date = data.get('end_date', None)  # Fecha de fin para realizar la descarga
 end_hour = data.get('end_hour', None)  # Hora de fin para realizar la descarga
 max_workers = data.get('max_workers', 1)  # Número de descargas paralelas
+region_crop = data.get('recorte', {})  # Descarga parcial de la región de interés
+if region_crop.get('habilitado', False):
+    # La ventana de descarga debe cubrir todas las regiones del procesador; si no, se detiene al iniciar
+    region_crop = dict(region_crop, extension=recorte.getCropExtent(region_crop))
+catchup_conf = data.get('recuperacion', {})  # Recuperación concurrente de horas pasadas
+schedule_conf = data.get('deteccion', {})  # Detección de archivos nuevos según el calendario de escaneo
+latency_conf = data.get('latencia', {})  # Estadísticas de latencia para programar las consultas
+transfer_conf = data.get('transferencia', {})  # Descarga de cada archivo en partes paralelas
+source_conf = data.get('origen', {})  # Repositorio remoto (S3) o espejo local reproducido a N× velocidad
+local_source = source_conf.get('tipo', 's3') == 'local'
+
+if local_source:
+    # El reloj simulado arranca en 'inicio' (por defecto, la fecha y hora de inicio de la descarga)
+    replay_start = source_conf.get('inicio') or f"{dates[0]}T{start_hour}"
+    clock = ReplayClock(datetime.datetime.fromisoformat(replay_start), speed=source_conf.get('velocidad', 1))
+    # Registro y latencias propios, para no mezclar la reproducción con las descargas reales
+    db_path = os.path.join(db_path, 'replay')
+else:
+    clock = ReplayClock()
 
 # Verificar y crear carpetas necesarias
 for path in [image_path, temp_path, db_path, log_path]:
@@ -41,82 +73,77 @@ for path in [image_path, temp_path, db_path, log_path]:
 # Configuración del archivo de logging
 logger, logfile = help.createLogger(__file__, log_path)
 
-# Configuro las credenciales anónimas para acceder al servidor de imágenes
-logger.info('Configurando las credenciales de acceso al repositorio remoto')
-fs = s3fs.S3FileSystem(anon=True)
-
-# Verificar conexión a S3
-while True:
-    try:
-        fs.ls('s3://noaa-goes16/')
-        logger.info('Conexión a S3 exitosa, reanudando descargas')
-        break
-    except Exception as e:
-        logger.error('Error en la conexión a S3: ' + str(e))
-        time.sleep(60)
-
-# Crear o leer el archivo de base de datos
-db_file = os.path.join(db_path, 'download_db.json')
-if not os.path.exists(db_file):
-    logger.info('Creando el archivo de base de datos con los archivos descargados')
-    download_db = {}
-    help.writeJson(db_file, download_db)
+if local_source:
+    logger.info(f"Usando el espejo local {source_conf['directorio']} a {clock.speed}× desde {clock.start}")
+    fs = LocalFileSystem(os.path.join(main_path, source_conf['directorio']), clock=clock,
+                         publish_delay=source_conf.get('demora_publicacion', schedule_conf.get('demora_publicacion', 690)))
 else:
-    try:
-        logger.info('Leyendo la base de datos de archivos descargados')
-        download_db = help.readJson(db_file)
-    except json.JSONDecodeError:
-        logger.error('El archivo de base de datos estaba vacío o corrupto, inicializándolo de nuevo.')
-        download_db = {}
-        help.writeJson(db_file, download_db)
+    # Configuro las credenciales anónimas para acceder al servidor de imágenes
+    logger.info('Configurando las credenciales de acceso al repositorio remoto')
+    fs = s3fs.S3FileSystem(anon=True, config_kwargs={'max_pool_connections': max(10, max_workers * transfer_conf.get('conexiones', 8))})
+range_downloader = None
+if transfer_conf.get('habilitado', False):
+    range_downloader = RangeDownloader(fs, part_size=int(transfer_conf.get('tamano_parte_mb', 8) * 2**20),
+                                       max_connections=transfer_conf.get('conexiones', 8), logger=logger)
+
+# El registro de descargas y las estadísticas de latencia se abren en main()
+ledger = None
+latency_stats = None
 
 # Obtener la última fecha y hora de la imagen descargada
 def get_last_downloaded_time():
     """
-    Obtiene la última fecha y hora de la imagen descargada de la base de datos.
+    Obtiene la última fecha y hora con todas sus imágenes descargadas.
 
     Returns:
         datetime.datetime o None: La última fecha y hora descargada, o None si no hay registros.
     """
-    last_time = None
-    for year in sorted(download_db.keys()):
-        for day in sorted(download_db[year].keys()):
-            for hour in sorted(download_db[year][day].keys()):
-                if len(download_db[year][day][hour]) == 6:
-                    last_time = datetime.datetime.strptime(f"{year}{day}{hour}", "%Y%j%H")
-    return last_time
-
-# Definir la fecha y hora inicial para la descarga
-last_time = get_last_downloaded_time()
-if last_time:
-    logger.info(f'Continuando desde la última fecha y hora descargada: {last_time}')
-else:
-    logger.info('No se encontró ninguna descarga previa. Iniciando desde el principio.')
+    return ledger.lastCompleteHour()
 
-# Convertir la fecha y hora de inicio
-start_datetime = datetime.datetime.strptime(f"{dates[0]} {start_hour}", "%Y-%m-%d %H:%M")
+def record_latency(f, band_number):
+    """
+    Registra la latencia de publicación de un archivo y, si es una imagen reciente, la latencia
+    entre el inicio del escaneo y su llegada al inbox.
 
-# Convertir la fecha y hora de fin si está disponible
-if end_date and end_hour:
-    end_datetime = datetime.datetime.strptime(f"{end_date} {end_hour}", "%Y-%m-%d %H:%M") if end_hour else datetime.datetime.strptime(f"{end_date} 23:59", "%Y-%m-%d %H:%M")
-else:
-    end_datetime = None
+    Args:
+        f (str): La ruta del archivo remoto descargado.
+        band_number (int): Banda del archivo.
+
+    Returns:
+        None
+    """
+    scan_start = getScanStart(f)
+    if scan_start is None:
+        return
+    try:
+        published_at = toUtc(fs.info(f).get('LastModified'))
+    except Exception:
+        published_at = None
+    if published_at is not None:
+        latency_stats.observe(LatencyStats.PUBLISH, product, band_number, scan_start, published_at)
+    now = clock.now()
+    # Las imágenes de horas atrasadas no representan la latencia en vivo
+    if now - scan_start < datetime.timedelta(hours=1):
+        inbox_latency = latency_stats.observe(LatencyStats.INBOX, product, band_number, scan_start, now)
+        metricas.REGISTRO.registrar_latencia('inbox', inbox_latency, banda=f'C{band_number:02d}')
+        logger.info(f'Latencia escaneo → inbox de {f.split("/")[-1]}: {inbox_latency:.0f} s '
+                    f'({latency_stats.summary(LatencyStats.INBOX, product, band_number)})')
 
 # Definir la función de descarga de archivos
-def download_file(f, temp_path, final_path, year, day, hour):
+def download_file(f, temp_path, year, day, hour):
     """
-    Descarga un archivo desde el repositorio remoto a una ubicación temporal y luego lo mueve a la ubicación final.
+    Descarga y verifica un archivo desde el repositorio remoto en una ubicación temporal.
+    El archivo se mueve al inbox con commit_scans, junto con las demás bandas de su escaneo.
 
     Args:
         f (str): La ruta del archivo remoto a descargar.
         temp_path (str): La ruta temporal donde se almacenará el archivo durante la descarga.
-        final_path (str): La ruta final donde se almacenará el archivo después de la descarga.
         year (str): Año de la descarga.
         day (str): Día del año de la descarga.
         hour (str): Hora de la descarga.
 
     Returns:
-        None
+        tuple o None: (archivo remoto, archivo temporal, tamaño, banda) si la descarga fue exitosa.
     """
     image_name = f.split('/')[-1]
     if not image_name or len(image_name.strip()) == 0:
@@ -125,109 +152,284 @@ def download_file(f, temp_path, final_path, year, day, hour):
     
     band_number = int(image_name.split('_')[1].split('M6C')[-1])
     if band_number in bands:
-        if f not in download_db.get(year, {}).get(day, {}).get(hour, []):
+        if not ledger.contains(f) and not is_staged(f):
             logger.info(f'Descargando archivo para {hour}:00 ' + image_name)
             print(f'Descargando archivo: {image_name}')
             temp_file_path = os.path.join(temp_path, image_name)
-            final_file_path = os.path.join(final_path, image_name)
+            start = time.perf_counter()
             try:
-                fs.get(f, temp_file_path)
+                if region_crop.get('habilitado', False):
+                    recorte.downloadRegion(fs, f, temp_file_path, region_crop['extension'])
+                    verified_by = 'recorte'
+                else:
+                    # Tamaño, ETag y firma del formato se verifican a medida que llegan los bytes
+                    info = fs.info(f)
+                    verifier = StreamVerifier(info['size'], info.get('ETag'))
+                    if range_downloader is not None:
+                        range_downloader.download(f, temp_file_path, on_part=lambda start, data: verifier.update(data), info=info)
+                    else:
+                        streamCopy(fs, f, temp_file_path, verifier)
+                    verified_by = verifier.verify()
+                metricas.REGISTRO.registrar_descarga(os.path.getsize(temp_file_path), time.perf_counter() - start)
+                # Verificación liviana del netCDF antes de entregarlo al procesador
+                with metricas.REGISTRO.medir('verificacion_netcdf'):
+                    checkNetcdf(temp_file_path)
+            except VerificationError as e:
+                logger.error(f'Archivo descargado inválido, se descarta: {image_name}: {str(e)}')
+                for path in (temp_file_path, temp_file_path + RangeDownloader.STATE_SUFFIX):
+                    if os.path.exists(path):
+                        os.remove(path)
+                return
             except Exception as e:
                 logger.error(f'Error al descargar el archivo {image_name}: {str(e)}')
                 return
-            
-            # Verificación de integridad
-            if os.path.getsize(temp_file_path) > 0:
-                shutil.move(temp_file_path, final_file_path)
-                if year not in download_db:
-                    download_db[year] = {}
-                if day not in download_db[year]:
-                    download_db[year][day] = {}
-                if hour not in download_db[year][day]:
-                    download_db[year][day][hour] = []
-                download_db[year][day][hour].append(f)
-                # Guardar el archivo JSON inmediatamente después de cada descarga
-                help.writeJson(db_file, download_db)
-            else:
-                logger.error('Archivo descargado incompleto: ' + image_name)
-                os.remove(temp_file_path)
-
-# Bucle principal para cada fecha y hora
-current_datetime = last_time + datetime.timedelta(hours=1) if last_time else start_datetime
-retry_timeout = timeout
-max_retries = 5  # Número máximo de intentos antes de aumentar el tiempo de espera
-retry_count = 0
-max_wait_time = 1800  # Máximo tiempo de espera después de varios intentos fallidos (30 minutos)
-
-while True:
-    # Verificar si se ha alcanzado la fecha y hora de fin
-    if end_datetime and current_datetime > end_datetime:
-        logger.info('Se ha alcanzado la fecha y hora de fin. Proceso de descarga completado.')
-        print('Proceso de descarga completado.')
-        break
-    else:
-        logger.info('Descarga iniciada en modo continuo. Manteniéndose en espera para descargas futuras.')
-        print('Manteniéndose en espera para futuras descargas.')
-    
-    year, day, hour = current_datetime.strftime("%Y"), current_datetime.strftime("%j"), current_datetime.strftime("%H")
-    remotePath, year, day, hour = help.getRemotePath('s3://noaa-goes16/', product, current_datetime)
-
-    if year not in download_db:
-        download_db[year] = {}
-    if day not in download_db[year]:
-        download_db[year][day] = {}
-    if hour not in download_db[year][day]:
-        download_db[year][day][hour] = []
-
-    elapsed_time = 0
-    while len(download_db[year][day][hour]) < 6:
+
+            logger.debug(f'Archivo verificado ({verified_by}): {image_name}')
+            return f, temp_file_path, os.path.getsize(temp_file_path), band_number
+
+# Archivos ya descargados y verificados que esperan al resto de las bandas de su escaneo
+staged_scans = {}
+metricas.REGISTRO.medidor('escaneos_incompletos', 'Escaneos descargados que esperan al resto de sus bandas.',
+                          lambda: len(staged_scans))
+
+def is_staged(f):
+    """
+    Indica si un archivo ya está descargado en la carpeta temporal, esperando al resto de su escaneo.
+    """
+    scan_start = getScanStart(f)
+    return scan_start is not None and f in staged_scans.get(scan_start, {})
+
+def staged_files():
+    """
+    Devuelve los archivos remotos descargados que esperan al resto de su escaneo.
+    """
+    return [f for files in staged_scans.values() for f in files]
+
+def commit_scans(downloads, year, day, hour, final_path, on_scan=None):
+    """
+    Mueve al inbox los escaneos que ya tienen todas sus bandas y los registra en el ledger.
+    Cada escaneo se entrega como una unidad, de modo que el procesador recibe todas sus bandas juntas.
+    Las bandas del escaneo que ya están en el ledger cuentan para completarlo.
+
+    Args:
+        downloads (list): Resultados de download_file (archivo remoto, archivo temporal, tamaño, banda).
+        year (str): Año de la descarga.
+        day (str): Día del año de la descarga.
+        hour (str): Hora de la descarga.
+        final_path (str): La ruta final donde se almacenarán los archivos.
+        on_scan (callable): Función que recibe el diccionario banda -> ruta de cada escaneo entregado, opcional.
+
+    Returns:
+        int: Cantidad de escaneos entregados.
+    """
+    for f, temp_file_path, size, band_number in downloads:
+        staged_scans.setdefault(getScanStart(f), {})[f] = (temp_file_path, size, band_number)
+    committed = 0
+    for scan_start in sorted(staged_scans):
+        files = staged_scans[scan_start]
+        # Las bandas ya registradas cuentan (un corte entre dos bandas, o una banda agregada a setup.json)
+        registered = ledger.scanFiles(scan_start)
+        if not set(bands) <= {band_number for _, _, band_number in files.values()} | set(registered):
+            continue
+        delivered = {band_number: os.path.join(final_path, os.path.basename(f)) for band_number, f in registered.items()
+                     if os.path.exists(os.path.join(final_path, os.path.basename(f)))}
+        for f, (temp_file_path, size, band_number) in sorted(files.items(), key=lambda item: item[1][2]):
+            delivered[band_number] = os.path.join(final_path, os.path.basename(temp_file_path))
+            shutil.move(temp_file_path, delivered[band_number])
+            # Registrar el archivo inmediatamente después de moverlo
+            ledger.add(f, year, day, hour, band=band_number, size=size)
+            record_latency(f, band_number)
+        del staged_scans[scan_start]
+        committed += 1
+        logger.info(f'Escaneo {scan_start} entregado con {len(files)} bandas')
+        if on_scan is not None:
+            on_scan(delivered)
+    return committed
+
+def main(on_scan=None, stop_event=None):
+    """
+    Descarga las imágenes desde la última hora completa (o desde la fecha de inicio) y
+    sigue en modo continuo hasta la fecha de fin, si está definida.
+
+    Args:
+        on_scan (callable): Función que recibe el diccionario banda -> ruta en el inbox de
+            cada escaneo entregado, opcional. Si bloquea, la descarga espera (contrapresión).
+        stop_event (threading.Event): Evento para detener la descarga, opcional.
+
+    Returns:
+        None
+    """
+    global ledger, latency_stats
+    stop_event = stop_event or threading.Event()
+
+    def wait(seconds):
+        # Las esperas son en segundos del reloj de descarga (acelerado al reproducir el espejo local)
+        return clock.sleep(seconds, stop_event)
+
+    # Verificar conexión a S3
+    while not stop_event.is_set():
         try:
-            logger.info(f'Obteniendo lista de archivos del repositorio remoto para la fecha {current_datetime.strftime("%Y-%m-%d")}, hora {hour}')
-            currentFileList = list(fs.ls(remotePath, refresh=True))
-            expected_files = [f for f in currentFileList if f.split('/')[-1].startswith(f"OR_ABI-L1b-RadF-M6C13_G16_s{year}{day}{hour}")]
-            logger.info(f'Se encontraron {len(expected_files)} archivos disponibles en el repositorio para la hora {hour}')
-
-            if len(expected_files) != 0:
-                with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    futures = [executor.submit(download_file, f, temp_path, image_path, year, day, hour) for f in expected_files]
-                    for future in as_completed(futures):
-                        try:
-                            future.result()
-                        except Exception as e:
-                            logger.error('Error durante la descarga de un archivo: ' + str(e))
-                            print(f'Error durante la descarga de un archivo: ' + str(e))
-
-                if len(download_db[year][day][hour]) == 6:
-                    logger.info('Todas las imágenes para la hora {} han sido descargadas.'.format(hour))
-                    retry_count = 0  # Reiniciar el contador de intentos
-                    break
+            fs.ls('s3://noaa-goes16/')
+            logger.info('Conexión a S3 exitosa, reanudando descargas')
+            break
+        except Exception as e:
+            logger.error('Error en la conexión a S3: ' + str(e))
+            wait(60)
+    if stop_event.is_set():
+        return
+
+    # Crear o abrir el registro de archivos descargados
+    db_file = os.path.join(db_path, 'download_db.sqlite')
+    scans_per_hour = 6  # Modo 6: un escaneo de disco completo cada 10 minutos
+    files_per_hour = scans_per_hour * len(bands)  # Cada escaneo se descarga con todas sus bandas
+    ledger = DownloadLedger(db_file, files_per_hour=files_per_hour)
+    json_db_file = os.path.join(db_path, 'download_db.json')
+    if os.path.exists(json_db_file) and ledger.isEmpty():
+        # Migración única de la base de datos JSON anterior
+        try:
+            imported = ledger.importJson(json_db_file)
+            os.replace(json_db_file, json_db_file + '.migrado')
+            logger.info(f'Se importaron {imported} archivos de la base de datos JSON anterior')
+        except json.JSONDecodeError:
+            logger.error('La base de datos JSON anterior estaba vacía o corrupta, se descarta.')
+
+    # Latencias observadas de publicación y de llegada al inbox, por producto y banda
+    latency_stats = LatencyStats(os.path.join(db_path, 'latency_stats.json'),
+                                 window=latency_conf.get('ventana', 288),
+                                 default_delay=schedule_conf.get('demora_publicacion', 690),
+                                 poll_quantile=latency_conf.get('cuantil_consulta', 0.5),
+                                 min_wait=latency_conf.get('espera_minima', 10),
+                                 max_wait=latency_conf.get('espera_maxima', 600),
+                                 save_interval=latency_conf.get('intervalo_guardado', 60),
+                                 logger=logger)
+
+    # Definir la fecha y hora inicial para la descarga
+    last_time = get_last_downloaded_time()
+    if last_time:
+        logger.info(f'Continuando desde la última fecha y hora descargada: {last_time}')
+    else:
+        logger.info('No se encontró ninguna descarga previa. Iniciando desde el principio.')
+
+    # Convertir la fecha y hora de inicio
+    start_datetime = datetime.datetime.strptime(f"{dates[0]} {start_hour}", "%Y-%m-%d %H:%M")
+
+    # Convertir la fecha y hora de fin si está disponible
+    if end_date and end_hour:
+        end_datetime = datetime.datetime.strptime(f"{end_date} {end_hour}", "%Y-%m-%d %H:%M") if end_hour else datetime.datetime.strptime(f"{end_date} 23:59", "%Y-%m-%d %H:%M")
+    else:
+        end_datetime = None
+
+    # Bucle principal para cada fecha y hora
+    current_datetime = last_time + datetime.timedelta(hours=1) if last_time else start_datetime
+    retry_count = 0  # Intentos consecutivos sin archivos nuevos
+
+    # Recuperar concurrentemente las horas ya publicadas antes de pasar al modo en vivo
+    if catchup_conf.get('habilitado', False):
+        current_datetime = catchup.runCatchUp(
+            current_datetime, end_datetime,
+            ledger=ledger, product=product, bands=bands, temp_path=temp_path, final_path=image_path,
+            max_concurrency=catchup_conf.get('max_concurrentes', 16),
+            lookahead_hours=catchup_conf.get('horas_adelantadas', 24),
+            max_pending_hours=catchup_conf.get('horas_pendientes', 3),
+            margin_minutes=catchup_conf.get('margen_minutos', 20),
+            region_crop=region_crop, sync_fs=fs, fs=fs if local_source else None, now=clock.now(),
+            on_scan=on_scan, metrics=metricas.REGISTRO, logger=logger)
+
+    # Detección de escaneos nuevos sin listar la hora completa en cada ciclo
+    schedule = None
+    if schedule_conf.get('habilitado', False):
+        schedule = ScanSchedule(fs, product, bands,
+                                period_minutes=schedule_conf.get('periodo_minutos', 10),
+                                publish_delay=schedule_conf.get('demora_publicacion', 690),
+                                margin_minutes=schedule_conf.get('margen_minutos', 20),
+                                stats=latency_stats, now=clock.now, sleep=wait, metrics=metricas.REGISTRO, logger=logger)
+
+    while not stop_event.is_set():
+        # Verificar si se ha alcanzado la fecha y hora de fin
+        if end_datetime and current_datetime > end_datetime:
+            logger.info('Se ha alcanzado la fecha y hora de fin. Proceso de descarga completado.')
+            print('Proceso de descarga completado.')
+            break
+        else:
+            logger.info('Descarga iniciada en modo continuo. Manteniéndose en espera para descargas futuras.')
+            print('Manteniéndose en espera para futuras descargas.')
+
+        year, day, hour = current_datetime.strftime("%Y"), current_datetime.strftime("%j"), current_datetime.strftime("%H")
+        remotePath, year, day, hour = help.getRemotePath('s3://noaa-goes16/', product, current_datetime)
+
+        while ledger.countHour(year, day, hour) < files_per_hour and not stop_event.is_set():
+            try:
+                downloaded_before = ledger.countHour(year, day, hour)
+                if schedule is not None:
+                    # Consulta solo el próximo escaneo previsto; lista la hora completa solo si no aparece
+                    expected_files = schedule.poll(current_datetime, ledger.hourFiles(year, day, hour) + staged_files())
                 else:
-                    logger.info('Esperando la próxima imagen a ser descargada. Manteniéndose en espera para descargar la próxima imagen disponible.')
-            else:
-                logger.info(f'Aún no hay archivos en el remoto para descargar para la hora {hour} del día {current_datetime.strftime("%Y-%m-%d")}, esperando la próxima imagen.')
-                print(f'Aún no hay archivos en el remoto para descargar para la hora {hour} del día {current_datetime.strftime("%Y-%m-%d")}, esperando la próxima imagen.')
-                retry_count += 1
-                if retry_count >= max_retries:
-                    logger.warning(f'Se alcanzó el número máximo de intentos ({max_retries}) sin éxito. Aumentando el tiempo de espera y continuando.')
-                    time.sleep(min(retry_timeout * 2, max_wait_time))
-                    retry_count = 0
-                    continue
-            
-            help.writeJson(db_file, download_db)
-            time.sleep(timeout)
-            elapsed_time += timeout
+                    logger.info(f'Obteniendo lista de archivos del repositorio remoto para la fecha {current_datetime.strftime("%Y-%m-%d")}, hora {hour}')
+                    with metricas.REGISTRO.medir('s3_listado'):
+                        currentFileList = list(fs.ls(remotePath, refresh=True))
+                    expected_files = [f for f in currentFileList if f.split('/')[-1].startswith(tuple(help.getFilePrefix(product, band, year, day, hour) for band in bands)) and not is_staged(f)]
+                logger.info(f'Se encontraron {len(expected_files)} archivos disponibles en el repositorio para la hora {hour}')
 
-            if elapsed_time > 600:
-                logger.warning(f'Se alcanzó el tiempo máximo de espera para la hora {hour}, pero aún no se descargaron todas las imágenes. Continuando en espera...')
-                elapsed_time = 0
+                if len(expected_files) != 0:
+                    downloads = []
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        futures = [executor.submit(download_file, f, temp_path, year, day, hour) for f in expected_files]
+                        for future in as_completed(futures):
+                            try:
+                                result = future.result()
+                                if result is not None:
+                                    downloads.append(result)
+                            except Exception as e:
+                                logger.error('Error durante la descarga de un archivo: ' + str(e))
+                                print(f'Error durante la descarga de un archivo: ' + str(e))
+                    commit_scans(downloads, year, day, hour, image_path, on_scan)
 
-        except Exception as e:
-            logger.error('Error inesperado durante la descarga: ' + str(e))
-            print(f'Error inesperado durante la descarga: {str(e)}')
+                    if ledger.countHour(year, day, hour) == files_per_hour:
+                        logger.info('Todas las imágenes para la hora {} han sido descargadas.'.format(hour))
+                        retry_count = 0  # Reiniciar el contador de intentos
+                        break
+                    else:
+                        logger.info('Esperando la próxima imagen a ser descargada. Manteniéndose en espera para descargar la próxima imagen disponible.')
+                else:
+                    logger.info(f'Aún no hay archivos en el remoto para descargar para la hora {hour} del día {current_datetime.strftime("%Y-%m-%d")}, esperando la próxima imagen.')
+                    print(f'Aún no hay archivos en el remoto para descargar para la hora {hour} del día {current_datetime.strftime("%Y-%m-%d")}, esperando la próxima imagen.')
 
-    current_datetime += datetime.timedelta(hours=1)
+                if ledger.countHour(year, day, hour) > downloaded_before:
+                    retry_count = 0
+                    if schedule is not None:
+                        # El calendario ya espera hasta la publicación del próximo escaneo
+                        continue
+                    # Sin el calendario, se espera igual hasta la publicación prevista del escaneo siguiente
+                    scan_starts = [s for s in map(getScanStart, ledger.hourFiles(year, day, hour)) if s is not None]
+                    if scan_starts:
+                        delay = latency_stats.nextPollDelay(product, bands, max(scan_starts), clock.now(),
+                                                            schedule_conf.get('periodo_minutos', 10))
+                    else:
+                        delay = timeout
+                else:
+                    # Reintentos con espera creciente y jitter, escalada según la dispersión observada de la latencia
+                    delay = latency_stats.retryDelay(product, bands, retry_count)
+                    retry_count += 1
+                logger.info(f'Próxima consulta en {delay:.0f} s')
+                wait(delay)
+
+            except Exception as e:
+                logger.error('Error inesperado durante la descarga: ' + str(e))
+                print(f'Error inesperado durante la descarga: {str(e)}')
 
-print("\n" + "="*40 + "\nDESCARGA COMPLETADA\n" + "="*40)
+        latency_stats.flush()
+        current_datetime += datetime.timedelta(hours=1)
 
+    latency_stats.flush()
+    ledger.close()
+    print("\n" + "="*40 + "\nDESCARGA COMPLETADA\n" + "="*40)
 
 
+if __name__ == '__main__':
+    # Endpoint Prometheus y archivo rotativo de métricas, si están habilitados en setup.json
+    exporters = metricas.IniciarExportacion(data.get('metricas', {}), main_path)
+    try:
+        main()
+    finally:
+        for exporter in exporters:
+            exporter.cerrar()
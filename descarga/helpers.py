@@ -51,6 +51,22 @@ def getRemotePath(rootPath, product, datetimeIn):
 
     return outPath, year, day_of_year, hour
 
+def getFilePrefix(product, band, year, day, hour):
+    """
+    Genera el prefijo de los nombres de archivo de una banda para una hora.
+
+    Args:
+        product (str): El nombre del producto (por ejemplo 'ABI-L1b-RadF').
+        band (int): Número de banda.
+        year (str): Año.
+        day (str): Día del año.
+        hour (str): Hora.
+
+    Returns:
+        str: Prefijo de los nombres de archivo (por ejemplo 'OR_ABI-L1b-RadF-M6C13_G16_s202433122').
+    """
+    return f"OR_{product}-M6C{int(band):02d}_G16_s{year}{day}{hour}"
+
 def createLogger(attachedFile, logPath):
     """
     Crea un logger para registrar eventos en un archivo de registro.
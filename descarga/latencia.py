@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import random
+import logging
+import datetime
+import threading
+from collections import deque
+
+
+def quantile(values, q):
+    """
+    Calcula un cuantil por interpolación lineal.
+
+    Args:
+        values (list): Valores observados.
+        q (float): Cuantil entre 0 y 1.
+
+    Returns:
+        float o None: El cuantil, o None si no hay valores.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = q * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class LatencyStats:
+    """
+    Estadísticas de latencia observadas por producto y banda.
+
+    Se registran dos latencias, medidas desde el inicio del escaneo:
+    - 'publicacion': hasta que el archivo aparece en el repositorio remoto (LastModified).
+    - 'inbox': hasta que el archivo queda en la carpeta de entrada del procesador.
+
+    Se conservan las últimas observaciones de cada una en un archivo JSON, que
+    se reescribe como máximo una vez cada save_interval segundos y al llamar a
+    flush. De la latencia de publicación se obtiene cuándo consultar por el
+    próximo escaneo y cuánto esperar entre reintentos.
+    """
+
+    PUBLISH = 'publicacion'
+    INBOX = 'inbox'
+
+    def __init__(self, stats_file=None, window=288, default_delay=690, poll_quantile=0.5,
+                 min_wait=10, max_wait=600, save_interval=60, logger=None, clock=time.monotonic):
+        """
+        Args:
+            stats_file (str): Ruta del archivo JSON donde persistir las observaciones, opcional.
+            window (int): Cantidad de observaciones que se conservan por producto y banda.
+            default_delay (float): Segundos entre el inicio del escaneo y la publicación, mientras no haya observaciones.
+            poll_quantile (float): Cuantil de la latencia de publicación en el que se hace la primera consulta.
+            min_wait (float): Espera mínima entre reintentos, en segundos.
+            max_wait (float): Espera máxima entre reintentos, en segundos.
+            save_interval (float): Segundos mínimos entre escrituras del archivo JSON (0 = en cada observación).
+            logger (logging.Logger): Logger a utilizar.
+            clock (callable): Reloj monótono en segundos, para controlar el intervalo de escritura.
+        """
+        self.stats_file = stats_file
+        self.window = window
+        self.default_delay = default_delay
+        self.poll_quantile = poll_quantile
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.save_interval = save_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.samples = {}
+        self._dirty = False
+        self._last_save = clock()
+        if stats_file is not None and os.path.exists(stats_file):
+            try:
+                with open(stats_file, 'r') as fp:
+                    saved = json.load(fp)
+                for key, kinds in saved.items():
+                    for kind, values in kinds.items():
+                        self._series(key, kind).extend(values)
+            except (json.JSONDecodeError, AttributeError, TypeError) as e:
+                self.logger.error(f'Archivo de latencias ilegible, se descarta: {e}')
+                self.samples = {}
+
+    @staticmethod
+    def key(product, band):
+        return f'{product}-C{int(band):02d}'
+
+    def _series(self, key, kind):
+        return self.samples.setdefault(key, {}).setdefault(kind, deque(maxlen=self.window))
+
+    def _save(self):
+        # Se llama con el lock tomado; el archivo se reemplaza de forma atómica
+        self._dirty = False
+        self._last_save = self.clock()
+        if self.stats_file is None:
+            return
+        tmp_file = f'{self.stats_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as fp:
+            json.dump({key: {kind: list(values) for kind, values in kinds.items()}
+                       for key, kinds in self.samples.items()}, fp)
+        os.replace(tmp_file, self.stats_file)
+
+    def flush(self):
+        """
+        Escribe las observaciones pendientes en el archivo JSON, si las hay.
+        """
+        with self.lock:
+            if self._dirty:
+                self._save()
+
+    def observe(self, kind, product, band, scan_start, observed_at):
+        """
+        Registra una latencia.
+
+        Args:
+            kind (str): LatencyStats.PUBLISH o LatencyStats.INBOX.
+            product (str): Producto.
+            band (int): Banda.
+            scan_start (datetime.datetime): Inicio del escaneo (UTC).
+            observed_at (datetime.datetime): Fecha y hora de publicación o de llegada al inbox (UTC).
+
+        Returns:
+            float: La latencia en segundos.
+        """
+        latency = (observed_at - scan_start).total_seconds()
+        with self.lock:
+            self._series(self.key(product, band), kind).append(round(latency, 1))
+            self._dirty = True
+            if self.clock() - self._last_save >= self.save_interval:
+                self._save()
+        return latency
+
+    def quantile(self, kind, product, band, q):
+        """
+        Devuelve un cuantil de las latencias observadas, o None si no hay observaciones.
+        """
+        with self.lock:
+            values = list(self.samples.get(self.key(product, band), {}).get(kind, []))
+        return quantile(values, q)
+
+    def pollDelay(self, product, bands):
+        """
+        Devuelve los segundos desde el inicio del escaneo en que conviene consultar por él:
+        el cuantil configurado de la latencia de publicación de la banda más lenta.
+        """
+        delays = [self.quantile(self.PUBLISH, product, band, self.poll_quantile) for band in bands]
+        delays = [d for d in delays if d is not None]
+        return max(delays) if delays else self.default_delay
+
+    def nextPollDelay(self, product, bands, last_scan, now, period_minutes=10):
+        """
+        Devuelve los segundos hasta la próxima consulta después de descargar un escaneo:
+        hasta el inicio nominal del escaneo siguiente más pollDelay, como en la detección
+        por calendario (ScanSchedule).
+
+        Args:
+            product (str): Producto.
+            bands (list): Bandas.
+            last_scan (datetime.datetime): Inicio del último escaneo descargado (UTC).
+            now (datetime.datetime): Fecha y hora actual (UTC).
+            period_minutes (int): Minutos entre escaneos.
+
+        Returns:
+            float: Segundos a esperar (0 si el escaneo siguiente ya debería estar publicado).
+        """
+        slot = last_scan.replace(minute=last_scan.minute // period_minutes * period_minutes, second=0, microsecond=0)
+        expected = slot + datetime.timedelta(minutes=period_minutes, seconds=self.pollDelay(product, bands))
+        return max(0.0, (expected - now).total_seconds())
+
+    def retryDelay(self, product, bands, attempt):
+        """
+        Devuelve la espera antes del próximo reintento, con crecimiento exponencial y jitter.
+
+        La espera base es la dispersión observada de la latencia de publicación
+        (diferencia entre los percentiles 90 y 50), de modo que los reintentos
+        cubren la cola de la distribución sin consultar de más.
+
+        Args:
+            product (str): Producto.
+            bands (list): Bandas.
+            attempt (int): Cantidad de intentos fallidos consecutivos.
+
+        Returns:
+            float: Segundos a esperar.
+        """
+        spreads = []
+        for band in bands:
+            p50 = self.quantile(self.PUBLISH, product, band, 0.5)
+            p90 = self.quantile(self.PUBLISH, product, band, 0.9)
+            if p50 is not None:
+                spreads.append(p90 - p50)
+        base = max(self.min_wait, max(spreads) if spreads else self.min_wait * 3)
+        wait = min(self.max_wait, base * 2 ** min(attempt, 16))
+        # Jitter: la mitad fija y la otra mitad aleatoria, para no consultar siempre en los mismos instantes
+        return wait / 2 + random.uniform(0, wait / 2)
+
+    def summary(self, kind, product, band):
+        """
+        Devuelve un texto con los percentiles 50 y 90 de una latencia.
+        """
+        p50 = self.quantile(kind, product, band, 0.5)
+        p90 = self.quantile(kind, product, band, 0.9)
+        if p50 is None:
+            return 'sin observaciones'
+        return f'p50 {p50:.0f} s, p90 {p90:.0f} s'
+
+
+def toUtc(value):
+    """
+    Convierte una fecha y hora con zona horaria a UTC sin zona, como las que usa el descargador.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
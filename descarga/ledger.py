@@ -0,0 +1,205 @@
+import os
+import sqlite3
+import datetime
+import threading
+import helpers as help
+
+
+class DownloadLedger:
+    """
+    Registro de archivos descargados sobre SQLite.
+
+    Cada descarga se inserta en una transacción propia, junto con el contador
+    de archivos de su hora, de modo que el registro nunca queda a medio
+    escribir aunque varios hilos descarguen a la vez. Las consultas usan
+    índices: saber si un archivo ya se descargó, cuántos archivos tiene una
+    hora y cuál es la última hora completa no dependen del tamaño del registro.
+
+    La marca de hora completa depende de files_per_hour (por ejemplo, al
+    agregar bandas en setup.json), por lo que se recalcula al abrir el registro.
+    """
+
+    def __init__(self, db_file, files_per_hour=6):
+        """
+        Args:
+            db_file (str): Ruta del archivo SQLite.
+            files_per_hour (int): Cantidad de archivos que completan una hora.
+        """
+        self.db_file = db_file
+        self.files_per_hour = files_per_hour
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS archivos (
+                clave TEXT PRIMARY KEY,
+                hora_clave TEXT NOT NULL,
+                banda INTEGER,
+                tamano INTEGER,
+                descargado TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS archivos_hora ON archivos (hora_clave);
+            CREATE TABLE IF NOT EXISTS horas (
+                hora_clave TEXT PRIMARY KEY,
+                archivos INTEGER NOT NULL,
+                completa INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS horas_completas ON horas (completa, hora_clave);
+        """)
+        # Las horas registradas con otra cantidad de archivos por hora se vuelven a evaluar
+        self.conn.execute('UPDATE horas SET completa = (archivos >= ?) WHERE completa != (archivos >= ?)',
+                          (files_per_hour, files_per_hour))
+
+    @staticmethod
+    def hourKey(year, day, hour):
+        """
+        Devuelve la clave de una hora ('AAAAJJJHH'), que ordena cronológicamente.
+        """
+        return f'{year}{day}{hour}'
+
+    def contains(self, key):
+        """
+        Indica si un archivo remoto ya fue descargado.
+
+        Args:
+            key (str): Ruta del archivo remoto.
+
+        Returns:
+            bool: True si el archivo está registrado.
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT 1 FROM archivos WHERE clave = ?', (key,)).fetchone()
+        return row is not None
+
+    def countHour(self, year, day, hour):
+        """
+        Devuelve la cantidad de archivos descargados de una hora.
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT archivos FROM horas WHERE hora_clave = ?',
+                                    (self.hourKey(year, day, hour),)).fetchone()
+        return row[0] if row else 0
+
+    def scanFiles(self, scan_start):
+        """
+        Devuelve los archivos descargados de un escaneo, por banda.
+
+        Args:
+            scan_start (datetime.datetime): Inicio del escaneo (schedule.getScanStart).
+
+        Returns:
+            dict: Banda -> ruta del archivo remoto.
+        """
+        if scan_start is None:
+            return {}
+        hour_key = self.hourKey(scan_start.strftime('%Y'), scan_start.strftime('%j'), scan_start.strftime('%H'))
+        with self.lock:
+            rows = self.conn.execute('SELECT banda, clave FROM archivos WHERE hora_clave = ? AND instr(clave, ?) > 0',
+                                     (hour_key, f"_s{scan_start.strftime('%Y%j%H%M%S')}")).fetchall()
+        return {band: key for band, key in rows}
+
+    def hourFiles(self, year, day, hour):
+        """
+        Devuelve las rutas remotas de los archivos descargados de una hora.
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT clave FROM archivos WHERE hora_clave = ? ORDER BY clave',
+                                     (self.hourKey(year, day, hour),)).fetchall()
+        return [row[0] for row in rows]
+
+    def add(self, key, year, day, hour, band=None, size=None):
+        """
+        Registra un archivo descargado y actualiza el contador de su hora en una sola transacción.
+
+        Args:
+            key (str): Ruta del archivo remoto.
+            year (str): Año.
+            day (str): Día del año.
+            hour (str): Hora.
+            band (int): Banda del archivo, opcional.
+            size (int): Tamaño en bytes, opcional.
+
+        Returns:
+            bool: True si el archivo no estaba registrado.
+        """
+        hour_key = self.hourKey(year, day, hour)
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                inserted = self.conn.execute(
+                    'INSERT OR IGNORE INTO archivos (clave, hora_clave, banda, tamano, descargado) VALUES (?, ?, ?, ?, ?)',
+                    (key, hour_key, band, size, datetime.datetime.utcnow().isoformat())).rowcount == 1
+                if inserted:
+                    self.conn.execute(
+                        'INSERT INTO horas (hora_clave, archivos, completa) VALUES (?, 1, ?) '
+                        'ON CONFLICT (hora_clave) DO UPDATE SET archivos = archivos + 1, completa = (archivos + 1 >= ?)',
+                        (hour_key, int(1 >= self.files_per_hour), self.files_per_hour))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return inserted
+
+    def lastCompleteHour(self):
+        """
+        Obtiene la última hora con todos sus archivos descargados.
+
+        Returns:
+            datetime.datetime o None: La última hora completa, o None si no hay registros.
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT hora_clave FROM horas WHERE completa = 1 '
+                                    'ORDER BY hora_clave DESC LIMIT 1').fetchone()
+        if row is None:
+            return None
+        return datetime.datetime.strptime(row[0], "%Y%j%H")
+
+    def isEmpty(self):
+        """
+        Indica si el registro no tiene ningún archivo.
+        """
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM archivos LIMIT 1').fetchone() is None
+
+    def importJson(self, json_file):
+        """
+        Importa una base de datos anterior en formato JSON (año/día/hora -> lista de archivos).
+
+        Args:
+            json_file (str): Ruta del archivo download_db.json.
+
+        Returns:
+            int: Cantidad de archivos importados.
+        """
+        download_db = help.readJson(json_file)
+        imported = 0
+        for year, days in download_db.items():
+            for day, hours in days.items():
+                for hour, files in hours.items():
+                    for f in files:
+                        imported += self.add(f, year, day, hour, band=getBand(f))
+        return imported
+
+    def close(self):
+        """
+        Cierra la conexión con la base de datos.
+        """
+        with self.lock:
+            self.conn.close()
+
+
+def getBand(remote_file):
+    """
+    Obtiene el número de banda a partir del nombre de un archivo ABI L1b.
+
+    Args:
+        remote_file (str): Ruta o nombre del archivo.
+
+    Returns:
+        int o None: Número de banda, o None si el nombre no lo incluye.
+    """
+    try:
+        return int(os.path.basename(remote_file).split('_')[1].split('M6C')[-1])
+    except (IndexError, ValueError):
+        return None
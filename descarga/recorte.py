@@ -0,0 +1,185 @@
+import os
+import sys
+import types
+import h5py
+import numpy as np
+from netCDF4 import Dataset
+
+# La geometría del ABI y las regiones de salida se comparten con el procesador
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Procesador'))
+from src.helpers import GetGeosScanAngles, LoadDictionary  # noqa: E402
+from src.regiones import RegistroRegiones  # noqa: E402
+
+# Configuración del procesador, de la que salen las regiones que la descarga con recorte debe cubrir
+PROCESSOR_CONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Procesador', 'data', 'conf', 'SMN_dict.conf')
+
+# Atributos internos de HDF5/netCDF4 que no se copian al archivo regional
+INTERNAL_ATTRS = {'DIMENSION_LIST', 'REFERENCE_LIST', 'CLASS', 'NAME', '_Netcdf4Dimid',
+                  '_Netcdf4Coordinates', '_nc3_strict', '_NCProperties', '_FillValue'}
+
+# Variables que se recortan a la región; el resto de las variables pequeñas se copian completas
+CROPPED_VARS = ('Rad',)
+MAX_SCALAR_SIZE = 16
+
+
+def _decodeAttr(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, np.ndarray) and value.dtype.kind == 'S':
+        return [v.decode('utf-8', 'replace') for v in value]
+    if isinstance(value, np.ndarray) and value.size == 1:
+        return value.reshape(-1)[0]
+    return value
+
+
+def _scalarAttr(attrs, name):
+    return float(np.asarray(attrs[name]).reshape(-1)[0])
+
+
+def _copyAttrs(source, target):
+    for name, value in source.attrs.items():
+        if name in INTERNAL_ATTRS:
+            continue
+        target.setncattr(name, _decodeAttr(value))
+
+
+def getRequiredExtent(conf_data):
+    """
+    Calcula la extensión que la descarga con recorte debe cubrir: la unión de las
+    regiones del procesador, ampliada con los márgenes del gráfico.
+
+    Args:
+        conf_data (dict): Configuración del procesador (SMN_dict.conf).
+
+    Returns:
+        list: Extensión [lon_W, lon_E, lat_S, lat_N] en grados.
+    """
+    union = RegistroRegiones(conf_data, conf_data.get('regiones')).union
+    return [union[0] + conf_data['delta_lon_W_for_graph'], union[1],
+            union[2] + conf_data['delta_lat_S_for_graph'], union[3] + conf_data['delta_lat_N_for_graph']]
+
+
+def getCropExtent(region_crop, conf_file=PROCESSOR_CONF):
+    """
+    Devuelve la extensión de la descarga con recorte y verifica que cubra todas las regiones del procesador.
+
+    Args:
+        region_crop (dict): Configuración 'recorte' de setup.json. Sin 'extension' (o con null) se usa
+            la unión de las regiones del procesador.
+        conf_file (str): Ruta de la configuración del procesador.
+
+    Returns:
+        list: Extensión [lon_W, lon_E, lat_S, lat_N] en grados.
+
+    Raises:
+        ValueError: Si la extensión configurada no cubre alguna región del procesador.
+    """
+    required = getRequiredExtent(LoadDictionary(conf_file))
+    extent = region_crop.get('extension')
+    if extent is None:
+        return required
+    if not (extent[0] <= required[0] and extent[1] >= required[1] and extent[2] <= required[2] and extent[3] >= required[3]):
+        raise ValueError(f"La extensión del recorte {extent} no cubre las regiones del procesador {required}")
+    return [float(v) for v in extent]
+
+
+def getRegionWindow(h5, extent):
+    """
+    Calcula la ventana (filas, columnas) del disco completo que cubre la región,
+    ampliada a los límites de los chunks de HDF5 de la variable 'Rad'.
+
+    Args:
+        h5 (h5py.File): Archivo remoto abierto.
+        extent (list): Región [lon_W, lon_E, lat_S, lat_N] en grados.
+
+    Returns:
+        tuple: (fila_inicio, fila_fin, col_inicio, col_fin).
+    """
+    attrs = h5['goes_imager_projection'].attrs
+    proj = types.SimpleNamespace(**{name: _scalarAttr(attrs, name) for name in
+                                    ('semi_major_axis', 'semi_minor_axis', 'perspective_point_height', 'longitude_of_projection_origin')})
+    # Longitudes sobre el ecuador y latitudes sobre el meridiano del satélite, como en el procesador
+    (x_W, x_E), _ = GetGeosScanAngles(np.array(extent[:2], dtype=float), np.zeros(2), proj)
+    _, (y_S, y_N) = GetGeosScanAngles(np.full(2, proj.longitude_of_projection_origin), np.array(extent[2:], dtype=float), proj)
+
+    def index(var, angle):
+        scale = _scalarAttr(var.attrs, 'scale_factor')
+        offset = _scalarAttr(var.attrs, 'add_offset')
+        return int(round((angle - offset) / scale))
+
+    rad = h5['Rad']
+    n_rows, n_cols = rad.shape
+    chunk_rows, chunk_cols = rad.chunks or (1, 1)
+    col0, col1 = sorted((index(h5['x'], x_W), index(h5['x'], x_E)))
+    row0, row1 = sorted((index(h5['y'], y_N), index(h5['y'], y_S)))
+    # Se alinea la ventana a la grilla de chunks: cada chunk remoto se pide una sola vez y entero
+    row0 = max(0, (row0 // chunk_rows) * chunk_rows)
+    col0 = max(0, (col0 // chunk_cols) * chunk_cols)
+    row1 = min(n_rows, -(-(row1 + 1) // chunk_rows) * chunk_rows)
+    col1 = min(n_cols, -(-(col1 + 1) // chunk_cols) * chunk_cols)
+    return row0, row1, col0, col1
+
+
+def downloadRegion(fs, remote_file, local_file, extent, block_size=2 ** 20):
+    """
+    Descarga solo la región de interés de un archivo ABI L1b de disco completo.
+
+    El archivo remoto se abre a través de s3fs sin descargarlo: h5py lee los
+    metadatos y solo los chunks de 'Rad' que se superponen con la región, más
+    las coordenadas y las variables escalares de calibración. El resultado se
+    escribe como un netCDF regional que conserva los valores crudos, los
+    atributos de escala y los metadatos globales, con los atributos
+    'recorte_fila_inicio' y 'recorte_col_inicio' que indican la posición del
+    recorte dentro del disco completo.
+
+    Args:
+        fs (s3fs.S3FileSystem): Sistema de archivos remoto.
+        remote_file (str): Ruta del archivo remoto.
+        local_file (str): Ruta del netCDF regional a escribir.
+        extent (list): Región [lon_W, lon_E, lat_S, lat_N] en grados.
+        block_size (int): Tamaño de bloque de lectura remota en bytes.
+
+    Returns:
+        tuple: Ventana recortada (fila_inicio, fila_fin, col_inicio, col_fin).
+    """
+    with fs.open(remote_file, 'rb', block_size=block_size, cache_type='blockcache') as remote:
+        with h5py.File(remote, 'r') as h5:
+            row0, row1, col0, col1 = getRegionWindow(h5, extent)
+            with Dataset(local_file, 'w', format='NETCDF4') as out:
+                _copyAttrs(h5, out)
+                out.setncattr('recorte_fila_inicio', row0)
+                out.setncattr('recorte_col_inicio', col0)
+                out.createDimension('y', row1 - row0)
+                out.createDimension('x', col1 - col0)
+
+                for name in ('y', 'x'):
+                    var = h5[name]
+                    start, end = (row0, row1) if name == 'y' else (col0, col1)
+                    target = out.createVariable(name, var.dtype.newbyteorder('='), (name,), fill_value=var.attrs.get('_FillValue', [None])[0])
+                    target.set_auto_maskandscale(False)
+                    _copyAttrs(var, target)
+                    target[:] = var[start:end]
+
+                for name in CROPPED_VARS:
+                    var = h5[name]
+                    target = out.createVariable(name, var.dtype.newbyteorder('='), ('y', 'x'), zlib=True,
+                                                chunksizes=var.chunks, fill_value=var.attrs.get('_FillValue', [None])[0])
+                    target.set_auto_maskandscale(False)
+                    _copyAttrs(var, target)
+                    target[:] = var[row0:row1, col0:col1]
+
+                for name, var in h5.items():
+                    if name in out.variables or not isinstance(var, h5py.Dataset):
+                        continue
+                    if var.size > MAX_SCALAR_SIZE or var.dtype.kind not in 'iuf':
+                        continue
+                    dims = ()
+                    if var.ndim > 0:
+                        dims = tuple(f'{name}_dim{i}' for i in range(var.ndim))
+                        for dim, size in zip(dims, var.shape):
+                            out.createDimension(dim, size)
+                    target = out.createVariable(name, var.dtype.newbyteorder('='), dims, fill_value=var.attrs.get('_FillValue', [None])[0])
+                    target.set_auto_maskandscale(False)
+                    _copyAttrs(var, target)
+                    target[...] = var[()]
+    return row0, row1, col0, col1
@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import hashlib
+import datetime
+import threading
+from schedule import getScanStart
+
+
+class ReplayClock:
+    """
+    Reloj UTC del descargador.
+
+    Sin fecha de inicio es el reloj real. Con fecha de inicio, el tiempo
+    simulado parte de ella en el momento de crear el reloj y avanza 'speed'
+    veces más rápido que el real; las esperas se acortan en la misma
+    proporción, de modo que los tiempos de espera del calendario de escaneo y
+    de los reintentos se siguen expresando en segundos simulados.
+    """
+
+    def __init__(self, start=None, speed=1.0):
+        """
+        Args:
+            start (datetime.datetime): Fecha y hora simulada inicial (UTC), opcional.
+            speed (float): Segundos simulados por segundo real.
+        """
+        if speed <= 0:
+            raise ValueError('La velocidad de reproducción debe ser positiva')
+        self.start = start
+        self.speed = speed
+        self.origin = time.monotonic()
+
+    def now(self):
+        """
+        Devuelve la fecha y hora actual (UTC, sin zona horaria).
+        """
+        if self.start is None:
+            return datetime.datetime.utcnow()
+        return self.start + datetime.timedelta(seconds=(time.monotonic() - self.origin) * self.speed)
+
+    def sleep(self, seconds, stop_event=None):
+        """
+        Espera 'seconds' segundos simulados, o hasta que se active stop_event.
+
+        Returns:
+            bool: True si se activó stop_event durante la espera.
+        """
+        seconds = max(0.0, seconds) / self.speed
+        if stop_event is None:
+            time.sleep(seconds)
+            return False
+        return stop_event.wait(seconds)
+
+
+class _AsyncLocalFile:
+    """
+    Archivo local con la interfaz asíncrona de los archivos de s3fs (read/close).
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+
+    async def read(self, length=-1):
+        return await asyncio.to_thread(self.file.read, length)
+
+    async def close(self):
+        self.file.close()
+
+
+class LocalFileSystem:
+    """
+    Espejo local del repositorio de la NOAA, con la parte de la interfaz de s3fs
+    que usa el descargador (ls, find, info, open, cat_file y sus versiones asíncronas).
+
+    El directorio 'root' reproduce la estructura del bucket:
+    '<root>/noaa-goes16/<producto>/<año>/<día juliano>/<hora>/OR_...nc'. Las rutas
+    's3://noaa-goes16/...' se resuelven dentro de 'root' y los nombres devueltos
+    no llevan el protocolo, como en s3fs.
+
+    Con un reloj, cada archivo se "publica" 'publish_delay' segundos después del
+    inicio de su escaneo: hasta entonces no aparece en los listados y no se puede
+    abrir. Con un ReplayClock acelerado, los escaneos se publican al ritmo real
+    multiplicado por su velocidad.
+    """
+
+    def __init__(self, root, clock=None, publish_delay=690):
+        """
+        Args:
+            root (str): Directorio que contiene el espejo del bucket.
+            clock (ReplayClock): Reloj con el que se publican los archivos; sin reloj se publican todos, opcional.
+            publish_delay (float): Segundos entre el inicio del escaneo y la publicación del archivo.
+        """
+        self.root = os.path.abspath(root)
+        self.clock = clock
+        self.publish_delay = datetime.timedelta(seconds=publish_delay)
+        self._etags = {}
+        self._lock = threading.Lock()
+
+    def _name(self, path):
+        return path.split('://', 1)[-1].strip('/')
+
+    def _local(self, path):
+        return os.path.join(self.root, self._name(path))
+
+    def publishedAt(self, path):
+        """
+        Devuelve la fecha y hora de publicación de un archivo, o None si su nombre no indica el escaneo.
+        """
+        scan_start = getScanStart(path)
+        return None if scan_start is None else scan_start + self.publish_delay
+
+    def _isPublished(self, path):
+        published_at = self.publishedAt(path)
+        return self.clock is None or published_at is None or published_at <= self.clock.now()
+
+    def _etag(self, local_path, stat):
+        # ETag de subida simple (MD5 del contenido), calculado una vez por archivo
+        key = (local_path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            etag = self._etags.get(key)
+        if etag is None:
+            md5 = hashlib.md5(usedforsecurity=False)
+            with open(local_path, 'rb') as fp:
+                for block in iter(lambda: fp.read(4 * 2**20), b''):
+                    md5.update(block)
+            etag = f'"{md5.hexdigest()}"'
+            with self._lock:
+                self._etags[key] = etag
+        return etag
+
+    def info(self, path):
+        """
+        Devuelve el nombre, tipo, tamaño, ETag y fecha de publicación ('LastModified') de un archivo o directorio.
+        """
+        local_path = self._local(path)
+        if not os.path.exists(local_path) or not self._isPublished(path):
+            raise FileNotFoundError(path)
+        if os.path.isdir(local_path):
+            return {'name': self._name(path), 'type': 'directory', 'size': 0}
+        stat = os.stat(local_path)
+        published_at = self.publishedAt(path)
+        if published_at is None:
+            published_at = datetime.datetime.utcfromtimestamp(stat.st_mtime)
+        return {
+            'name': self._name(path),
+            'type': 'file',
+            'size': stat.st_size,
+            'ETag': self._etag(local_path, stat),
+            'LastModified': published_at.replace(tzinfo=datetime.timezone.utc),
+        }
+
+    def ls(self, path, detail=False, refresh=False):
+        """
+        Lista un directorio. Lanza FileNotFoundError si no existe, como s3fs.
+        """
+        local_path = self._local(path)
+        if not os.path.isdir(local_path):
+            raise FileNotFoundError(path)
+        base = self._name(path)
+        names = [f'{base}/{entry}' if base else entry for entry in sorted(os.listdir(local_path))]
+        names = [name for name in names if self._isPublished(name)]
+        return [self.info(name) for name in names] if detail else names
+
+    def find(self, path, prefix=''):
+        """
+        Devuelve los archivos bajo 'path' cuyo nombre relativo empieza con 'prefix'.
+        """
+        local_path = self._local(path)
+        base = self._name(path)
+        files = []
+        for directory, _, entries in os.walk(local_path):
+            relative = os.path.relpath(directory, local_path)
+            for entry in entries:
+                name = entry if relative == '.' else f'{relative}/{entry}'
+                if name.startswith(prefix) and self._isPublished(entry):
+                    files.append(f'{base}/{name}')
+        return sorted(files)
+
+    def open(self, path, mode='rb', **kwargs):
+        """
+        Abre un archivo publicado para lectura; los argumentos de cache de s3fs se ignoran.
+        """
+        if mode != 'rb':
+            raise ValueError('El espejo local es de solo lectura')
+        self.info(path)
+        return open(self._local(path), 'rb')
+
+    def cat_file(self, path, start=None, end=None):
+        """
+        Lee los bytes [start, end) de un archivo publicado.
+        """
+        with self.open(path) as fp:
+            start = start or 0
+            fp.seek(start)
+            return fp.read(-1 if end is None else end - start)
+
+    async def _ls(self, path, detail=False, refresh=False):
+        return await asyncio.to_thread(self.ls, path, detail, refresh)
+
+    async def open_async(self, path, mode='rb', **kwargs):
+        if mode != 'rb':
+            raise ValueError('El espejo local es de solo lectura')
+        await asyncio.to_thread(self.info, path)
+        return _AsyncLocalFile(self._local(path))
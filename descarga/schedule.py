@@ -0,0 +1,181 @@
+import re
+import time
+import logging
+import datetime
+import contextlib
+import helpers as help
+
+SCAN_START_PATTERN = re.compile(r'_s(\d{4})(\d{3})(\d{2})(\d{2})(\d{2})')
+
+
+def getScanStart(remote_file):
+    """
+    Obtiene la fecha y hora de inicio del escaneo a partir del nombre de un archivo ABI.
+
+    Args:
+        remote_file (str): Ruta o nombre del archivo.
+
+    Returns:
+        datetime.datetime o None: Inicio del escaneo, o None si el nombre no lo incluye.
+    """
+    match = SCAN_START_PATTERN.search(remote_file.split('/')[-1])
+    if match is None:
+        return None
+    year, day, hour, minute, second = match.groups()
+    return datetime.datetime.strptime(f'{year}{day}{hour}{minute}{second}', '%Y%j%H%M%S')
+
+
+class ScanSchedule:
+    """
+    Detección de archivos nuevos a partir del calendario de escaneo del ABI.
+
+    En el Modo 6 el disco completo se escanea cada 10 minutos, a horario fijo.
+    En lugar de listar toda la carpeta de la hora en cada ciclo, se predice el
+    próximo escaneo que falta, se espera hasta que debería estar publicado y se
+    consulta solo el prefijo de ese escaneo (una petición LIST con prefijo que
+    devuelve a lo sumo un archivo por banda). Solo si el escaneo no aparece se
+    recurre al listado completo de la hora, que también se usa para las horas
+    que ya terminaron.
+    """
+
+    def __init__(self, fs, product, bands, root_path='s3://noaa-goes16/', period_minutes=10,
+                 publish_delay=690, margin_minutes=20, stats=None, now=None, sleep=None, metrics=None, logger=None):
+        """
+        Args:
+            fs (s3fs.S3FileSystem): Sistema de archivos remoto.
+            product (str): Producto a descargar (por ejemplo 'ABI-L1b-RadF').
+            bands (list): Bandas a descargar.
+            root_path (str): Raíz del repositorio remoto.
+            period_minutes (int): Minutos entre escaneos de disco completo.
+            publish_delay (float): Segundos entre el inicio del escaneo y la publicación esperada del archivo.
+            margin_minutes (int): Minutos después del fin de una hora a partir de los cuales se la lista completa.
+            stats (LatencyStats): Latencias observadas; si se indica, reemplaza a publish_delay.
+            now (callable): Función que devuelve la fecha y hora actual (UTC), opcional.
+            sleep (callable): Función de espera en segundos, opcional.
+            metrics (metricas.Registro): Registro donde se miden las consultas al repositorio, opcional.
+            logger (logging.Logger): Logger a utilizar.
+        """
+        self.fs = fs
+        self.product = product
+        self.bands = bands
+        self.root_path = root_path
+        self.period = datetime.timedelta(minutes=period_minutes)
+        self.publish_delay = publish_delay
+        self.margin = datetime.timedelta(minutes=margin_minutes)
+        self.stats = stats
+        self.now = now or datetime.datetime.utcnow
+        self.sleep = sleep or time.sleep
+        self.metrics = metrics
+        self.logger = logger or logging.getLogger(__name__)
+        self.probes = 0
+        self.listings = 0
+
+    def _timed(self, stage):
+        return self.metrics.medir(stage) if self.metrics is not None else contextlib.nullcontext()
+
+    def scanSlots(self, hour_datetime):
+        """
+        Devuelve los inicios de escaneo nominales de una hora.
+        """
+        hour_start = hour_datetime.replace(minute=0, second=0, microsecond=0)
+        return [hour_start + i * self.period for i in range(int(datetime.timedelta(hours=1) / self.period))]
+
+    def slotOf(self, scan_start):
+        """
+        Devuelve el inicio nominal del escaneo al que pertenece un archivo.
+        """
+        minutes = self.period.total_seconds() // 60
+        return scan_start.replace(minute=int(scan_start.minute // minutes * minutes), second=0, microsecond=0)
+
+    def missingScans(self, hour_datetime, downloaded):
+        """
+        Devuelve los escaneos de una hora que todavía no tienen todas sus bandas descargadas.
+
+        Args:
+            hour_datetime (datetime.datetime): Hora a consultar.
+            downloaded (list): Archivos remotos ya descargados de esa hora.
+
+        Returns:
+            list: Inicios nominales de los escaneos faltantes, en orden cronológico.
+        """
+        count = {}
+        for f in downloaded:
+            scan_start = getScanStart(f)
+            if scan_start is not None:
+                slot = self.slotOf(scan_start)
+                count[slot] = count.get(slot, 0) + 1
+        return [slot for slot in self.scanSlots(hour_datetime) if count.get(slot, 0) < len(self.bands)]
+
+    def expectedAt(self, scan_start):
+        """
+        Devuelve la fecha y hora en que se espera que el escaneo esté publicado.
+        """
+        delay = self.stats.pollDelay(self.product, self.bands) if self.stats is not None else self.publish_delay
+        return scan_start + datetime.timedelta(seconds=delay)
+
+    def probe(self, scan_start):
+        """
+        Consulta solo el prefijo de un escaneo, para todas las bandas.
+
+        Args:
+            scan_start (datetime.datetime): Inicio nominal del escaneo.
+
+        Returns:
+            list: Archivos remotos del escaneo publicados hasta el momento.
+        """
+        remotePath, year, day, hour = help.getRemotePath(self.root_path, self.product, scan_start)
+        files = []
+        for band in self.bands:
+            prefix = help.getFilePrefix(self.product, band, year, day, hour) + scan_start.strftime('%M')
+            self.probes += 1
+            with self._timed('s3_consulta'):
+                files += self.fs.find(remotePath, prefix=prefix)
+        return sorted(files)
+
+    def fullListing(self, hour_datetime):
+        """
+        Lista la carpeta completa de una hora y filtra los archivos de las bandas a descargar.
+        """
+        remotePath, year, day, hour = help.getRemotePath(self.root_path, self.product, hour_datetime)
+        self.listings += 1
+        try:
+            with self._timed('s3_listado'):
+                listing = self.fs.ls(remotePath, refresh=True)
+        except FileNotFoundError:
+            return []
+        prefixes = tuple(help.getFilePrefix(self.product, band, year, day, hour) for band in self.bands)
+        return sorted(f for f in listing if f.split('/')[-1].startswith(prefixes))
+
+    def poll(self, hour_datetime, downloaded):
+        """
+        Busca los archivos nuevos de una hora.
+
+        Si la hora ya terminó se lista completa. Si no, se espera hasta la
+        publicación prevista del próximo escaneo faltante y se consulta solo su
+        prefijo; si no aparece, se lista la hora completa.
+
+        Args:
+            hour_datetime (datetime.datetime): Hora a consultar.
+            downloaded (list): Archivos remotos ya descargados de esa hora.
+
+        Returns:
+            list: Archivos remotos pendientes de descarga.
+        """
+        downloaded = set(downloaded)
+        missing = self.missingScans(hour_datetime, downloaded)
+        if not missing:
+            return []
+        hour_end = hour_datetime.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+        if self.now() >= hour_end + self.margin:
+            files = self.fullListing(hour_datetime)
+        else:
+            scan_start = missing[0]
+            wait = (self.expectedAt(scan_start) - self.now()).total_seconds()
+            if wait > 0:
+                self.logger.info(f'Esperando {wait:.0f} s hasta la publicación prevista del escaneo {scan_start:%H:%M}')
+                self.sleep(wait)
+            files = self.probe(scan_start)
+            if not files:
+                self.logger.info(f'El escaneo {scan_start:%H:%M} no está publicado todavía; se lista la hora completa')
+                files = self.fullListing(hour_datetime)
+        return [f for f in files if f not in downloaded]
@@ -0,0 +1,137 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class RangeDownloader:
+    """
+    Descarga de un archivo remoto en partes paralelas.
+
+    El objeto se divide en rangos de tamaño fijo que se piden en paralelo
+    (peticiones HTTP con Range, a través del pool de conexiones del sistema de
+    archivos) y se escriben con os.pwrite en su posición de un archivo temporal
+    reservado de antemano. Junto al archivo temporal se guarda un estado
+    '.part.json' con el ETag del objeto y las partes ya escritas: si el proceso
+    se interrumpe, la próxima descarga del mismo objeto solo pide las partes
+    que faltan.
+    """
+
+    STATE_SUFFIX = '.part.json'
+
+    def __init__(self, fs, part_size=8 * 2**20, max_connections=8, logger=None):
+        """
+        Args:
+            fs (s3fs.S3FileSystem): Sistema de archivos remoto.
+            part_size (int): Tamaño de cada parte en bytes.
+            max_connections (int): Cantidad máxima de partes descargándose a la vez.
+            logger (logging.Logger): Logger a utilizar.
+        """
+        self.fs = fs
+        self.part_size = part_size
+        self.max_connections = max_connections
+        self.logger = logger or logging.getLogger(__name__)
+        # Un único pool de hilos para todas las descargas: las conexiones del sistema de archivos se reutilizan
+        self.executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='rango')
+
+    def _loadState(self, state_file, local_file, etag, size):
+        try:
+            with open(state_file, 'r') as fp:
+                state = json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if (state.get('etag') != etag or state.get('size') != size or state.get('part_size') != self.part_size
+                or not os.path.exists(local_file) or os.path.getsize(local_file) != size):
+            return None
+        return state
+
+    def _saveState(self, state_file, state):
+        tmp_file = f'{state_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as fp:
+            json.dump(state, fp)
+        os.replace(tmp_file, state_file)
+
+    def _fetchPart(self, remote_file, fd, start, end):
+        data = self.fs.cat_file(remote_file, start=start, end=end)
+        if len(data) != end - start:
+            raise IOError(f'Parte incompleta de {remote_file}: {len(data)} de {end - start} bytes')
+        written = 0
+        while written < len(data):
+            written += os.pwrite(fd, memoryview(data)[written:], start + written)
+        return start, data
+
+    def download(self, remote_file, local_file, on_part=None, info=None):
+        """
+        Descarga un archivo remoto, reanudando una descarga anterior si la hay.
+
+        Args:
+            remote_file (str): Ruta del archivo remoto.
+            local_file (str): Ruta del archivo local a escribir.
+            on_part (callable): Función opcional que recibe (inicio, bytes) de cada parte, en orden.
+            info (dict): Información del objeto remoto ya obtenida con fs.info, opcional.
+
+        Returns:
+            dict: Información del objeto remoto (fs.info), con su tamaño y ETag.
+        """
+        info = info or self.fs.info(remote_file)
+        size = info['size']
+        etag = info.get('ETag')
+        state_file = local_file + self.STATE_SUFFIX
+        parts = [(start, min(start + self.part_size, size)) for start in range(0, size, self.part_size)]
+
+        state = self._loadState(state_file, local_file, etag, size)
+        if state is None:
+            state = {'etag': etag, 'size': size, 'part_size': self.part_size, 'done': []}
+            fd = os.open(local_file, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            # Se reserva el archivo completo: cada parte se escribe directamente en su posición
+            if hasattr(os, 'posix_fallocate') and size > 0:
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+            self._saveState(state_file, state)
+        else:
+            fd = os.open(local_file, os.O_RDWR)
+            self.logger.info(f'Reanudando {os.path.basename(local_file)}: {len(state["done"])} de {len(parts)} partes ya descargadas')
+
+        done = set(state['done'])
+        futures = {}
+        try:
+            futures = {start: self.executor.submit(self._fetchPart, remote_file, fd, start, end)
+                       for start, end in parts if start not in done}
+            errors = []
+            for start, end in parts:
+                if start in done:
+                    # Las partes de una descarga anterior solo se leen del disco si hay que entregarlas
+                    if on_part is not None and not errors:
+                        on_part(start, os.pread(fd, end - start, start))
+                    continue
+                try:
+                    start, data = futures[start].result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if on_part is not None and not errors:
+                    on_part(start, data)
+                # La parte se asienta en disco antes de marcarla como descargada
+                os.fdatasync(fd) if hasattr(os, 'fdatasync') else os.fsync(fd)
+                state['done'].append(start)
+                self._saveState(state_file, state)
+            if errors:
+                raise errors[0]
+            os.fsync(fd)
+        finally:
+            # Si on_part falló (por ejemplo, la verificación), quedan partes pendientes o escribiendo en el
+            # descriptor: se cancelan las que no empezaron y se espera a las demás antes de cerrarlo, para
+            # que ninguna escriba en un descriptor cerrado o reutilizado por otra descarga
+            for future in futures.values():
+                future.cancel()
+            wait(futures.values())
+            os.close(fd)
+        os.remove(state_file)
+        return info
+
+    def close(self):
+        """
+        Libera el pool de hilos.
+        """
+        self.executor.shutdown()
@@ -0,0 +1,190 @@
+import os
+import math
+import hashlib
+import threading
+from netCDF4 import Dataset
+
+# Firmas de los formatos aceptados: HDF5 (netCDF-4) y netCDF clásico
+HDF5_SIGNATURE = b'\x89HDF\r\n\x1a\n'
+CLASSIC_SIGNATURES = (b'CDF\x01', b'CDF\x02', b'CDF\x05')
+
+# Tamaños de parte (MiB) habituales en subidas multiparte, para reproducir ETags del tipo '<md5>-<N>'
+MULTIPART_SIZES_MB = (5, 8, 16, 32, 64, 100, 128, 256, 512)
+
+# La biblioteca netCDF/HDF5 no es segura entre hilos: las verificaciones de los hilos de descarga se serializan
+NETCDF_LOCK = threading.Lock()
+
+
+class VerificationError(Exception):
+    """
+    El archivo descargado no coincide con el objeto remoto o no es un netCDF válido.
+    """
+
+
+def checkSignature(header):
+    """
+    Verifica que los primeros bytes de un archivo correspondan a un netCDF.
+
+    Args:
+        header (bytes): Primeros 8 bytes del archivo.
+
+    Raises:
+        VerificationError: Si la firma no es HDF5 ni netCDF clásico.
+    """
+    if not (header.startswith(HDF5_SIGNATURE) or header.startswith(CLASSIC_SIGNATURES)):
+        raise VerificationError(f'Firma de archivo desconocida: {header[:8]!r}')
+
+
+def _md5():
+    return hashlib.md5(usedforsecurity=False)
+
+
+class StreamVerifier:
+    """
+    Verificación de un objeto a medida que se reciben sus bytes, en orden.
+
+    Calcula el MD5 del contenido sin volver a leer el archivo. Si el ETag es
+    el MD5 del objeto (subida simple), se compara directamente. Si es de una
+    subida multiparte ('<md5>-<N>'), se calcula en paralelo el MD5 de los MD5
+    de cada parte para los tamaños de parte habituales compatibles con N, y
+    el archivo se rechaza si ninguno reproduce el ETag. Si ningún tamaño es
+    compatible con N, solo se verifica el tamaño. También se verifica la
+    firma del formato con los primeros bytes recibidos.
+    """
+
+    def __init__(self, size, etag=None):
+        """
+        Args:
+            size (int): Tamaño esperado del objeto en bytes.
+            etag (str): ETag del objeto remoto, opcional.
+        """
+        self.size = size
+        self.etag = (etag or '').strip('"') or None
+        self.received = 0
+        self.header = b''
+        self.md5 = None
+        self.multipart = {}
+        if self.etag and '-' in self.etag:
+            parts = int(self.etag.split('-')[-1])
+            for mb in MULTIPART_SIZES_MB:
+                part_size = mb * 2**20
+                if math.ceil(size / part_size) == parts:
+                    # [md5 de la parte en curso, bytes de la parte en curso, md5 de las partes cerradas]
+                    self.multipart[part_size] = [_md5(), 0, []]
+        elif self.etag:
+            self.md5 = _md5()
+
+    def update(self, data):
+        """
+        Agrega el próximo bloque de bytes del objeto.
+
+        Args:
+            data (bytes): Bloque recibido, a continuación del anterior.
+
+        Raises:
+            VerificationError: Si la firma del formato no es válida o se reciben más bytes de los esperados.
+        """
+        if len(self.header) < 8:
+            self.header += bytes(data[:8 - len(self.header)])
+            if len(self.header) == 8 or self.received + len(data) == self.size:
+                checkSignature(self.header)
+        self.received += len(data)
+        if self.received > self.size:
+            raise VerificationError(f'Se recibieron {self.received} bytes de {self.size} esperados')
+        if self.md5 is not None:
+            self.md5.update(data)
+        view = memoryview(data)
+        for part_size, state in self.multipart.items():
+            offset = 0
+            while offset < len(view):
+                take = min(part_size - state[1], len(view) - offset)
+                state[0].update(view[offset:offset + take])
+                state[1] += take
+                offset += take
+                if state[1] == part_size:
+                    state[2].append(state[0].digest())
+                    state[0], state[1] = _md5(), 0
+
+    def verify(self):
+        """
+        Verifica el tamaño y, si es posible, el ETag del objeto recibido.
+
+        Returns:
+            str: Método de verificación usado ('md5', 'md5-multiparte' o 'tamaño').
+
+        Raises:
+            VerificationError: Si el tamaño o el hash no coinciden.
+        """
+        if self.received != self.size:
+            raise VerificationError(f'Archivo incompleto: {self.received} de {self.size} bytes')
+        if self.md5 is not None:
+            if self.md5.hexdigest() != self.etag:
+                raise VerificationError(f'El MD5 {self.md5.hexdigest()} no coincide con el ETag {self.etag}')
+            return 'md5'
+        for part_size, (current, pending, digests) in self.multipart.items():
+            digests = digests + ([current.digest()] if pending else [])
+            combined = _md5()
+            for digest in digests:
+                combined.update(digest)
+            if f'{combined.hexdigest()}-{len(digests)}' == self.etag:
+                return 'md5-multiparte'
+        if self.multipart:
+            raise VerificationError(f'Ningún tamaño de parte compatible reproduce el ETag {self.etag}')
+        # Sin ETag, o ETag multiparte sin tamaño de parte habitual compatible con la
+        # cantidad de partes: no se puede calcular el hash, se verifica solo el tamaño
+        return 'tamaño'
+
+
+def checkNetcdf(local_file, variable='Rad'):
+    """
+    Verificación liviana de un netCDF antes de entregarlo al procesador: que
+    abra, que tenga la variable de radiancia con datos y sus atributos de
+    escala, y que se pueda leer su último chunk.
+
+    Args:
+        local_file (str): Ruta del archivo.
+        variable (str): Variable que debe contener el archivo.
+
+    Raises:
+        VerificationError: Si el archivo no es un netCDF válido o no tiene la variable.
+    """
+    with open(local_file, 'rb') as fp:
+        checkSignature(fp.read(8))
+    try:
+        with NETCDF_LOCK, Dataset(local_file, 'r') as nc:
+            if variable not in nc.variables:
+                raise VerificationError(f'El archivo no tiene la variable {variable}')
+            var = nc.variables[variable]
+            if var.ndim != 2 or 0 in var.shape:
+                raise VerificationError(f'La variable {variable} tiene una forma inesperada: {var.shape}')
+            for attr in ('scale_factor', 'add_offset'):
+                if attr not in var.ncattrs():
+                    raise VerificationError(f'La variable {variable} no tiene el atributo {attr}')
+            var.set_auto_maskandscale(False)
+            var[-1, -1]
+    except VerificationError:
+        raise
+    except Exception as e:
+        raise VerificationError(f'No se pudo leer el netCDF: {e}')
+
+
+def streamCopy(fs, remote_file, local_file, verifier, block_size=4 * 2**20):
+    """
+    Copia un archivo remoto a disco por bloques, verificándolo a medida que llega.
+
+    Args:
+        fs (s3fs.S3FileSystem): Sistema de archivos remoto.
+        remote_file (str): Ruta del archivo remoto.
+        local_file (str): Ruta del archivo local a escribir.
+        verifier (StreamVerifier): Verificador que recibe cada bloque.
+        block_size (int): Tamaño de los bloques de lectura en bytes.
+    """
+    with fs.open(remote_file, 'rb', block_size=block_size, cache_type='none') as src, open(local_file, 'wb') as dst:
+        while True:
+            data = src.read(block_size)
+            if not data:
+                break
+            verifier.update(data)
+            dst.write(data)
+        dst.flush()
+        os.fsync(dst.fileno())
@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import resource
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites de los histogramas de duración de etapas (segundos) y de latencias (segundos)
+LIMITES_ETAPAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LIMITES_LATENCIA = (60, 120, 300, 600, 900, 1200, 1800, 2700, 3600, 7200)
+LIMITES_BYTES_POR_SEGUNDO = (1e5, 5e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 1e9)
+
+
+def _etiquetas(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _formatear_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if valor not in (float('inf'), float('-inf')) else ('+Inf' if valor > 0 else '-Inf')
+
+
+class Histograma:
+    """
+    Histograma acumulado con límites fijos, como los de Prometheus, con una serie por combinación de etiquetas.
+    """
+
+    def __init__(self, nombre, ayuda, limites=LIMITES_ETAPAS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = tuple(sorted(limites))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observar(self, valor, **labels):
+        clave = _etiquetas(labels)
+        with self.lock:
+            serie = self.series.get(clave)
+            if serie is None:
+                serie = self.series[clave] = {'conteos': [0] * (len(self.limites) + 1), 'suma': 0.0, 'cantidad': 0}
+            serie['conteos'][bisect.bisect_left(self.limites, valor)] += 1
+            serie['suma'] += valor
+            serie['cantidad'] += 1
+
+    def cuantil(self, q, **labels):
+        """
+        Estima un cuantil por interpolación lineal dentro del intervalo que lo contiene, o None sin datos.
+        """
+        with self.lock:
+            serie = self.series.get(_etiquetas(labels))
+            if serie is None or serie['cantidad'] == 0:
+                return None
+            objetivo = q * serie['cantidad']
+            acumulado = 0
+            for i, conteo in enumerate(serie['conteos']):
+                if conteo and acumulado + conteo >= objetivo:
+                    inferior = self.limites[i - 1] if i > 0 else 0.0
+                    if i == len(self.limites):
+                        return inferior
+                    return inferior + (self.limites[i] - inferior) * (objetivo - acumulado) / conteo
+                acumulado += conteo
+            return self.limites[-1]
+
+    def exposicion(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        with self.lock:
+            for clave, serie in sorted(self.series.items()):
+                acumulado = 0
+                for limite, conteo in zip(self.limites + (float('inf'),), serie['conteos']):
+                    acumulado += conteo
+                    lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(clave, [('le', _numero(limite))])} {acumulado}")
+                lineas.append(f"{self.nombre}_sum{_formatear_etiquetas(clave)} {_numero(serie['suma'])}")
+                lineas.append(f"{self.nombre}_count{_formatear_etiquetas(clave)} {serie['cantidad']}")
+        return lineas
+
+    def resumen(self):
+        with self.lock:
+            claves = {clave: dict(serie) for clave, serie in self.series.items()}
+        resumen = {}
+        for clave, serie in claves.items():
+            labels = dict(clave)
+            resumen[','.join(f'{k}={v}' for k, v in clave) or '_'] = {
+                'cantidad': serie['cantidad'],
+                'media': round(serie['suma'] / serie['cantidad'], 6) if serie['cantidad'] else None,
+                'p50': self.cuantil(0.5, **labels),
+                'p95': self.cuantil(0.95, **labels),
+            }
+        return resumen
+
+
+class Medidor:
+    """
+    Valor instantáneo (gauge). Puede fijarse con 'fijar' o calcularse al consultar con una función.
+    """
+
+    def __init__(self, nombre, ayuda, funcion=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.valores = {}
+        self.lock = threading.Lock()
+
+    def fijar(self, valor, **labels):
+        with self.lock:
+            self.valores[_etiquetas(labels)] = valor
+
+    def leer(self):
+        if self.funcion is not None:
+            try:
+                return {(): self.funcion()}
+            except Exception:
+                return {}
+        with self.lock:
+            return dict(self.valores)
+
+    def exposicion(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} gauge']
+        for clave, valor in sorted(self.leer().items()):
+            if valor is not None:
+                lineas.append(f'{self.nombre}{_formatear_etiquetas(clave)} {_numero(valor)}')
+        return lineas
+
+    def resumen(self):
+        return {','.join(f'{k}={v}' for k, v in clave) or '_': valor for clave, valor in self.leer().items()}
+
+
+class Contador(Medidor):
+    """
+    Valor que solo aumenta (counter).
+    """
+
+    def incrementar(self, valor=1, **labels):
+        clave = _etiquetas(labels)
+        with self.lock:
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+    def exposicion(self):
+        lineas = super().exposicion()
+        lineas[1] = f'# TYPE {self.nombre} counter'
+        return lineas
+
+
+def MemoriaResidente():
+    """
+    Devuelve la memoria residente (RSS) actual del proceso en bytes; sin /proc, el máximo alcanzado.
+    """
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def DescriptoresAbiertos():
+    """
+    Devuelve la cantidad de descriptores de archivo abiertos por el proceso, o None si no se puede saber.
+    """
+    for directorio in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(directorio))
+        except OSError:
+            continue
+    return None
+
+
+class Registro:
+    """
+    Métricas del proceso: histogramas de duración por etapa, medidores (profundidad de
+    colas, memoria, descriptores) y contadores.
+    """
+
+    def __init__(self, prefijo='mdptn'):
+        self.prefijo = prefijo
+        self.metricas = {}
+        self.lock = threading.Lock()
+        self.etapas = self.histograma('etapa_segundos', 'Duración de cada etapa de la descarga y el procesamiento.')
+        self.medidor('proceso_rss_bytes', 'Memoria residente del proceso.', MemoriaResidente)
+        self.medidor('proceso_descriptores_abiertos', 'Descriptores de archivo abiertos por el proceso.', DescriptoresAbiertos)
+
+    def _registrar(self, clase, nombre, *args):
+        nombre = f'{self.prefijo}_{nombre}'
+        with self.lock:
+            if nombre not in self.metricas:
+                self.metricas[nombre] = clase(nombre, *args)
+            return self.metricas[nombre]
+
+    def histograma(self, nombre, ayuda, limites=LIMITES_ETAPAS):
+        return self._registrar(Histograma, nombre, ayuda, limites)
+
+    def medidor(self, nombre, ayuda, funcion=None):
+        medidor = self._registrar(Medidor, nombre, ayuda, funcion)
+        if funcion is not None:
+            # Una función registrada de nuevo (por ejemplo, una cola recreada) reemplaza a la anterior
+            medidor.funcion = funcion
+        return medidor
+
+    def contador(self, nombre, ayuda):
+        return self._registrar(Contador, nombre, ayuda)
+
+    def observar(self, etapa, segundos):
+        """
+        Registra la duración de una etapa.
+        """
+        self.etapas.observar(segundos, etapa=etapa)
+
+    @contextmanager
+    def medir(self, etapa):
+        """
+        Mide la duración del bloque y la registra en el histograma de etapas (también si falla).
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def registrar_descarga(self, tamano, segundos):
+        """
+        Registra la duración, los bytes y la velocidad de la descarga de un archivo.
+        """
+        self.observar('descarga', segundos)
+        self.contador('descarga_bytes_total', 'Bytes descargados.').incrementar(tamano)
+        if segundos > 0:
+            self.histograma('descarga_bytes_por_segundo', 'Velocidad de descarga de cada archivo.',
+                            LIMITES_BYTES_POR_SEGUNDO).observar(tamano / segundos)
+
+    def registrar_latencia(self, tipo, segundos, **labels):
+        """
+        Registra una latencia desde el inicio del escaneo (por ejemplo, hasta el inbox o hasta el PNG publicado).
+        """
+        self.histograma(f'latencia_{tipo}_segundos', f'Segundos desde el inicio del escaneo hasta {tipo}.',
+                        LIMITES_LATENCIA).observar(segundos, **labels)
+
+    def exposicion(self):
+        """
+        Devuelve todas las métricas en el formato de texto de Prometheus.
+        """
+        with self.lock:
+            metricas = list(self.metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas.extend(metrica.exposicion())
+        return '\n'.join(lineas) + '\n'
+
+    def resumen(self):
+        """
+        Devuelve las métricas como diccionario (conteo, media y cuantiles estimados de los histogramas).
+        """
+        with self.lock:
+            metricas = list(self.metricas.items())
+        return {nombre: metrica.resumen() for nombre, metrica in metricas}
+
+
+# Registro compartido por la descarga y el procesador cuando se ejecutan en el mismo proceso
+REGISTRO = Registro()
+
+
+class ServidorMetricas:
+    """
+    Servidor HTTP en un hilo que publica el registro en /metrics con el formato de Prometheus.
+    """
+
+    def __init__(self, registro=REGISTRO, puerto=9108, host='127.0.0.1'):
+        registro_servido = registro
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                cuerpo = registro_servido.exposicion().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        self.puerto = self.servidor.server_address[1]
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, name='metricas-http', daemon=True)
+        self.hilo.start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+class ArchivoMetricas:
+    """
+    Escribe periódicamente el resumen del registro como una línea JSON en un archivo rotativo.
+    """
+
+    def __init__(self, path, registro=REGISTRO, intervalo=60, max_bytes=10 * 2**20, copias=5):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.registro = registro
+        self.intervalo = intervalo
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=copias)
+        self.detener = threading.Event()
+        self.hilo = threading.Thread(target=self._escribir_periodicamente, name='metricas-archivo', daemon=True)
+        self.hilo.start()
+
+    def escribir(self):
+        linea = json.dumps({'tiempo': time.strftime('%Y-%m-%dT%H:%M:%S'), 'metricas': self.registro.resumen()},
+                           ensure_ascii=False)
+        self.handler.emit(logging.makeLogRecord({'msg': linea, 'levelno': logging.INFO, 'levelname': 'INFO'}))
+
+    def _escribir_periodicamente(self):
+        while not self.detener.wait(self.intervalo):
+            try:
+                self.escribir()
+            except Exception as e:
+                logging.error(f"No se pudieron escribir las métricas: {e}")
+
+    def cerrar(self):
+        self.detener.set()
+        self.hilo.join()
+        self.escribir()
+        self.handler.close()
+
+
+def IniciarExportacion(conf, directorio_base, registro=REGISTRO):
+    """
+    Inicia el servidor y el archivo de métricas según la configuración 'metricas'.
+
+    :param conf: Diccionario con 'habilitado', 'puerto' (0 = sin servidor), 'archivo' (vacío = sin archivo),
+                 'intervalo', 'max_mb' y 'copias'.
+    :param directorio_base: Directorio respecto del cual se resuelve 'archivo'.
+    :return: Lista de exportadores iniciados (con el método cerrar()).
+    """
+    exportadores = []
+    if not conf.get('habilitado', False):
+        return exportadores
+    if conf.get('puerto'):
+        try:
+            servidor = ServidorMetricas(registro, conf['puerto'], conf.get('host', '127.0.0.1'))
+            exportadores.append(servidor)
+            logging.info(f"Métricas publicadas en http://{conf.get('host', '127.0.0.1')}:{servidor.puerto}/metrics")
+        except OSError as e:
+            logging.error(f"No se pudo iniciar el servidor de métricas en el puerto {conf['puerto']}: {e}")
+    if conf.get('archivo'):
+        exportadores.append(ArchivoMetricas(os.path.join(directorio_base, conf['archivo']), registro,
+                                            intervalo=conf.get('intervalo', 60),
+                                            max_bytes=int(conf.get('max_mb', 10) * 2**20),
+                                            copias=conf.get('copias', 5)))
+    return exportadores
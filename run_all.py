@@ -1,83 +1,249 @@
-import subprocess
-import concurrent.futures
-import time
 import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+
+raiz = os.path.dirname(os.path.abspath(__file__))
 
-# Función para ejecutar el script de descarga
-def ejecutar_descarga():
-    """
-    Ejecuta el script de descarga 'goes16Download.py' utilizando subprocess.
-    
-    Si ocurre un error durante la ejecución, se imprime un mensaje de error.
-    """
-    try:
-        subprocess.run(['python', 'descarga/goes16Download.py'], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error durante la descarga: {e}")
 
-# Función para verificar si hay suficientes imágenes en la carpeta de entrada
-def hay_imagenes_suficientes(inbox_path, num_requerido):
+class EstadoEtapa:
     """
-    Verifica si hay suficientes imágenes en la carpeta de entrada para comenzar el procesamiento.
-    
-    :param inbox_path: Ruta a la carpeta de entrada.
-    :param num_requerido: Número requerido de imágenes para iniciar el procesamiento.
-    :return: Booleano indicando si hay suficientes imágenes.
+    Salud de una etapa del pipeline: actividad, errores y estado de su hilo.
     """
-    archivos = [f for f in os.listdir(inbox_path) if f.endswith('.nc')]
-    return len(archivos) >= num_requerido
 
-# Función para ejecutar el script de procesamiento
-def ejecutar_procesamiento():
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.procesados = 0
+        self.errores = 0
+        self.ultima_actividad = None
+        self.ultimo_error = None
+        self.reinicios = 0
+        self.hilo = None
+        self.lock = threading.Lock()
+
+    def registrar(self):
+        with self.lock:
+            self.procesados += 1
+            self.ultima_actividad = time.time()
+
+    def registrar_error(self, error):
+        with self.lock:
+            self.errores += 1
+            self.ultimo_error = f'{type(error).__name__}: {error}'
+
+    def resumen(self):
+        """
+        Devuelve el estado de la etapa como diccionario.
+        """
+        with self.lock:
+            return {
+                'vivo': self.hilo is not None and self.hilo.is_alive(),
+                'procesados': self.procesados,
+                'errores': self.errores,
+                'reinicios': self.reinicios,
+                'segundos_sin_actividad': None if self.ultima_actividad is None else round(time.time() - self.ultima_actividad, 1),
+                'ultimo_error': self.ultimo_error,
+            }
+
+
+class Pipeline:
     """
-    Ejecuta el script de procesamiento 'main.py' utilizando subprocess.
-    
-    Si ocurre un error durante la ejecución, se imprime un mensaje de error.
+    Descarga y procesamiento en un mismo proceso.
+
+    La descarga entrega cada escaneo completo (diccionario banda -> ruta en el
+    inbox) a una cola acotada en el momento en que lo mueve al inbox; el hilo de
+    procesamiento lo toma de la cola sin esperar eventos del sistema de
+    archivos. Si el procesamiento se atrasa y la cola se llena, la descarga
+    espera (contrapresión). El procesador se inicializa una sola vez (acumulado,
+    animación y pool de render), antes de empezar a descargar.
+
+    La descarga se supervisa: si termina con un error, se reinicia después de
+    'reintento' segundos. Un error al procesar un escaneo se registra y el
+    procesamiento sigue con el siguiente.
     """
-    try:
-        subprocess.run(['python', 'Procesador/main.py'], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error durante el procesamiento: {e}")
 
-if __name__ == "__main__":
+    _FIN = object()
+
+    def __init__(self, descargar, iniciar, procesar, cerrar=None, queue_size=8,
+                 health_file=None, health_interval=60, reintento=60, metricas=None):
+        """
+        :param descargar: Función descargar(on_scan, stop_event) que entrega cada escaneo a on_scan.
+        :param iniciar: Función que inicializa el procesador.
+        :param procesar: Función que procesa un archivo del inbox.
+        :param cerrar: Función que libera los recursos del procesador, opcional.
+        :param queue_size: Máximo de escaneos en espera de ser procesados.
+        :param health_file: Archivo JSON donde se escribe la salud del pipeline, opcional.
+        :param health_interval: Segundos entre informes de salud.
+        :param reintento: Segundos de espera antes de reiniciar la descarga tras un error.
+        :param metricas: Registro de métricas (metricas.Registro) para la cola, opcional.
+        """
+        self.descargar = descargar
+        self.iniciar_procesador = iniciar
+        self.procesar = procesar
+        self.cerrar_procesador = cerrar
+        self.cola = queue.Queue(maxsize=queue_size)
+        self.health_file = health_file
+        self.health_interval = health_interval
+        self.reintento = reintento
+        self.stop_event = threading.Event()
+        self.etapas = {nombre: EstadoEtapa(nombre) for nombre in ('descarga', 'procesamiento')}
+        self.espera_cola = None  # Segundos que esperó en la cola el último escaneo procesado
+        self.metricas = metricas
+        if metricas is not None:
+            metricas.medidor('cola_escaneos', 'Escaneos descargados en espera de ser procesados.', self.cola.qsize)
+
+    def encolar(self, archivos):
+        """
+        Entrega un escaneo al procesamiento. Bloquea mientras la cola esté llena.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.cola.put((archivos, time.monotonic()), timeout=0.5)
+                self.etapas['descarga'].registrar()
+                return
+            except queue.Full:
+                continue
+
+    def _descargar(self):
+        etapa = self.etapas['descarga']
+        while not self.stop_event.is_set():
+            try:
+                self.descargar(self.encolar, self.stop_event)
+                break
+            except Exception as e:
+                etapa.registrar_error(e)
+                etapa.reinicios += 1
+                logging.error(f"La descarga terminó con un error, se reinicia en {self.reintento} s: {e}")
+                self.stop_event.wait(self.reintento)
+        # Fin de la descarga (fecha de fin alcanzada o detención): el procesamiento vacía la cola y termina
+        self.cola.put(self._FIN)
+
+    def _procesar(self):
+        etapa = self.etapas['procesamiento']
+        while True:
+            item = self.cola.get()
+            if item is self._FIN:
+                break
+            archivos, encolado = item
+            self.espera_cola = time.monotonic() - encolado
+            if self.metricas is not None:
+                self.metricas.observar('espera_cola', self.espera_cola)
+            try:
+                for path in [archivos[banda] for banda in sorted(archivos)]:
+                    self.procesar(path)
+                etapa.registrar()
+            except Exception as e:
+                etapa.registrar_error(e)
+                logging.error(f"Error al procesar el escaneo {sorted(archivos.values())}: {e}")
+
+    def salud(self):
+        """
+        Devuelve el estado de las etapas y de la cola.
+        """
+        return {
+            'tiempo': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'etapas': {nombre: etapa.resumen() for nombre, etapa in self.etapas.items()},
+            'cola': {'pendientes': self.cola.qsize(), 'maximo': self.cola.maxsize,
+                     'espera_ultimo_escaneo': None if self.espera_cola is None else round(self.espera_cola, 3)},
+        }
+
+    def informar(self):
+        """
+        Registra la salud del pipeline en el log y, si se configuró, en el archivo JSON.
+        """
+        estado = self.salud()
+        logging.info('Salud del pipeline: ' + ', '.join(
+            f"{nombre} {'activo' if e['vivo'] else 'detenido'} ({e['procesados']} escaneos, {e['errores']} errores)"
+            for nombre, e in estado['etapas'].items()) + f", cola {estado['cola']['pendientes']}/{estado['cola']['maximo']}")
+        if self.health_file:
+            temporal = self.health_file + '.tmp'
+            with open(temporal, 'w') as fp:
+                json.dump(estado, fp, indent=2)
+            os.replace(temporal, self.health_file)
+
+    def iniciar(self):
+        # El procesador se inicializa con el inbox antes de que la descarga agregue archivos
+        self.iniciar_procesador()
+        for nombre, objetivo in (('procesamiento', self._procesar), ('descarga', self._descargar)):
+            hilo = threading.Thread(target=objetivo, name=nombre, daemon=True)
+            self.etapas[nombre].hilo = hilo
+            hilo.start()
+
+    def detener(self):
+        """
+        Detiene la descarga, procesa los escaneos ya encolados y libera el procesador.
+        """
+        self.stop_event.set()
+        for etapa in self.etapas.values():
+            if etapa.hilo is not None:
+                etapa.hilo.join()
+        if self.cerrar_procesador is not None:
+            self.cerrar_procesador()
+
+    def ejecutar(self):
+        """
+        Ejecuta el pipeline hasta que la descarga termina o se interrumpe con Ctrl+C.
+        """
+        self.iniciar()
+        try:
+            while self.etapas['procesamiento'].hilo.is_alive():
+                self.etapas['procesamiento'].hilo.join(self.health_interval)
+                self.informar()
+        except KeyboardInterrupt:
+            logging.info("Interrupción recibida, deteniendo el pipeline.")
+        self.detener()
+        self.informar()
+
+
+def crear_pipeline(queue_size=8, health_file=None, health_interval=60, metricas=None):
     """
-    Punto de entrada principal del script. Ejecuta la descarga y el procesamiento de imágenes concurrentemente.
+    Crea el pipeline con la descarga de 'descarga/goes16Download.py' y el procesador de 'Procesador/main.py',
+    importados en este proceso (cartopy y matplotlib se cargan una sola vez).
     """
-    inbox_path = os.path.join('Procesador', 'inbox')
-    num_imagenes_requeridas = 6  # Cambia a 6 para pruebas rápidas
-
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Ejecutar la descarga concurrentemente
-        future_descarga = executor.submit(ejecutar_descarga)
-        
-        # Verificar continuamente si hay suficientes imágenes para procesar
-        while not hay_imagenes_suficientes(inbox_path, num_imagenes_requeridas):
-            print("Esperando a que haya suficientes imágenes en la carpeta de entrada...")
-            time.sleep(30)  # Verificar cada 30 segundos
-
-        # Una vez que hay suficientes imágenes, ejecutar el procesamiento
-        print("Suficientes imágenes encontradas, iniciando el procesamiento.")
-        future_procesamiento = executor.submit(ejecutar_procesamiento)
-        
-        # Esperar a que ambas tareas se completen
-        concurrent.futures.wait([future_descarga, future_procesamiento])
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    sys.path.insert(0, os.path.join(raiz, 'descarga'))
+    sys.path.insert(0, os.path.join(raiz, 'Procesador'))
+    import goes16Download
+    import main as procesador
 
+    # Las latencias del procesador se miden con el mismo reloj que la descarga (acelerado al reproducir un espejo)
+    procesador.reloj = goes16Download.clock.now
 
+    return Pipeline(lambda on_scan, stop_event: goes16Download.main(on_scan=on_scan, stop_event=stop_event),
+                    procesador.iniciar, procesador.procesar_archivo, procesador.cerrar,
+                    queue_size=queue_size, health_file=health_file, health_interval=health_interval,
+                    metricas=metricas)
 
 
+if __name__ == "__main__":
+    """
+    Punto de entrada principal del script. Ejecuta la descarga y el procesamiento de imágenes en un mismo proceso.
+    """
+    parser = argparse.ArgumentParser(description='Descarga y procesa las imágenes GOES-16 en un mismo proceso.')
+    parser.add_argument('--cola', type=int, default=8, help='Máximo de escaneos descargados en espera de ser procesados.')
+    parser.add_argument('--salud', default=os.path.join(raiz, 'descarga', 'logs', 'salud.json'),
+                        help='Archivo JSON donde se escribe la salud del pipeline.')
+    parser.add_argument('--intervalo', type=float, default=60, help='Segundos entre informes de salud.')
+    parser.add_argument('--metricas-puerto', type=int, default=None,
+                        help='Puerto del endpoint /metrics (0 = sin servidor). Por defecto, el de descarga/setup.json.')
+    args = parser.parse_args()
+
+    import metricas
+
+    # Descarga y procesamiento comparten un único registro, que se exporta con la configuración de la descarga
+    with open(os.path.join(raiz, 'descarga', 'setup.json')) as fp:
+        conf_metricas = dict(json.load(fp).get('metricas', {}))
+    if args.metricas_puerto is not None:
+        conf_metricas['puerto'] = args.metricas_puerto
+
+    pipeline = crear_pipeline(queue_size=args.cola, health_file=args.salud, health_interval=args.intervalo,
+                              metricas=metricas.REGISTRO)
+    exportadores = metricas.IniciarExportacion(conf_metricas, os.path.join(raiz, 'descarga'))
+    try:
+        pipeline.ejecutar()
+    finally:
+        for exportador in exportadores:
+            exportador.cerrar()
@@ -0,0 +1,182 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# Asegurar que el procesador esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+
+from src.acumulador import AcumuladorPersistencia, PersistenciaMovil
+
+
+class TestAcumulador(unittest.TestCase):
+    def setUp(self):
+        """
+        Genera una secuencia de máscaras aleatorias con una forma que no es múltiplo de 8.
+        """
+        rng = np.random.default_rng(1)
+        self.mascaras = [rng.random((37, 53)) < 0.4 for _ in range(20)]
+
+    def test_ventana_deslizante(self):
+        """
+        El conteo coincide con la suma de las últimas 'capacidad' máscaras.
+        """
+        acumulador = AcumuladorPersistencia(6)
+        for i, mascara in enumerate(self.mascaras):
+            acumulador.agregar(mascara)
+            esperado = np.sum(self.mascaras[max(0, i - 5):i + 1], axis=0)
+            np.testing.assert_array_equal(acumulador.conteo, esperado)
+        self.assertEqual(len(acumulador), 6)
+
+    def test_orden_de_mascaras(self):
+        """
+        Los lugares del anillo se recorren de la máscara más antigua a la más nueva.
+        """
+        acumulador = AcumuladorPersistencia(4)
+        for mascara in self.mascaras[:7]:
+            acumulador.agregar(mascara)
+        for slot, mascara in zip(acumulador.slots(), self.mascaras[3:7]):
+            np.testing.assert_array_equal(acumulador.mascara(slot), mascara)
+
+    def test_tipo_del_contador(self):
+        """
+        El contador usa uint8 hasta 255 máscaras y uint16 por encima.
+        """
+        acumulador = AcumuladorPersistencia(144)
+        acumulador.agregar(self.mascaras[0])
+        self.assertEqual(acumulador.conteo.dtype, np.uint8)
+        self.assertEqual(AcumuladorPersistencia(300).dtype, np.uint16)
+
+    def test_planos_por_umbral(self):
+        """
+        Con máscaras (N, alto, ancho) el conteo lleva un plano por umbral, también al reanudar.
+        """
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        acumulador = AcumuladorPersistencia(4, directorio)
+        pilas = [np.stack([m, ~m, m & self.mascaras[0]]) for m in self.mascaras[:6]]
+        for pila in pilas:
+            acumulador.agregar(pila)
+        np.testing.assert_array_equal(acumulador.conteo, np.sum(pilas[2:], axis=0))
+        reanudado = AcumuladorPersistencia(4, directorio)
+        np.testing.assert_array_equal(reanudado.conteo, acumulador.conteo)
+
+        # Al descartar la ventana se puede empezar con otra forma
+        reanudado.descartar()
+        reanudado.agregar(self.mascaras[0])
+        self.assertEqual(reanudado.conteo.shape, self.mascaras[0].shape)
+        self.assertEqual(len(AcumuladorPersistencia(4, directorio)), 1)
+
+    def test_forma_incorrecta(self):
+        """
+        Una máscara con otra forma se rechaza.
+        """
+        acumulador = AcumuladorPersistencia(4)
+        acumulador.agregar(self.mascaras[0])
+        with self.assertRaises(ValueError):
+            acumulador.agregar(np.zeros((5, 5), dtype=bool))
+
+    def test_persistencia_movil(self):
+        """
+        Las sumas acumuladas dan los mismos conteos que el acumulador imagen por imagen.
+        """
+        acumulador = AcumuladorPersistencia(6)
+        esperado = []
+        for mascara in self.mascaras:
+            acumulador.agregar(mascara)
+            esperado.append(acumulador.conteo.copy())
+        for previas in (0, 4, 9):
+            conteos = PersistenciaMovil(np.array(self.mascaras), 6, previas=previas)
+            np.testing.assert_array_equal(conteos, esperado[previas:])
+
+    def test_reanudacion(self):
+        """
+        Un acumulador persistido se reanuda con la misma ventana, conteo y tiempos.
+        """
+        directorio = tempfile.mkdtemp()
+        try:
+            inicio = datetime(2024, 1, 12, tzinfo=timezone.utc)
+            acumulador = AcumuladorPersistencia(6, directorio)
+            for i, mascara in enumerate(self.mascaras[:9]):
+                acumulador.agregar(mascara, inicio + timedelta(minutes=10 * i))
+            reanudado = AcumuladorPersistencia(6, directorio)
+            self.assertEqual(len(reanudado), 6)
+            np.testing.assert_array_equal(reanudado.conteo, acumulador.conteo)
+            self.assertEqual(reanudado.ultimo_tiempo(), (inicio + timedelta(minutes=80)).timestamp())
+            reanudado.agregar(self.mascaras[9])
+            np.testing.assert_array_equal(reanudado.conteo, np.sum(self.mascaras[4:10], axis=0))
+        finally:
+            shutil.rmtree(directorio)
+
+    def test_reanudacion_sin_desempaquetar(self):
+        """
+        Al reanudar, el conteo se lee del plano confirmado por la cabecera sin desempaquetar el anillo,
+        aunque una caída haya dejado escrito el plano libre.
+        """
+        directorio = tempfile.mkdtemp()
+        try:
+            acumulador = AcumuladorPersistencia(6, directorio)
+            for mascara in self.mascaras[:8]:
+                acumulador.agregar(mascara)
+            esperado = np.array(acumulador.conteo)
+            # Caída a mitad de una actualización: el plano libre quedó escrito y la cabecera no cambió
+            acumulador.conteos[1 - acumulador.plano] = 99
+            acumulador.conteos.flush()
+            with mock.patch.object(AcumuladorPersistencia, '_desempaquetar', side_effect=AssertionError):
+                reanudado = AcumuladorPersistencia(6, directorio)
+            np.testing.assert_array_equal(reanudado.conteo, esperado)
+            reanudado.agregar(self.mascaras[8])
+            np.testing.assert_array_equal(reanudado.conteo, np.sum(self.mascaras[3:9], axis=0))
+        finally:
+            shutil.rmtree(directorio)
+
+    def test_estado_inconsistente(self):
+        """
+        Si los archivos no coinciden con la cabecera, se empieza de cero en lugar de leer datos inválidos.
+        """
+        directorio = tempfile.mkdtemp()
+        try:
+            acumulador = AcumuladorPersistencia(6, directorio)
+            for mascara in self.mascaras[:3]:
+                acumulador.agregar(mascara)
+            np.save(os.path.join(directorio, AcumuladorPersistencia.ANILLO), np.zeros((7, 3), dtype=np.uint8))
+            reanudado = AcumuladorPersistencia(6, directorio)
+            self.assertEqual(len(reanudado), 0)
+            self.assertIsNone(reanudado.conteo)
+            self.assertEqual(os.listdir(directorio), [])
+            reanudado.agregar(self.mascaras[0])
+            np.testing.assert_array_equal(reanudado.conteo, self.mascaras[0])
+            self.assertEqual(len(AcumuladorPersistencia(6, directorio)), 1)
+
+            # Conteo con otro tipo de dato que el de la capacidad
+            np.save(os.path.join(directorio, AcumuladorPersistencia.CONTEO), np.zeros((2, 37, 53), dtype=np.uint16))
+            self.assertEqual(len(AcumuladorPersistencia(6, directorio)), 0)
+        finally:
+            shutil.rmtree(directorio)
+
+    def test_estado_sin_conteo(self):
+        """
+        Un estado guardado sin el archivo del conteo se reconstruye una vez desde el anillo.
+        """
+        directorio = tempfile.mkdtemp()
+        try:
+            acumulador = AcumuladorPersistencia(6, directorio)
+            for mascara in self.mascaras[:4]:
+                acumulador.agregar(mascara)
+            os.remove(os.path.join(directorio, AcumuladorPersistencia.CONTEO))
+            reanudado = AcumuladorPersistencia(6, directorio)
+            np.testing.assert_array_equal(reanudado.conteo, np.sum(self.mascaras[:4], axis=0))
+            with open(os.path.join(directorio, AcumuladorPersistencia.CABECERA)) as f:
+                self.assertEqual(json.load(f)['plano'], reanudado.plano)
+            self.assertTrue(os.path.exists(os.path.join(directorio, AcumuladorPersistencia.CONTEO)))
+        finally:
+            shutil.rmtree(directorio)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que el procesador y los benchmarks estén en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from sintetico import CrearArchivoABI, NombreArchivoABI
+from src.almacen import AlmacenAcumulado, LeerVentana, PromedioBloques, TilesModificados
+from src.helpers import _GetCropIndexesFromProjection
+from src.productos import EscaneoMultibanda
+
+
+class TestAlmacen(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.tiempo = datetime(2024, 11, 26, 12, 0, 20, tzinfo=timezone.utc)
+        image_file = os.path.join(self.tmpdir, NombreArchivoABI(13, self.tiempo))
+        CrearArchivoABI(image_file, 13, self.tiempo, tamano=678)
+        with Dataset(image_file) as nc:
+            img_indexes = _GetCropIndexesFromProjection(nc, -95.0, -40.5, -60.5, -11.5)
+        # Recorte calculado desde la proyección, sin escribir el cache de data/grids
+        with mock.patch('src.productos.GetRegionCrop', return_value=((0, 1, 0, 1), img_indexes)), \
+                EscaneoMultibanda({13: image_file}, {}, None) as escaneo:
+            self.georreferencia = escaneo.georreferencia(13)
+        self.forma = (len(self.georreferencia['y']), len(self.georreferencia['x']))
+        self.path = os.path.join(self.tmpdir, 'acumulado.nc')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def conteo(self, semilla=0):
+        return np.random.default_rng(semilla).integers(0, 144, self.forma).astype(np.uint8)
+
+    def test_georreferencia(self):
+        almacen = AlmacenAcumulado(self.path, tamano_tile=64)
+        conteo = self.conteo()
+        almacen.escribir({'conteo': conteo, 'diferencia': conteo > 100}, self.tiempo, self.georreferencia)
+        almacen.cerrar()
+        with Dataset(self.path) as nc:
+            self.assertEqual(nc.variables['conteo'].grid_mapping, 'goes_imager_projection')
+            self.assertEqual(nc.variables['goes_imager_projection'].grid_mapping_name, 'geostationary')
+            self.assertEqual(nc.variables['x'].units, 'rad')
+            self.assertEqual(nc.variables['conteo'].chunking(), [64, 64])
+            self.assertTrue(nc.variables['conteo'].filters()['zlib'])
+            self.assertEqual(int(nc.variables['tiempo'][...]), int(self.tiempo.timestamp()))
+            np.testing.assert_array_equal(nc.variables['conteo'][:], conteo)
+            np.testing.assert_array_equal(nc.variables['diferencia'][:], conteo > 100)
+
+    def test_escritura_incremental(self):
+        """
+        Solo se reescriben los tiles que cambiaron, también después de reabrir el archivo.
+        """
+        almacen = AlmacenAcumulado(self.path, tamano_tile=64)
+        conteo = self.conteo()
+        tiles = -(-self.forma[0] // 64) * -(-self.forma[1] // 64)
+        self.assertEqual(almacen.escribir({'conteo': conteo}, self.tiempo, self.georreferencia), tiles)
+        conteo[70:75, 130:140] += 1
+        self.assertEqual(almacen.escribir({'conteo': conteo}, self.tiempo, self.georreferencia), 1)
+        almacen.cerrar()
+
+        almacen = AlmacenAcumulado(self.path, tamano_tile=64)
+        self.assertEqual(almacen.escribir({'conteo': conteo}, self.tiempo, self.georreferencia), 0)
+        almacen.cerrar()
+        datos, x, _ = LeerVentana(self.path, (64, 128), (128, 192))
+        np.testing.assert_array_equal(datos, conteo[64:128, 128:192])
+        np.testing.assert_allclose(x, self.georreferencia['x'][128:192])
+
+        # Las overviews se actualizan con el tile modificado
+        overview, _, _ = LeerVentana(self.path, (0, self.forma[0]), (0, self.forma[1]), overview=4)
+        np.testing.assert_array_equal(overview, np.rint(PromedioBloques(conteo, 4)).astype(np.uint8))
+
+    def test_otra_region(self):
+        almacen = AlmacenAcumulado(self.path, tamano_tile=64)
+        almacen.escribir({'conteo': self.conteo()}, self.tiempo, self.georreferencia)
+        almacen.cerrar()
+        georreferencia = dict(self.georreferencia, x=self.georreferencia['x'][:-10])
+        almacen = AlmacenAcumulado(self.path, tamano_tile=64)
+        conteo = self.conteo()[:, :-10]
+        self.assertGreater(almacen.escribir({'conteo': conteo}, self.tiempo, georreferencia), 0)
+        almacen.cerrar()
+        with Dataset(self.path) as nc:
+            self.assertEqual(nc.variables['conteo'].shape, conteo.shape)
+
+    def test_tiles_modificados(self):
+        previo = np.zeros((10, 10), dtype=np.uint8)
+        nuevo = previo.copy()
+        nuevo[9, 0] = 1
+        np.testing.assert_array_equal(TilesModificados(nuevo, previo, 4), [[2, 0]])
+        self.assertEqual(len(TilesModificados(nuevo, None, 4)), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from PIL import Image, ImageSequence
+
+# Asegurar que el procesador esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+
+from src.animacion import Animacion
+
+# Colores bien separados, para reconocer cada cuadro después de cuantizar o comprimir
+COLORES = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255), (255, 0, 255), (255, 255, 255)]
+
+
+class TestAnimacion(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.imagenes = []
+        for i, color in enumerate(COLORES):
+            path = os.path.join(self.tmpdir, f'mapa_{i}.png')
+            Image.new('RGB', (40, 30), color).save(path)
+            self.imagenes.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def leer_cuadros(self, path):
+        with Image.open(path) as img:
+            cuadros = [(frame.convert('RGB').getpixel((frame.width // 2, frame.height // 2)), frame.info.get('duration'), frame.size)
+                       for frame in ImageSequence.Iterator(img)]
+            loop = img.info.get('loop')
+        return cuadros, loop
+
+    def assertColor(self, actual, esperado, tolerancia):
+        self.assertTrue(all(abs(a - e) <= tolerancia for a, e in zip(actual, esperado)), f'{actual} != {esperado}')
+
+    def verificar_ventana(self, formato, tolerancia):
+        animacion = Animacion(os.path.join(self.tmpdir, 'conae.gif'), max_frames=4, frame_duration=0.7, formato=formato)
+        self.assertTrue(animacion.output_path.endswith('.' + formato))
+        for cantidad, imagen in enumerate(self.imagenes, start=1):
+            animacion.agregar(imagen)
+            animacion.guardar()
+            cuadros, loop = self.leer_cuadros(animacion.output_path)
+            # Como máximo max_frames cuadros: los más recientes, en orden cronológico
+            esperados = COLORES[max(0, cantidad - 4):cantidad]
+            self.assertEqual(len(animacion), len(esperados))
+            self.assertEqual(len(cuadros), len(esperados))
+            for (color, duracion, tamano), esperado in zip(cuadros, esperados):
+                self.assertColor(color, esperado, tolerancia)
+                self.assertEqual(duracion, 700)
+                self.assertEqual(tamano, (40, 30))
+            self.assertEqual(loop, 0)
+
+    def test_ventana_gif(self):
+        """
+        El GIF conserva los últimos max_frames cuadros en orden, con su duración y en bucle.
+        """
+        self.verificar_ventana('gif', tolerancia=8)
+
+    def test_ventana_webp(self):
+        """
+        El WebP animado conserva los últimos max_frames cuadros en orden, con su duración y en bucle.
+        """
+        self.verificar_ventana('webp', tolerancia=24)
+
+    def test_escala_y_carga(self):
+        """
+        cargar toma solo los últimos cuadros y la escala reduce el tamaño de la animación.
+        """
+        animacion = Animacion(os.path.join(self.tmpdir, 'conae.gif'), max_frames=3, scale=0.5)
+        animacion.cargar(self.imagenes + [os.path.join(self.tmpdir, 'inexistente.png')])
+        self.assertEqual(len(animacion), 2)
+        animacion.guardar()
+        cuadros, _ = self.leer_cuadros(animacion.output_path)
+        self.assertEqual([tamano for _, _, tamano in cuadros], [(20, 15)] * 2)
+        self.assertColor(cuadros[-1][0], COLORES[-1], 8)
+
+    def test_formato_desconocido(self):
+        with self.assertRaises(ValueError):
+            Animacion(os.path.join(self.tmpdir, 'conae.gif'), formato='avi')
+
+
+if __name__ == '__main__':
+    unittest.main()
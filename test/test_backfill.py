@@ -0,0 +1,99 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+# Asegurar que el procesador y los benchmarks estén en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from sintetico import CrearArchivoABI, NombreArchivoABI
+import backfill
+from backfill import filtrar_leidos, leer_mascara_o_nada, seleccionar_archivos
+from src import helpers
+from src.helpers import GetRegionExtent
+
+INICIO = datetime(2024, 11, 26, 12, 0, 20, tzinfo=timezone.utc)
+
+
+def tiempo(i):
+    return INICIO + timedelta(minutes=10 * i)
+
+
+def leido(filas=4, ancho=16):
+    return np.zeros((filas, (ancho + 7) // 8), dtype=np.uint8), ancho, (0, 1, 0, 1), {}
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Diez escaneos de C13, uno cada 10 minutos, y un archivo sin fecha en el nombre
+        self.archivos = []
+        for i in range(10):
+            path = os.path.join(self.tmpdir, NombreArchivoABI(13, tiempo(i)))
+            open(path, 'wb').close()
+            self.archivos.append(path)
+        open(os.path.join(self.tmpdir, 'otro.nc'), 'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_seleccion_con_ventana_completa(self):
+        """
+        Se leen las ventana - 1 imágenes anteriores a la primera pedida, solo para completar su ventana.
+        """
+        archivos, previas = seleccionar_archivos(self.tmpdir, tiempo(5), None, 3)
+        self.assertEqual(archivos, self.archivos[3:])
+        self.assertEqual(previas, 2)
+
+    def test_seleccion_al_inicio_del_periodo(self):
+        """
+        Si no hay suficientes imágenes anteriores, la ventana se completa con las que hay.
+        """
+        archivos, previas = seleccionar_archivos(self.tmpdir, tiempo(1), tiempo(4), 144)
+        self.assertEqual(archivos, self.archivos[:5])
+        self.assertEqual(previas, 1)
+        archivos, previas = seleccionar_archivos(self.tmpdir, None, None, 144)
+        self.assertEqual((archivos, previas), (self.archivos, 0))
+
+    def test_seleccion_entre_escaneos(self):
+        """
+        Una fecha entre dos escaneos empieza en el siguiente; una posterior a todos no deja imágenes para generar.
+        """
+        archivos, previas = seleccionar_archivos(self.tmpdir, tiempo(5) - timedelta(minutes=3), tiempo(6), 2)
+        self.assertEqual(archivos, self.archivos[4:7])
+        self.assertEqual(previas, 1)
+        archivos, previas = seleccionar_archivos(self.tmpdir, tiempo(20), None, 3)
+        self.assertEqual(len(archivos), previas)
+
+    def test_filtrado_de_archivos(self):
+        """
+        Los archivos ilegibles o con otro recorte se omiten y las previas se ajustan.
+        """
+        leidos = [leido(), None, leido(), leido(filas=5), leido(), leido()]
+        archivos, validos, previas = filtrar_leidos(self.archivos[:6], leidos, previas=3)
+        self.assertEqual(archivos, [self.archivos[i] for i in (0, 2, 4, 5)])
+        self.assertEqual(len(validos), 4)
+        self.assertEqual(previas, 2)
+        archivos, validos, previas = filtrar_leidos(self.archivos[:2], [None, None], previas=1)
+        self.assertEqual((archivos, validos, previas), ([], [], 0))
+
+    def test_archivo_ilegible(self):
+        """
+        Un archivo dañado no interrumpe la lectura: se informa y devuelve None.
+        """
+        CrearArchivoABI(self.archivos[1], 13, tiempo(1), tamano=678)
+        extent = GetRegionExtent(backfill.confData, 'ARG')
+        with mock.patch.object(helpers, '_GetGridsDir', return_value=self.tmpdir + '/'), \
+                mock.patch.object(helpers, '_crop_cache', None):
+            self.assertIsNone(leer_mascara_o_nada(self.archivos[0], extent, -53))
+            packed, ancho, _, _ = leer_mascara_o_nada(self.archivos[1], extent, -53)
+        self.assertEqual(packed.shape[1], (ancho + 7) // 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
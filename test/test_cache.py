@@ -0,0 +1,176 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime
+import shapefile
+from netCDF4 import Dataset
+
+# Asegurar que el procesador y los benchmarks estén en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from sintetico import CrearArchivoABI
+from src import helpers
+
+REGION = (-95.0, -40.5, -60.5, -11.5)
+
+
+class TestCacheRecorte(unittest.TestCase):
+    """
+    Cache de índices de recorte (_LoadCropCache/_SaveCropCache) usada por GetCroppedImage.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmpdir, helpers.CROP_CACHE_FILE)
+        self.image_file = os.path.join(self.tmpdir, 'disco.nc')
+        CrearArchivoABI(self.image_file, 13, datetime(2024, 11, 26, 12, 0, 20), tamano=678)
+        for patcher in (mock.patch.object(helpers, '_GetGridsDir', return_value=self.tmpdir + '/'),
+                        mock.patch.object(helpers, '_crop_cache', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        proyeccion = mock.patch.object(helpers, '_GetCropIndexesFromProjection', wraps=helpers._GetCropIndexesFromProjection)
+        self.proyeccion = proyeccion.start()
+        self.addCleanup(proyeccion.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def recortar(self, region=REGION, reiniciar=False):
+        if reiniciar:
+            # Un proceso nuevo: la cache en memoria está vacía y se lee la del disco
+            helpers._crop_cache = None
+        with Dataset(self.image_file) as nc:
+            return helpers.GetCroppedImage(nc, *region)
+
+    def test_calculo_y_acierto(self):
+        """
+        Los índices se calculan una sola vez y se reutilizan desde memoria y desde el disco.
+        """
+        resultado = self.recortar()
+        self.assertEqual(self.proyeccion.call_count, 1)
+        self.assertTrue(os.path.exists(self.cache_file))
+        self.assertEqual(self.recortar(), resultado)
+        self.assertEqual(self.recortar(reiniciar=True), resultado)
+        self.assertEqual(self.proyeccion.call_count, 1)
+
+    def test_otra_region(self):
+        """
+        Otra región es otra clave de la cache; las dos quedan guardadas.
+        """
+        self.recortar()
+        otra = self.recortar((-80.0, -50.0, -50.0, -25.0))
+        self.assertEqual(self.proyeccion.call_count, 2)
+        with open(self.cache_file) as f:
+            self.assertEqual(len(json.load(f)), 2)
+        self.assertEqual(self.recortar((-80.0, -50.0, -50.0, -25.0), reiniciar=True), otra)
+        self.assertEqual(self.proyeccion.call_count, 2)
+
+    def test_entrada_invalida(self):
+        """
+        Una entrada sin índices válidos (por ejemplo, de un formato anterior) se vuelve a calcular.
+        """
+        resultado = self.recortar()
+        with open(self.cache_file) as f:
+            cache = json.load(f)
+        clave = next(iter(cache))
+        with open(self.cache_file, 'w') as f:
+            json.dump({clave: {'img_extent': [0, 1, 0, 1]}}, f)
+        self.assertEqual(self.recortar(reiniciar=True), resultado)
+        self.assertEqual(self.proyeccion.call_count, 2)
+
+    def test_archivo_corrupto(self):
+        """
+        Un archivo de cache ilegible se descarta y se reescribe con los índices recalculados.
+        """
+        for contenido in ('{"G16_-75.0', '[1, 2, 3]'):
+            with open(self.cache_file, 'w') as f:
+                f.write(contenido)
+            resultado = self.recortar(reiniciar=True)
+            with open(self.cache_file) as f:
+                self.assertEqual(len(json.load(f)), 1)
+            self.assertEqual(self.recortar(reiniciar=True), resultado)
+        self.assertEqual(self.proyeccion.call_count, 2)
+
+
+class TestCacheGeometrias(unittest.TestCase):
+    """
+    Cache WKB de geometrías recortadas y simplificadas (GetOverlayGeometries).
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.tmpdir, 'cache') + '/'
+        self.shp = os.path.join(self.tmpdir, 'limites.shp')
+        with shapefile.Writer(self.shp, shapeType=shapefile.POLYLINE) as writer:
+            writer.field('nombre', 'C')
+            writer.line([[[-70.0, -40.0], [-60.0, -30.0], [-50.0, -35.0]]])
+            writer.record('dentro')
+            writer.line([[[10.0, 10.0], [20.0, 20.0]]])
+            writer.record('fuera')
+        for patcher in (mock.patch.object(helpers, '_GetOverlayCacheDir', return_value=self.cachedir),
+                        mock.patch.dict(helpers._overlay_cache, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        lector = mock.patch.object(helpers.shpreader, 'Reader', wraps=helpers.shpreader.Reader)
+        self.lector = lector.start()
+        self.addCleanup(lector.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def geometrias(self, reiniciar=False):
+        if reiniciar:
+            helpers._overlay_cache.clear()
+        return helpers.GetOverlayGeometries(self.shp, [-80.0, -45.0, -50.0, -20.0], 0.01)
+
+    def archivo_cache(self):
+        archivos = os.listdir(self.cachedir)
+        self.assertEqual(len(archivos), 1)
+        return os.path.join(self.cachedir, archivos[0])
+
+    def test_recorte_y_aciertos(self):
+        """
+        Solo quedan las geometrías de la región, y se leen del shapefile una única vez.
+        """
+        geoms = self.geometrias()
+        self.assertEqual(len(geoms), 1)
+        self.assertEqual(geoms[0].bounds, (-70.0, -40.0, -50.0, -30.0))
+        self.assertIs(self.geometrias(), geoms)
+        desde_disco = self.geometrias(reiniciar=True)
+        self.assertTrue(desde_disco[0].equals(geoms[0]))
+        self.assertEqual(self.lector.call_count, 1)
+
+    def test_shapefile_modificado(self):
+        """
+        Si el shapefile es más nuevo que la cache, las geometrías se vuelven a calcular.
+        """
+        self.geometrias()
+        pasado = os.path.getmtime(self.shp) - 10
+        os.utime(self.archivo_cache(), (pasado, pasado))
+        self.geometrias(reiniciar=True)
+        self.assertEqual(self.lector.call_count, 2)
+        self.geometrias(reiniciar=True)
+        self.assertEqual(self.lector.call_count, 2)
+
+    def test_archivo_corrupto(self):
+        """
+        Un archivo de cache dañado se regenera en lugar de interrumpir el render.
+        """
+        geoms = self.geometrias()
+        cache_path = self.archivo_cache()
+        with open(cache_path, 'wb') as f:
+            f.write(b'no es un npz')
+        regeneradas = self.geometrias(reiniciar=True)
+        self.assertTrue(regeneradas[0].equals(geoms[0]))
+        self.assertEqual(self.lector.call_count, 2)
+        self.assertTrue(self.geometrias(reiniciar=True)[0].equals(geoms[0]))
+        self.assertEqual(self.lector.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
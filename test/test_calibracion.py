@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que el procesador esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+
+from src.helpers import GetCalibratedImage, GetRadianceThreshold, GetThresholdMask, GetThresholdMasks
+
+
+class TestCalibracion(unittest.TestCase):
+    def setUp(self):
+        """
+        Crea en memoria un netCDF de la banda 13 con radiancias alrededor del umbral.
+        """
+        self.nc = Dataset('test_calibracion.nc', 'w', diskless=True)
+        self.nc.createDimension('y', 300)
+        self.nc.createDimension('x', 400)
+        band = self.nc.createVariable('band_id', 'i1')
+        band[:] = 13
+        for name, value in {'planck_fk1': 10803.3, 'planck_fk2': 1392.74, 'planck_bc1': 0.0755, 'planck_bc2': 0.99975}.items():
+            var = self.nc.createVariable(name, 'f4')
+            var[:] = value
+        rad = self.nc.createVariable('Rad', 'i2', ('y', 'x'), fill_value=np.int16(-1))
+        rad.scale_factor = np.float32(0.01)
+        rad.add_offset = np.float32(-0.5)
+        self.corte = GetRadianceThreshold(self.nc, -53)
+        cuentas = np.rint((self.corte + 0.5) / 0.01).astype(np.int16)
+        rng = np.random.default_rng(2)
+        crudos = rng.integers(cuentas - 200, cuentas + 200, (300, 400)).astype(np.int16)
+        crudos[:5] = -1  # Sin dato
+        crudos[5:10] = 10  # Radiancia negativa
+        rad.set_auto_maskandscale(False)
+        rad[:] = crudos
+        rad.set_auto_maskandscale(True)
+
+    def tearDown(self):
+        self.nc.close()
+
+    def test_corte_de_radiancia(self):
+        """
+        La radiancia de corte calibra al umbral de temperatura de brillo.
+        """
+        image_cal, _ = GetCalibratedImage(self.nc, np.ma.masked_array([self.corte]))
+        self.assertAlmostEqual(float(image_cal[0]), -53, places=6)
+
+    def test_mascara_identica(self):
+        """
+        La máscara en espacio de radiancia es idéntica a la del camino calibrado.
+        """
+        imagen = self.nc.variables['Rad'][:]
+        image_cal, _ = GetCalibratedImage(self.nc, imagen)
+        esperado = np.ma.filled(image_cal < -53, False)
+        np.testing.assert_array_equal(GetThresholdMask(self.nc, imagen, -53), esperado)
+        self.assertTrue(esperado.any() and not esperado.all())
+
+    def test_varios_umbrales(self):
+        """
+        Cada plano de varios umbrales es idéntico a la máscara de ese umbral solo y al camino
+        calibrado, incluso en los píxeles del borde; un umbral repetido repite su plano.
+        """
+        imagen = self.nc.variables['Rad'][:]
+        image_cal, _ = GetCalibratedImage(self.nc, imagen)
+        umbrales = [-53, -53.01, -70, -52.99, -53]
+        mascaras = GetThresholdMasks(self.nc, imagen, umbrales)
+        self.assertEqual(mascaras.shape, (5, 300, 400))
+        for plano, umbral in zip(mascaras, umbrales):
+            np.testing.assert_array_equal(plano, GetThresholdMask(self.nc, imagen, umbral))
+            np.testing.assert_array_equal(plano, np.ma.filled(image_cal < umbral, False))
+        # Los píxeles sin dato o con radiancia no positiva no cumplen ningún umbral
+        self.assertFalse(mascaras[:, :10].any())
+
+    def test_calibracion_en_el_lugar(self):
+        """
+        La calibración en float32 sobre el mismo buffer coincide con la calibración original.
+        """
+        image_cal, _ = GetCalibratedImage(self.nc, self.nc.variables['Rad'][:])
+        rapida, _ = GetCalibratedImage(self.nc, self.nc.variables['Rad'][:], inplace=True)
+        self.assertEqual(rapida.dtype, np.float32)
+        np.testing.assert_array_equal(np.ma.getmaskarray(rapida), np.ma.getmaskarray(image_cal))
+        np.testing.assert_allclose(rapida.compressed(), image_cal.compressed(), atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,262 @@
+import unittest
+import sys
+import os
+import shutil
+import time
+import asyncio
+import tempfile
+from unittest import mock
+import hashlib
+import datetime
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que la descarga esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+
+import catchup
+from catchup import CatchUp
+from ledger import DownloadLedger
+
+
+def netcdf_bytes():
+    """
+    Genera en memoria un netCDF mínimo con la variable Rad.
+    """
+    nc = Dataset('sintetico.nc', 'w', memory=1024)
+    nc.createDimension('y', 4)
+    nc.createDimension('x', 4)
+    rad = nc.createVariable('Rad', 'i2', ('y', 'x'))
+    rad.scale_factor = 0.0406
+    rad.add_offset = -1.6
+    rad[:] = np.arange(16).reshape(4, 4)
+    return bytes(nc.close())
+
+
+class FakeStream:
+    def __init__(self, fs, content):
+        self.fs = fs
+        self.content = content
+        self.position = 0
+
+    async def read(self, length):
+        await asyncio.sleep(0.001)
+        data = self.content[self.position:self.position + length]
+        self.position += len(data)
+        return data
+
+    async def close(self):
+        self.fs.active -= 1
+
+
+class FakeAsyncFS:
+    """
+    Repositorio remoto simulado con la interfaz asíncrona de s3fs.
+    """
+
+    def __init__(self, files, content, corrupt=()):
+        self.files = files
+        self.content = content
+        self.corrupt = corrupt
+        self.active = 0
+        self.max_active = 0
+
+    async def _ls(self, path, detail=False, refresh=False):
+        prefix = path[len('s3://'):]
+        listing = [{'name': f, 'size': len(self.content), 'ETag': f'"{hashlib.md5(self.content).hexdigest()}"'}
+                   for f in self.files if f.startswith(prefix)]
+        if not listing:
+            raise FileNotFoundError(path)
+        return listing
+
+    async def open_async(self, path, mode='rb'):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        content = self.content
+        if path in self.corrupt:
+            # Se invierte un byte: el tamaño coincide pero el MD5 no
+            content = content[:-1] + bytes([content[-1] ^ 0xFF])
+        return FakeStream(self, content)
+
+
+def remote_files(hour_datetime, minutes=range(0, 60, 10), band=13):
+    year, day, hour = hour_datetime.strftime('%Y'), hour_datetime.strftime('%j'), hour_datetime.strftime('%H')
+    return [f"noaa-goes16/ABI-L1b-RadF/{year}/{day}/{hour}/"
+            f"OR_ABI-L1b-RadF-M6C{band:02d}_G16_s{year}{day}{hour}{m:02d}204_e0_c0.nc" for m in minutes]
+
+
+class TestCatchUp(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.content = netcdf_bytes()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.temp_path = os.path.join(self.tmpdir, 'temp')
+        self.inbox = os.path.join(self.tmpdir, 'inbox')
+        os.makedirs(self.temp_path)
+        os.makedirs(self.inbox)
+        self.ledger = DownloadLedger(os.path.join(self.tmpdir, 'download_db.sqlite'))
+        self.start = datetime.datetime(2024, 11, 26, 0)
+        self.now = datetime.datetime(2024, 11, 26, 10, 30)
+
+    def tearDown(self):
+        self.ledger.close()
+        shutil.rmtree(self.tmpdir)
+
+    def run_catchup(self, files, corrupt=(), bands=(13,), **kwargs):
+        fs = FakeAsyncFS(files, self.content, corrupt)
+        engine = CatchUp(self.ledger, 'ABI-L1b-RadF', list(bands), self.temp_path, self.inbox, fs=fs, block_size=4096, **kwargs)
+        return fs, asyncio.run(engine.run(self.start, now=self.now))
+
+    def test_recupera_horas_publicadas(self):
+        """
+        Se recuperan todas las horas terminadas y el bucle en vivo sigue en la hora en curso.
+        """
+        files = [f for h in range(11) for f in remote_files(self.start + datetime.timedelta(hours=h))]
+        fs, next_hour = self.run_catchup(files, max_concurrency=4, lookahead_hours=3)
+        # Las 10:00 todavía no terminaron de publicarse
+        self.assertEqual(next_hour, datetime.datetime(2024, 11, 26, 10))
+        self.assertEqual(len(os.listdir(self.inbox)), 60)
+        self.assertEqual(self.ledger.lastCompleteHour(), datetime.datetime(2024, 11, 26, 9))
+        self.assertLessEqual(fs.max_active, 4)
+        self.assertGreater(fs.max_active, 1)
+
+    def test_se_detiene_en_hora_incompleta(self):
+        """
+        Las horas se confirman en orden: nada posterior a una hora incompleta llega al inbox.
+        """
+        files = []
+        for h in range(10):
+            hour_datetime = self.start + datetime.timedelta(hours=h)
+            files += remote_files(hour_datetime, range(0, 40, 10) if h == 4 else range(0, 60, 10))
+        _, next_hour = self.run_catchup(files)
+        self.assertEqual(next_hour, datetime.datetime(2024, 11, 26, 4))
+        self.assertEqual(self.ledger.lastCompleteHour(), datetime.datetime(2024, 11, 26, 3))
+        self.assertEqual(len(os.listdir(self.inbox)), 4 * 6 + 4)
+        # Las horas posteriores, ya descargadas, no quedan en la carpeta temporal
+        self.assertEqual(os.listdir(self.temp_path), [])
+
+    def test_descarta_archivo_corrupto(self):
+        """
+        Un archivo que no coincide con su ETag no llega al inbox y la hora queda incompleta.
+        """
+        files = remote_files(self.start)
+        self.now = datetime.datetime(2024, 11, 26, 1, 30)
+        _, next_hour = self.run_catchup(files, corrupt={files[2]})
+        self.assertEqual(next_hour, self.start)
+        self.assertEqual(len(os.listdir(self.inbox)), 5)
+        self.assertNotIn(files[2].split('/')[-1], os.listdir(self.inbox))
+        self.assertEqual(os.listdir(self.temp_path), [])
+
+    def test_omite_archivos_registrados(self):
+        """
+        Los archivos ya registrados en el ledger no se vuelven a descargar.
+        """
+        files = remote_files(self.start)
+        for f in files[:3]:
+            self.ledger.add(f, '2024', '331', '00')
+        self.now = datetime.datetime(2024, 11, 26, 1, 30)
+        self.run_catchup(files)
+        self.assertEqual(len(os.listdir(self.inbox)), 3)
+        self.assertEqual(self.ledger.countHour('2024', '331', '00'), 6)
+
+    def test_cancelacion_sin_archivos_temporales(self):
+        """
+        Si la recuperación se cancela, no quedan archivos parciales ni completos sin confirmar en la carpeta temporal.
+        """
+        files = [f for h in range(10) for f in remote_files(self.start + datetime.timedelta(hours=h))]
+        fs = FakeAsyncFS(files, self.content)
+        engine = CatchUp(self.ledger, 'ABI-L1b-RadF', [13], self.temp_path, self.inbox, fs=fs, block_size=64,
+                         max_concurrency=4, lookahead_hours=4)
+
+        async def cancelar():
+            task = asyncio.ensure_future(engine.run(self.start, now=self.now))
+            while not os.listdir(self.temp_path):
+                await asyncio.sleep(0.001)
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancelar())
+        self.assertEqual(os.listdir(self.temp_path), [])
+        self.assertEqual(fs.active, 0)
+
+    def test_cancelacion_con_descarga_en_hilo(self):
+        """
+        Al cancelar una descarga con recorte, que corre en un hilo, se espera a que el hilo
+        termine de escribir antes de borrar el archivo: no quedan archivos huérfanos.
+        """
+        content = self.content
+        iniciadas = []
+
+        def descarga_lenta(fs, f, temp_file_path, extent):
+            # El archivo se crea recién después de la cancelación, como una lectura remota lenta
+            iniciadas.append(f)
+            time.sleep(0.05)
+            with open(temp_file_path, 'wb') as fp:
+                fp.write(content)
+
+        files = [f for h in range(3) for f in remote_files(self.start + datetime.timedelta(hours=h))]
+        engine = CatchUp(self.ledger, 'ABI-L1b-RadF', [13], self.temp_path, self.inbox, fs=FakeAsyncFS(files, content),
+                         max_concurrency=4, region_crop={'habilitado': True, 'extension': [-90, -40, -55, -15]})
+
+        async def cancelar():
+            task = asyncio.ensure_future(engine.run(self.start, now=self.now))
+            while not iniciadas:
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with mock.patch.object(catchup.recorte, 'downloadRegion', descarga_lenta):
+            asyncio.run(cancelar())
+        self.assertEqual(os.listdir(self.temp_path), [])
+
+    def test_horas_pendientes_acotadas(self):
+        """
+        Como máximo max_pending_hours horas quedan descargadas o en descarga sin confirmar.
+        """
+        files = [f for h in range(10) for f in remote_files(self.start + datetime.timedelta(hours=h))]
+        fs = FakeAsyncFS(files, self.content)
+        pending = []
+        open_async = fs.open_async
+
+        async def abrir(path, mode='rb'):
+            # Horas con archivos en la carpeta temporal o que se empiezan a descargar
+            hours = {name.split('_')[3][:10] for name in os.listdir(self.temp_path)}
+            pending.append(len(hours | {path.split('/')[-1].split('_')[3][:10]}))
+            return await open_async(path, mode)
+
+        fs.open_async = abrir
+        engine = CatchUp(self.ledger, 'ABI-L1b-RadF', [13], self.temp_path, self.inbox, fs=fs, block_size=4096,
+                         max_concurrency=16, max_pending_hours=2)
+        next_hour = asyncio.run(engine.run(self.start, now=self.now))
+        self.assertEqual(next_hour, datetime.datetime(2024, 11, 26, 10))
+        self.assertEqual(len(os.listdir(self.inbox)), 60)
+        self.assertEqual(max(pending), 2)
+
+    def test_completa_escaneos_con_bandas_registradas(self):
+        """
+        Al agregar una banda, los escaneos cuya otra banda ya está en el ledger se completan y entregan.
+        """
+        self.ledger.close()
+        self.ledger = DownloadLedger(os.path.join(self.tmpdir, 'download_db.sqlite'), files_per_hour=12)
+        registered = remote_files(self.start)
+        for f in registered:
+            self.ledger.add(f, '2024', '331', '00', band=13)
+            open(os.path.join(self.inbox, f.split('/')[-1]), 'wb').close()
+        delivered = []
+        self.now = datetime.datetime(2024, 11, 26, 1, 30)
+        _, next_hour = self.run_catchup(registered + remote_files(self.start, band=8), bands=(8, 13),
+                                        on_scan=delivered.append)
+        self.assertEqual(next_hour, self.start + datetime.timedelta(hours=1))
+        self.assertEqual(self.ledger.countHour('2024', '331', '00'), 12)
+        self.assertEqual(len(delivered), 6)
+        self.assertTrue(all(sorted(scan) == [8, 13] and all(os.path.exists(p) for p in scan.values()) for scan in delivered))
+        self.assertEqual(os.listdir(self.temp_path), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import datetime
+
+# Asegurar que la descarga esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+
+from latencia import LatencyStats, quantile, toUtc
+
+
+class TestLatencyStats(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.stats_file = os.path.join(self.tmpdir, 'latency_stats.json')
+        self.scan_start = datetime.datetime(2024, 11, 26, 22, 0, 20)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def observe_publish(self, stats, band, latencies):
+        for latency in latencies:
+            stats.observe(LatencyStats.PUBLISH, 'ABI-L1b-RadF', band, self.scan_start,
+                          self.scan_start + datetime.timedelta(seconds=latency))
+
+    def test_cuantil(self):
+        self.assertIsNone(quantile([], 0.5))
+        self.assertEqual(quantile([3, 1, 2], 0.5), 2)
+        self.assertAlmostEqual(quantile([0, 10], 0.9), 9)
+
+    def test_demora_de_consulta(self):
+        """
+        Sin observaciones se usa la demora por defecto; con observaciones, el cuantil de la banda más lenta.
+        """
+        stats = LatencyStats(self.stats_file, default_delay=690)
+        self.assertEqual(stats.pollDelay('ABI-L1b-RadF', [13]), 690)
+        self.observe_publish(stats, 13, [600, 620, 640])
+        self.observe_publish(stats, 8, [700, 720, 740])
+        self.assertEqual(stats.pollDelay('ABI-L1b-RadF', [13]), 620)
+        self.assertEqual(stats.pollDelay('ABI-L1b-RadF', [8, 13]), 720)
+
+    def test_proxima_consulta(self):
+        """
+        Después de un escaneo se espera hasta el inicio del siguiente más la demora de consulta.
+        """
+        stats = LatencyStats(self.stats_file, default_delay=690)
+        last_scan = datetime.datetime(2024, 11, 26, 22, 10, 20)
+        now = datetime.datetime(2024, 11, 26, 22, 21, 50)
+        # 22:20 + 690 s = 22:31:30
+        self.assertEqual(stats.nextPollDelay('ABI-L1b-RadF', [13], last_scan, now), 580)
+        self.observe_publish(stats, 13, [600, 620, 640])
+        self.assertEqual(stats.nextPollDelay('ABI-L1b-RadF', [13], last_scan, now), 510)
+        # Si el escaneo siguiente ya debería estar publicado, se consulta enseguida
+        self.assertEqual(stats.nextPollDelay('ABI-L1b-RadF', [13], last_scan, now + datetime.timedelta(hours=1)), 0)
+
+    def test_persistencia_y_ventana(self):
+        """
+        Las observaciones se conservan entre ejecuciones, solo las últimas de la ventana.
+        """
+        stats = LatencyStats(self.stats_file, window=3)
+        self.observe_publish(stats, 13, [100, 600, 610, 620])
+        stats.flush()
+        reloaded = LatencyStats(self.stats_file, window=3)
+        self.assertEqual(reloaded.quantile(LatencyStats.PUBLISH, 'ABI-L1b-RadF', 13, 0.0), 600)
+
+    def test_escritura_por_intervalo(self):
+        """
+        El archivo se reescribe como máximo una vez por intervalo; flush guarda lo pendiente.
+        """
+        now = [0.0]
+        stats = LatencyStats(self.stats_file, save_interval=60, clock=lambda: now[0])
+        self.observe_publish(stats, 13, [600, 610])
+        self.assertFalse(os.path.exists(self.stats_file))
+        now[0] = 60.0
+        self.observe_publish(stats, 13, [620])
+        self.assertEqual(LatencyStats(self.stats_file).quantile(LatencyStats.PUBLISH, 'ABI-L1b-RadF', 13, 1.0), 620)
+        now[0] = 90.0
+        self.observe_publish(stats, 13, [630])
+        self.assertEqual(LatencyStats(self.stats_file).quantile(LatencyStats.PUBLISH, 'ABI-L1b-RadF', 13, 1.0), 620)
+        stats.flush()
+        self.assertEqual(LatencyStats(self.stats_file).quantile(LatencyStats.PUBLISH, 'ABI-L1b-RadF', 13, 1.0), 630)
+        # Sin observaciones pendientes flush no reescribe el archivo, y no quedan temporales
+        mtime = os.stat(self.stats_file).st_mtime_ns
+        stats.flush()
+        self.assertEqual(os.stat(self.stats_file).st_mtime_ns, mtime)
+        self.assertEqual(os.listdir(self.tmpdir), ['latency_stats.json'])
+
+    def test_reintentos_acotados(self):
+        """
+        La espera entre reintentos crece con los intentos, con jitter, sin superar la espera máxima.
+        """
+        stats = LatencyStats(min_wait=10, max_wait=600)
+        self.observe_publish(stats, 13, [600, 610, 620, 700])
+        first = [stats.retryDelay('ABI-L1b-RadF', [13], 0) for _ in range(50)]
+        late = [stats.retryDelay('ABI-L1b-RadF', [13], 20) for _ in range(50)]
+        self.assertTrue(all(10 <= w <= 600 for w in first + late))
+        self.assertGreater(min(late), max(first))
+        self.assertGreater(len(set(first)), 1)
+
+    def test_utc(self):
+        aware = datetime.datetime(2024, 11, 26, 19, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=-3)))
+        self.assertEqual(toUtc(aware), datetime.datetime(2024, 11, 26, 22, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Asegurar que la descarga esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+
+from ledger import DownloadLedger, getBand
+from helpers import writeJson
+
+
+def remote_file(year, day, hour, minute, band=13):
+    return (f"noaa-goes16/ABI-L1b-RadF/{year}/{day}/{hour}/"
+            f"OR_ABI-L1b-RadF-M6C{band:02d}_G16_s{year}{day}{hour}{minute:02d}204_e0_c0.nc")
+
+
+class TestDownloadLedger(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.ledger = DownloadLedger(os.path.join(self.tmpdir, 'download_db.sqlite'), files_per_hour=6)
+
+    def tearDown(self):
+        self.ledger.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_ultima_hora_completa(self):
+        """
+        Solo las horas con sus 6 archivos cuentan como completas.
+        """
+        self.assertIsNone(self.ledger.lastCompleteHour())
+        for minute in range(0, 60, 10):
+            self.ledger.add(remote_file('2024', '331', '22', minute), '2024', '331', '22')
+        for minute in range(0, 30, 10):
+            self.ledger.add(remote_file('2024', '331', '23', minute), '2024', '331', '23')
+        self.assertEqual(self.ledger.lastCompleteHour(), datetime.datetime(2024, 11, 26, 22))
+        self.assertEqual(self.ledger.countHour('2024', '331', '23'), 3)
+
+    def test_insercion_idempotente(self):
+        """
+        Registrar dos veces el mismo archivo no altera el conteo de la hora.
+        """
+        f = remote_file('2024', '331', '22', 0)
+        self.assertTrue(self.ledger.add(f, '2024', '331', '22', band=getBand(f)))
+        self.assertFalse(self.ledger.add(f, '2024', '331', '22'))
+        self.assertTrue(self.ledger.contains(f))
+        self.assertEqual(self.ledger.countHour('2024', '331', '22'), 1)
+        self.assertEqual(getBand(f), 13)
+
+    def test_concurrencia(self):
+        """
+        Varios hilos registrando archivos a la vez no pierden inserciones.
+        """
+        files = [(remote_file('2024', f'{d:03d}', f'{h:02d}', m), f'{d:03d}', f'{h:02d}')
+                 for d in range(1, 4) for h in range(24) for m in range(0, 60, 10)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda args: self.ledger.add(args[0], '2024', args[1], args[2]), files))
+        self.assertEqual(self.ledger.countHour('2024', '002', '12'), 6)
+        self.assertEqual(self.ledger.lastCompleteHour(), datetime.datetime(2024, 1, 3, 23))
+
+    def test_migracion_json(self):
+        """
+        La base de datos JSON anterior se importa con sus horas completas.
+        """
+        json_file = os.path.join(self.tmpdir, 'download_db.json')
+        writeJson(json_file, {'2024': {'331': {
+            '22': [remote_file('2024', '331', '22', m) for m in range(0, 60, 10)],
+            '23': [remote_file('2024', '331', '23', 0)]}}})
+        self.assertEqual(self.ledger.importJson(json_file), 7)
+        self.assertEqual(self.ledger.lastCompleteHour(), datetime.datetime(2024, 11, 26, 22))
+        self.assertEqual(len(self.ledger.hourFiles('2024', '331', '23')), 1)
+
+    def test_archivos_por_hora_modificado(self):
+        """
+        Al cambiar la cantidad de archivos por hora, las horas completas se vuelven a evaluar.
+        """
+        for minute in range(0, 60, 10):
+            self.ledger.add(remote_file('2024', '331', '22', minute), '2024', '331', '22', band=13)
+        self.ledger.close()
+        self.ledger = DownloadLedger(os.path.join(self.tmpdir, 'download_db.sqlite'), files_per_hour=12)
+        self.assertIsNone(self.ledger.lastCompleteHour())
+        for minute in range(0, 60, 10):
+            self.ledger.add(remote_file('2024', '331', '22', minute, band=8), '2024', '331', '22', band=8)
+        self.assertEqual(self.ledger.lastCompleteHour(), datetime.datetime(2024, 11, 26, 22))
+
+    def test_archivos_de_un_escaneo(self):
+        """
+        Se obtienen las bandas registradas de un escaneo, sin mezclar escaneos de la misma hora.
+        """
+        for band in (8, 13):
+            self.ledger.add(remote_file('2024', '331', '22', 10, band), '2024', '331', '22', band=band)
+        self.ledger.add(remote_file('2024', '331', '22', 20), '2024', '331', '22', band=13)
+        scan = self.ledger.scanFiles(datetime.datetime(2024, 11, 26, 22, 10, 20))
+        self.assertEqual(scan, {8: remote_file('2024', '331', '22', 10, 8), 13: remote_file('2024', '331', '22', 10)})
+        self.assertEqual(self.ledger.scanFiles(datetime.datetime(2024, 11, 26, 22, 30, 20)), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+import urllib.request
+
+# Asegurar que la raíz del repositorio esté en el PYTHONPATH para importar las métricas
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metricas import Registro, Histograma, ServidorMetricas, ArchivoMetricas, IniciarExportacion
+
+
+class TestMetricas(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.registro = Registro(prefijo='prueba')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_histograma(self):
+        """
+        Los buckets son acumulativos y el cuantil se estima dentro del bucket que lo contiene.
+        """
+        histograma = Histograma('prueba_segundos', 'Prueba.', (1, 2, 4))
+        for valor in (0.5, 1.5, 1.5, 3, 10):
+            histograma.observar(valor, etapa='x')
+        texto = '\n'.join(histograma.exposicion())
+        self.assertIn('# TYPE prueba_segundos histogram', texto)
+        self.assertIn('prueba_segundos_bucket{etapa="x",le="1.0"} 1', texto)
+        self.assertIn('prueba_segundos_bucket{etapa="x",le="2.0"} 3', texto)
+        self.assertIn('prueba_segundos_bucket{etapa="x",le="+Inf"} 5', texto)
+        self.assertIn('prueba_segundos_count{etapa="x"} 5', texto)
+        self.assertTrue(1 <= histograma.cuantil(0.5, etapa='x') <= 2)
+
+    def test_medir_y_descarga(self):
+        with self.registro.medir('recorte'):
+            pass
+        with self.assertRaises(ValueError):
+            with self.registro.medir('calibracion'):
+                raise ValueError('falla')
+        self.registro.registrar_descarga(2**20, 0.5)
+        resumen = self.registro.resumen()
+        self.assertEqual(set(resumen['prueba_etapa_segundos']),
+                         {'etapa=recorte', 'etapa=calibracion', 'etapa=descarga'})
+        self.assertEqual(resumen['prueba_descarga_bytes_total']['_'], 2**20)
+        self.assertEqual(resumen['prueba_descarga_bytes_por_segundo']['_']['cantidad'], 1)
+
+    def test_proceso(self):
+        """
+        La memoria residente y los descriptores abiertos se leen al exportar.
+        """
+        resumen = self.registro.resumen()
+        self.assertGreater(resumen['prueba_proceso_rss_bytes']['_'], 0)
+        self.assertGreater(resumen['prueba_proceso_descriptores_abiertos']['_'], 0)
+
+    def test_servidor(self):
+        self.registro.observar('render', 1.2)
+        servidor = ServidorMetricas(self.registro, puerto=0)
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{servidor.puerto}/metrics', timeout=5) as respuesta:
+                self.assertTrue(respuesta.headers['Content-Type'].startswith('text/plain'))
+                texto = respuesta.read().decode()
+        finally:
+            servidor.cerrar()
+        self.assertIn('prueba_etapa_segundos_count{etapa="render"} 1', texto)
+        self.assertIn('prueba_proceso_rss_bytes', texto)
+
+    def test_archivo(self):
+        path = os.path.join(self.tmpdir, 'logs', 'metricas.jsonl')
+        archivo = ArchivoMetricas(path, self.registro, intervalo=3600)
+        self.registro.registrar_latencia('png', 300)
+        archivo.cerrar()
+        with open(path) as fp:
+            linea = json.loads(fp.readlines()[-1])
+        self.assertIn('prueba_latencia_png_segundos', linea['metricas'])
+
+    def test_deshabilitado(self):
+        self.assertEqual(IniciarExportacion({'habilitado': False, 'puerto': 0}, self.tmpdir, self.registro), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que el procesador esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+
+from src.helpers import GetCalibratedImage
+from src.productos import (AgrupadorEscaneos, BandasRequeridas, CalcularProductos, EscaneoMultibanda, GetBand,
+                           NombreCapaUmbral)
+
+PLANCK = {
+    8: {'planck_fk1': 50805.2, 'planck_fk2': 2401.74, 'planck_bc1': 1.5, 'planck_bc2': 0.9969},
+    13: {'planck_fk1': 10803.3, 'planck_fk2': 1392.74, 'planck_bc1': 0.0755, 'planck_bc2': 0.99975},
+}
+
+
+def nombre(banda, minuto=0):
+    return f"OR_ABI-L1b-RadF-M6C{banda:02d}_G16_s2024331120{minuto}204_e0_c0.nc"
+
+
+def crear_banda(path, banda, radiancias):
+    """
+    Crea un netCDF de una banda emisiva con las radiancias indicadas.
+    """
+    with Dataset(path, 'w') as nc:
+        nc.spatial_resolution = '2km at nadir'
+        nc.createDimension('y', radiancias.shape[0])
+        nc.createDimension('x', radiancias.shape[1])
+        band = nc.createVariable('band_id', 'i1')
+        band[:] = banda
+        for name, value in PLANCK[banda].items():
+            var = nc.createVariable(name, 'f4')
+            var[:] = value
+        rad = nc.createVariable('Rad', 'f4', ('y', 'x'))
+        rad[:] = radiancias
+
+
+class TestEscaneoMultibanda(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = np.random.default_rng(1)
+        self.archivos = {8: os.path.join(self.tmpdir, nombre(8)), 13: os.path.join(self.tmpdir, nombre(13))}
+        crear_banda(self.archivos[8], 8, rng.uniform(0.5, 3.0, (40, 50)))
+        crear_banda(self.archivos[13], 13, rng.uniform(20, 90, (40, 50)))
+        self.productos = {
+            'permanencia': {'tipo': 'permanencia', 'banda': 13, 'umbral': -53},
+            'diferencia': {'tipo': 'diferencia', 'bandas': [8, 13], 'umbral': 0.0},
+        }
+        # Recorte de la imagen completa, sin grillas ni proyección
+        patcher = mock.patch('src.productos.GetRegionCrop', return_value=((0, 1, 0, 1), (0, 50, 0, 40)))
+        self.recorte = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_productos_de_un_escaneo(self):
+        """
+        Los productos coinciden con el cálculo directo a partir de las temperaturas de brillo.
+        """
+        with EscaneoMultibanda(self.archivos, {}, [0, 1, 0, 1]) as escaneo:
+            mascaras = CalcularProductos(escaneo, self.productos)
+        temperaturas = {}
+        for banda, path in self.archivos.items():
+            with Dataset(path) as nc:
+                temperaturas[banda], _ = GetCalibratedImage(nc, nc.variables['Rad'][:])
+        np.testing.assert_array_equal(mascaras['permanencia'], np.ma.filled(temperaturas[13] < -53, False))
+        np.testing.assert_array_equal(mascaras['diferencia'], np.ma.filled(temperaturas[8] - temperaturas[13] > 0, False))
+        self.assertTrue(mascaras['diferencia'].any() and not mascaras['diferencia'].all())
+
+    def test_recorte_compartido(self):
+        """
+        Las bandas de igual resolución comparten un único cálculo del recorte.
+        """
+        with EscaneoMultibanda(self.archivos, {}, [0, 1, 0, 1]) as escaneo:
+            CalcularProductos(escaneo, self.productos)
+        self.assertEqual(self.recorte.call_count, 1)
+
+    def test_varios_umbrales(self):
+        """
+        Con una lista de umbrales hay un plano por umbral, en el orden pedido, idéntico al
+        producto de ese umbral solo, y la banda se lee una sola vez.
+        """
+        productos = {'permanencia': {'tipo': 'permanencia', 'banda': 13, 'umbrales': [-53, -70, -32]}}
+        with EscaneoMultibanda(self.archivos, {}, [0, 1, 0, 1]) as escaneo:
+            mascaras = CalcularProductos(escaneo, productos)
+            self.assertEqual(list(escaneo._radiancias), [13])
+            for plano, umbral in zip(mascaras['permanencia'], [-53, -70, -32]):
+                solo = CalcularProductos(escaneo, {'p': {'tipo': 'permanencia', 'banda': 13, 'umbral': umbral}})
+                np.testing.assert_array_equal(plano, solo['p'])
+        self.assertEqual(mascaras['permanencia'].shape, (3, 40, 50))
+
+    def test_nombre_capa_umbral(self):
+        self.assertEqual(NombreCapaUmbral(-53), 'conteo_m53')
+        self.assertEqual(NombreCapaUmbral(-62.5), 'conteo_m62p5')
+
+    def test_tipo_desconocido(self):
+        with EscaneoMultibanda(self.archivos, {}, [0, 1, 0, 1]) as escaneo:
+            with self.assertRaises(ValueError):
+                CalcularProductos(escaneo, {'x': {'tipo': 'inexistente'}})
+
+
+class TestAgrupadorEscaneos(unittest.TestCase):
+    def test_bandas_requeridas(self):
+        productos = {'a': {'tipo': 'permanencia', 'banda': 13}, 'b': {'tipo': 'diferencia', 'bandas': [8, 13]}}
+        self.assertEqual(BandasRequeridas(productos), [8, 13])
+        self.assertEqual(GetBand(nombre(8)), 8)
+
+    def test_escaneo_completo(self):
+        """
+        El escaneo se entrega recién cuando llegan todas sus bandas.
+        """
+        agrupador = AgrupadorEscaneos([8, 13])
+        self.assertIsNone(agrupador.agregar(nombre(13)))
+        self.assertEqual(agrupador.agregar(nombre(8)), {8: nombre(8), 13: nombre(13)})
+
+    def test_descarta_escaneo_incompleto(self):
+        """
+        Un escaneo anterior incompleto se descarta cuando se completa uno posterior.
+        """
+        agrupador = AgrupadorEscaneos([8, 13])
+        agrupador.agregar(nombre(13, 0))
+        agrupador.agregar(nombre(13, 1))
+        self.assertIsNotNone(agrupador.agregar(nombre(8, 1)))
+        self.assertEqual(agrupador.pendientes, {})
+        # Una banda no requerida se ignora
+        self.assertIsNone(agrupador.agregar(nombre(7)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import json
+import shutil
+import tempfile
+from datetime import datetime
+import numpy as np
+from netCDF4 import Dataset
+from fsspec.implementations.local import LocalFileSystem
+
+# Asegurar que la descarga, el procesador y los benchmarks estén en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import recorte
+from sintetico import CrearArchivoABI, NombreArchivoABI
+from src import helpers
+from src.helpers import GetRegionExtent, GetRegionMask
+
+CONF = {
+    'argentina_lon_W': -90.0, 'argentina_lon_E': -40.5, 'argentina_lat_S': -55.5, 'argentina_lat_N': -15.5,
+    'sudamerica_lon_W': -100, 'sudamerica_lon_E': -30, 'sudamerica_lat_S': -60, 'sudamerica_lat_N': -5,
+    'delta_lon_W_for_graph': -5.0, 'delta_lat_S_for_graph': -5.0, 'delta_lat_N_for_graph': 4.0,
+}
+
+
+class TestRecorte(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.full_disk = os.path.join(self.tmpdir, NombreArchivoABI(13, datetime(2024, 11, 26, 12, 0, 20)))
+        CrearArchivoABI(self.full_disk, 13, datetime(2024, 11, 26, 12, 0, 20), tamano=1356)
+        # Cache de índices de recorte aislada en el directorio temporal
+        patcher = mock.patch.object(helpers, '_GetGridsDir', return_value=self.tmpdir + '/')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        helpers._crop_cache = None
+        self.addCleanup(setattr, helpers, '_crop_cache', None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_recorte_igual_al_disco_completo(self):
+        """
+        El archivo regional da el mismo recorte, extensión y máscara que el disco completo,
+        en cualquier orden de lectura (la cache guarda índices del disco completo).
+        """
+        regional = os.path.join(self.tmpdir, 'regional.nc')
+        window = recorte.downloadRegion(LocalFileSystem(), self.full_disk, regional, recorte.getRequiredExtent(CONF))
+        self.assertGreater(window[0], 0)
+        self.assertGreater(window[2], 0)
+        extent = GetRegionExtent(CONF, 'ARG')
+        for orden in ((regional, self.full_disk), (self.full_disk, regional)):
+            helpers._crop_cache = None
+            if os.path.exists(os.path.join(self.tmpdir, helpers.CROP_CACHE_FILE)):
+                os.remove(os.path.join(self.tmpdir, helpers.CROP_CACHE_FILE))
+            resultados = []
+            for path in orden:
+                with Dataset(path) as nc:
+                    resultados.append(GetRegionMask(nc, CONF, extent, -53))
+            (extent_a, mask_a), (extent_b, mask_b) = resultados
+            np.testing.assert_allclose(extent_a, extent_b)
+            np.testing.assert_array_equal(np.ma.filled(mask_a, False), np.ma.filled(mask_b, False))
+            self.assertTrue(0 < np.mean(mask_a) < 1)
+
+    def test_extension_de_cada_archivo(self):
+        """
+        Con un archivo regional que no cubre toda la región, cada archivo recibe la extensión de sus propios datos.
+        """
+        regional = os.path.join(self.tmpdir, 'regional.nc')
+        recorte.downloadRegion(LocalFileSystem(), self.full_disk, regional, [-70.0, -50.0, -40.0, -20.0])
+        extent = GetRegionExtent(CONF, 'ARG')
+        for path in (regional, self.full_disk):
+            with Dataset(path) as nc:
+                img_extent, mask = GetRegionMask(nc, CONF, extent, -53)
+                _, img_indexes = helpers.GetRegionCrop(nc, CONF, extent)
+                sat_h = nc.variables['goes_imager_projection'].perspective_point_height
+                x = nc.variables['x'][img_indexes[0]:img_indexes[1]] * sat_h
+                y = nc.variables['y'][img_indexes[2]:img_indexes[3]] * sat_h
+            np.testing.assert_allclose(img_extent, [x.min(), x.max(), y.min(), y.max()], atol=1.0)
+            self.assertEqual(mask.shape, (len(y), len(x)))
+
+    def test_extension_configurada(self):
+        """
+        Sin extensión se usa la unión de las regiones; una extensión que no las cubre se rechaza.
+        """
+        conf_file = os.path.join(self.tmpdir, 'SMN_dict.conf')
+        with open(conf_file, 'w') as f:
+            json.dump(dict(CONF, regiones={'ARG': None, 'SuA': None}), f)
+        self.assertEqual(recorte.getCropExtent({'habilitado': True}, conf_file), [-105.0, -30, -65.0, -1.0])
+        with self.assertRaises(ValueError):
+            recorte.getCropExtent({'habilitado': True, 'extension': [-95.0, -40.5, -60.5, -11.5]}, conf_file)
+        with open(conf_file, 'w') as f:
+            json.dump(CONF, f)
+        self.assertEqual(recorte.getCropExtent({'extension': [-95.0, -40.5, -60.5, -11.5]}, conf_file),
+                         [-95.0, -40.5, -60.5, -11.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
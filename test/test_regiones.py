@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que el procesador y los benchmarks estén en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from sintetico import CrearArchivoABI, NombreArchivoABI
+from src.helpers import GetRegionExtent, _GetCropIndexesFromProjection
+from src.productos import EscaneoMultibanda
+from src.regiones import RegistroRegiones, UnionExtents, Vista
+
+CONF = {
+    'argentina_lon_W': -90.0, 'argentina_lon_E': -40.5, 'argentina_lat_S': -55.5, 'argentina_lat_N': -15.5,
+    'sudamerica_lon_W': -100, 'sudamerica_lon_E': -30, 'sudamerica_lat_S': -60, 'sudamerica_lat_N': -5,
+    'delta_lon_W_for_graph': -5.0, 'delta_lat_S_for_graph': -5.0, 'delta_lat_N_for_graph': 4.0,
+}
+
+
+def recorte_proyeccion(netCDFread, confData, extent):
+    # Recorte calculado desde la proyección, sin escribir el cache de data/grids
+    indexes = _GetCropIndexesFromProjection(netCDFread, extent[0] + confData['delta_lon_W_for_graph'], extent[1],
+                                            extent[2] + confData['delta_lat_S_for_graph'],
+                                            extent[3] + confData['delta_lat_N_for_graph'])
+    return tuple(float(i) for i in indexes), indexes
+
+
+class TestRegiones(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image_file = os.path.join(self.tmpdir, NombreArchivoABI(13, datetime(2024, 11, 26, 12, 0, 20, tzinfo=timezone.utc)))
+        CrearArchivoABI(self.image_file, 13, datetime(2024, 11, 26, 12, 0, 20, tzinfo=timezone.utc), tamano=678)
+        for modulo in ('src.productos', 'src.regiones'):
+            patcher = mock.patch(f'{modulo}.GetRegionCrop', side_effect=recorte_proyeccion)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_union(self):
+        registro = RegistroRegiones(CONF, {'ARG': None, 'centro': [-66, -57, -36, -29], 'norte': [-70, -20, -30, 0]})
+        self.assertEqual(registro.principal, 'ARG')
+        self.assertEqual(registro.union, [-90.0, -20.0, -55.5, 0.0])
+        self.assertEqual(RegistroRegiones(CONF).union, GetRegionExtent(CONF, 'ARG'))
+        self.assertEqual(UnionExtents([[0, 1, 0, 1], [-1, 0.5, 0.5, 2]]), [-1, 1, 0, 2])
+        with self.assertRaises(ValueError):
+            RegistroRegiones(CONF, {'desconocida': None})
+        with self.assertRaises(ValueError):
+            RegistroRegiones(CONF, {'invertida': [-40, -60, -30, -20]})
+
+    def test_vistas(self):
+        """
+        Cada región es una vista sin copia del recorte de la unión, igual a su propio recorte.
+        """
+        registro = RegistroRegiones(CONF, {'ARG': None, 'SuA': None, 'centro': [-66, -57, -36, -29]})
+        with EscaneoMultibanda({13: self.image_file}, CONF, registro.union) as escaneo:
+            radiancia = escaneo.radiancia(13)
+            ventanas = registro.ventanas(escaneo, 13)
+            self.assertIs(registro.ventanas(escaneo, 13), ventanas)
+            with Dataset(self.image_file) as nc:
+                for nombre, ventana in ventanas.items():
+                    img_extent, indexes = recorte_proyeccion(nc, CONF, registro.extents[nombre])
+                    vista = Vista(radiancia, ventana)
+                    self.assertTrue(np.shares_memory(vista, radiancia))
+                    self.assertEqual(ventana[2], img_extent)
+                    np.testing.assert_array_equal(vista, nc.variables['Rad'][indexes[2]:indexes[3], indexes[0]:indexes[1]])
+        # La unión es Sudamérica y las vistas también sirven para un conteo con un plano por umbral
+        self.assertEqual(Vista(np.zeros((3,) + radiancia.shape), ventanas['SuA']).shape, (3,) + radiancia.shape)
+
+    def test_region_fuera_de_la_union(self):
+        """
+        Si una región excede el recorte de la unión, la extensión corresponde a la ventana recortada.
+        """
+        registro = RegistroRegiones(CONF, {'ARG': None, 'SuA': None})
+        with EscaneoMultibanda({13: self.image_file}, CONF, GetRegionExtent(CONF, 'ARG')) as escaneo:
+            _, union_indexes = escaneo.recorte(13)
+            filas, columnas, img_extent = registro.ventanas(escaneo, 13)['SuA']
+            self.assertEqual(Vista(escaneo.radiancia(13), (filas, columnas, img_extent)).shape, escaneo.radiancia(13).shape)
+        with Dataset(self.image_file) as nc:
+            sat_h = nc.variables['goes_imager_projection'].perspective_point_height
+            x = nc.variables['x'][union_indexes[0]:union_indexes[1]][columnas] * sat_h
+            y = nc.variables['y'][union_indexes[2]:union_indexes[3]][filas] * sat_h
+        np.testing.assert_allclose(img_extent, [x.min(), x.max(), y.min(), y.max()], atol=1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Asegurar que el procesador esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+
+import src.helpers as helpers
+from src.helpers import ApplyResamplingLUT, GetResamplingLUT
+
+PROYECCION = {'longitude_of_projection_origin': -75.0, 'perspective_point_height': 35786023.0,
+              'semi_major_axis': 6378137.0, 'semi_minor_axis': 6356752.31414}
+SAT_H = PROYECCION['perspective_point_height']
+
+
+class TestRemuestreo(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        patcher = mock.patch.object(helpers, '_GetGridsDir', return_value=self.tmpdir + '/')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        helpers._lut_cache.clear()
+        self.addCleanup(helpers._lut_cache.clear)
+        # Recorte de 40 x 60 píxeles de 2 km (56 microrradianes) al sur del punto subsatelital
+        self.forma = (40, 60)
+        paso = 56e-6 * SAT_H
+        self.img_extent = (-0.03 * SAT_H, -0.03 * SAT_H + 60 * paso, -0.08 * SAT_H, -0.08 * SAT_H + 40 * paso)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_indices(self):
+        """
+        Cada píxel de salida toma el píxel del recorte que contiene su centro.
+        """
+        map_extent = (-100.0, -60.0, -40.0, -20.0)
+        lut = GetResamplingLUT(PROYECCION, self.img_extent, self.forma, map_extent, (50, 80))
+        self.assertEqual(lut.shape, (50, 80))
+        self.assertTrue((lut >= 0).any() and (lut < 0).any())
+        i, j = np.argwhere(lut >= 0)[len(np.argwhere(lut >= 0)) // 2]
+        lon = map_extent[0] + (j + 0.5) * 40.0 / 80
+        lat = map_extent[3] - (i + 0.5) * 20.0 / 50
+        proj = mock.Mock(**PROYECCION)
+        x, y = helpers.GetGeosScanAngles(np.array(lon), np.array(lat), proj)
+        columna = int((x * SAT_H - self.img_extent[0]) / (self.img_extent[1] - self.img_extent[0]) * self.forma[1])
+        fila = int((self.img_extent[3] - y * SAT_H) / (self.img_extent[3] - self.img_extent[2]) * self.forma[0])
+        self.assertEqual(lut[i, j], fila * self.forma[1] + columna)
+
+        # Las columnas del recorte crecen hacia el este y las filas hacia el sur
+        imagen = np.arange(np.prod(self.forma)).reshape(self.forma)
+        remuestreada = ApplyResamplingLUT(imagen, lut)
+        columnas = remuestreada % self.forma[1]
+        fila_valida = columnas[np.argmax((~remuestreada.mask).sum(axis=1))].compressed()
+        self.assertTrue(np.all(np.diff(fila_valida) >= 0))
+        # Una pila de planos se remuestrea plano por plano
+        pila = ApplyResamplingLUT(np.stack([imagen, imagen + 1]), lut)
+        np.testing.assert_array_equal(pila[1] - pila[0], np.ma.masked_array(np.ones(lut.shape), mask=lut < 0))
+
+    def test_fuera_del_disco(self):
+        """
+        Los puntos del otro lado del limbo no toman ningún píxel aunque sus ángulos caigan en el recorte.
+        """
+        disco = (-0.15 * SAT_H, 0.15 * SAT_H, -0.15 * SAT_H, 0.15 * SAT_H)
+        lut = GetResamplingLUT(PROYECCION, disco, (100, 100), (100.0, 110.0, -5.0, 5.0), (10, 10))
+        self.assertTrue((lut < 0).all())
+
+    def test_cache_en_disco(self):
+        """
+        La tabla se calcula una sola vez: las llamadas siguientes la leen del cache, también en otro proceso.
+        """
+        argumentos = (PROYECCION, self.img_extent, self.forma, (-100.0, -60.0, -40.0, -20.0), (50, 80))
+        lut = np.array(GetResamplingLUT(*argumentos))
+        self.assertEqual(len(os.listdir(os.path.join(self.tmpdir, 'lut'))), 1)
+        helpers._lut_cache.clear()
+        with mock.patch.object(helpers, 'GetGeosScanAngles') as angulos:
+            np.testing.assert_array_equal(GetResamplingLUT(*argumentos), lut)
+            self.assertIs(GetResamplingLUT(*argumentos), GetResamplingLUT(*argumentos))
+            angulos.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
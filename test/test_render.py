@@ -0,0 +1,167 @@
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import cartopy.crs as ccrs
+
+# Asegurar que el procesador esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+
+import src.helpers as helpers
+import src.render as render
+
+SAT_H = 35786023.0
+
+
+def mapa_base(confData, extent):
+    # Mapa sin shapefiles (GetPlotObject descarga las costas de Natural Earth)
+    ax = plt.axes(projection=ccrs.PlateCarree())
+    ax.set_extent([extent[0], extent[1], extent[2] - 1.0, extent[3]], ccrs.PlateCarree())
+    ax.plot([-70, -50], [-40, -20], transform=ccrs.PlateCarree(), color='black')
+    return ax
+
+
+class TestRenderRaster(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for objetivo, valor in ((mock.patch.object(helpers, '_GetGridsDir', return_value=self.tmpdir + '/'), None),
+                                (mock.patch.object(render, 'GetPlotObject', side_effect=mapa_base), None),
+                                (mock.patch.object(render, 'AddLogo'), None)):
+            objetivo.start()
+            self.addCleanup(objetivo.stop)
+        render._capas_raster.clear()
+        self.addCleanup(render._capas_raster.clear)
+        self.confData = {'figure_resolution_dpi': 100}
+        # Recorte de 2 km que cubre Argentina, con un conteo que recorre toda la escala
+        forma = (150, 220)
+        conteo = (np.add.outer(np.arange(forma[0]), np.arange(forma[1])) % 150).astype(np.uint8)
+        metadata = {'central_longitude': -75.0, 'satellite_height': SAT_H, 'semi_major_axis': 6378137.0,
+                    'semi_minor_axis': 6356752.31414, 'time_coverage_start': '2024-11-26T12:00:20.5Z'}
+        img_extent = (-0.06 * SAT_H, 0.06 * SAT_H, -0.17 * SAT_H, -0.02 * SAT_H)
+        self.snapshot = render.CrearSnapshot(conteo, metadata, img_extent, [-80.0, -50.0, -50.0, -25.0],
+                                             os.path.join(self.tmpdir, 'mapa.png'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def renderizar(self, backend, nombre):
+        snapshot = dict(self.snapshot, output_path=os.path.join(self.tmpdir, nombre))
+        render._RenderizarMedido(snapshot, dict(self.confData, render_backend=backend))
+        return plt.imread(snapshot['output_path'])[..., :3]
+
+    def test_igual_al_render_matplotlib(self):
+        """
+        Fuera del título, el render raster es el mismo mapa que el de matplotlib.
+        """
+        raster = self.renderizar('raster', 'raster.png')
+        referencia = self.renderizar('matplotlib', 'matplotlib.png')
+        self.assertEqual(raster.shape, referencia.shape)
+        distintos = np.any(np.abs(raster - referencia) > 0.02, axis=-1)
+        # El título (8 pt a 100 dpi) ocupa las primeras filas y se dibuja con otro antialias
+        self.assertLess(distintos[30:].mean(), 0.005)
+        self.assertGreater(len(np.unique(raster.reshape(-1, 3), axis=0)), 5)
+
+    def test_capa_fija_una_vez(self):
+        self.renderizar('raster', 'a.png')
+        self.renderizar('raster', 'b.png')
+        self.assertEqual(render.GetPlotObject.call_count, 1)
+        self.assertEqual(len(render._capas_raster), 1)
+
+    def test_tabla_colores(self):
+        tabla = render.TablaColores(255)
+        self.assertEqual(tabla.shape, (257, 4))
+        np.testing.assert_array_equal(tabla[0], [255, 255, 255, 255])  # 0 horas: blanco
+        np.testing.assert_array_equal(tabla[144], np.array(matplotlib.colors.to_rgba('darkred')) * 255 // 1)
+        self.assertEqual(tabla[-1, 3], 0)
+
+    def test_renderizador_desconocido(self):
+        with self.assertRaises(ValueError):
+            render.RenderizadorAsincrono({'render_backend': 'otro'}, print, workers=0)
+
+    def test_pool_sin_fork(self):
+        """
+        Los procesos de render no se crean con fork.
+        """
+        renderizador = render.RenderizadorAsincrono({}, print, workers=1)
+        try:
+            self.assertIn(renderizador.executor._mp_context.get_start_method(), ('forkserver', 'spawn'))
+        finally:
+            renderizador.cerrar()
+
+
+class PoolHilos(ThreadPoolExecutor):
+    """
+    Pool de hilos con la firma de ProcessPoolExecutor, para controlar el render desde la prueba.
+    """
+
+    def __init__(self, max_workers, mp_context=None):
+        super().__init__(max_workers=max_workers)
+
+
+class TestRenderizadorAsincrono(unittest.TestCase):
+    def setUp(self):
+        self.activos = 0
+        self.max_activos = 0
+        self.lock = threading.Lock()
+        self.liberar = threading.Event()
+        self.liberar.set()
+        for objetivo in (mock.patch.object(render, 'ProcessPoolExecutor', PoolHilos),
+                         mock.patch.object(render, '_RenderizarMedido', side_effect=self.renderizar)):
+            objetivo.start()
+            self.addCleanup(objetivo.stop)
+
+    def renderizar(self, snapshot, confData):
+        with self.lock:
+            self.activos += 1
+            self.max_activos = max(self.max_activos, self.activos)
+        self.liberar.wait()
+        time.sleep(snapshot['espera'])
+        with self.lock:
+            self.activos -= 1
+        return snapshot['output_path'], snapshot['espera']
+
+    def test_entrega_en_orden(self):
+        """
+        Los PNG se entregan en el orden en que se encolaron, aunque los primeros tarden más.
+        """
+        terminados = []
+        renderizador = render.RenderizadorAsincrono({}, terminados.append, workers=3, queue_size=2)
+        for i in range(8):
+            renderizador.enviar({'output_path': i, 'espera': 0.05 * (7 - i) if i < 4 else 0.0})
+        renderizador.cerrar()
+        self.assertEqual(terminados, list(range(8)))
+        self.assertLessEqual(self.max_activos, 3)
+        self.assertGreater(self.max_activos, 1)
+
+    def test_contrapresion(self):
+        """
+        Con el pool ocupado y la cola llena, enviar espera en lugar de acumular fotos sin límite.
+        """
+        terminados = []
+        renderizador = render.RenderizadorAsincrono({}, terminados.append, workers=1, queue_size=1)
+        self.liberar.clear()
+        encolador = threading.Thread(target=lambda: [renderizador.enviar({'output_path': i, 'espera': 0.0}) for i in range(4)])
+        encolador.start()
+        time.sleep(0.3)
+        # Una foto en el pool, una esperando al despachador y una en la cola: la cuarta espera
+        self.assertTrue(encolador.is_alive())
+        self.assertEqual(renderizador.pendientes(), 1)
+        self.assertEqual(terminados, [])
+        self.liberar.set()
+        encolador.join(timeout=5)
+        self.assertFalse(encolador.is_alive())
+        renderizador.cerrar()
+        self.assertEqual(terminados, [0, 1, 2, 3])
+        self.assertEqual(self.max_activos, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
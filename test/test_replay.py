@@ -0,0 +1,125 @@
+import unittest
+import sys
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+import datetime
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que la descarga esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+
+import helpers as help
+from catchup import CatchUp
+from ledger import DownloadLedger
+from replay import ReplayClock, LocalFileSystem
+from schedule import ScanSchedule
+from verificacion import StreamVerifier, streamCopy
+
+PRODUCT = 'ABI-L1b-RadF'
+START = datetime.datetime(2024, 1, 11, 23, 0)
+
+
+def remote_name(band, scan_start):
+    _, year, day, hour = help.getRemotePath('', PRODUCT, scan_start)
+    return (f'noaa-goes16/{PRODUCT}/{year}/{day}/{hour}/'
+            f'OR_{PRODUCT}-M6C{band:02d}_G16_s{scan_start:%Y%j%H%M%S}0_e{scan_start:%Y%j%H%M%S}0_c{scan_start:%Y%j%H%M%S}0.nc')
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.mirror = os.path.join(self.tmpdir, 'espejo')
+        # Un netCDF mínimo por banda para los seis escaneos de la hora
+        for minute in range(0, 60, 10):
+            for band in (8, 13):
+                path = os.path.join(self.mirror, remote_name(band, START + datetime.timedelta(minutes=minute, seconds=20)))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with Dataset(path, 'w') as nc:
+                    nc.createDimension('y', 2)
+                    nc.createDimension('x', 2)
+                    rad = nc.createVariable('Rad', 'i2', ('y', 'x'))
+                    rad.scale_factor = 0.0406
+                    rad.add_offset = -1.6
+                    rad[:] = np.arange(4).reshape(2, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_reloj(self):
+        clock = ReplayClock(START, speed=600)
+        time.sleep(0.05)
+        elapsed = (clock.now() - START).total_seconds()
+        self.assertTrue(25 <= elapsed < 120, elapsed)
+        inicio = time.monotonic()
+        clock.sleep(60)
+        self.assertLess(time.monotonic() - inicio, 1)
+        # Sin fecha de inicio es el reloj real
+        self.assertLess(abs((ReplayClock().now() - datetime.datetime.utcnow()).total_seconds()), 1)
+
+    def test_publicacion(self):
+        """
+        Cada archivo aparece recién 'publish_delay' segundos después del inicio de su escaneo.
+        """
+        clock = ReplayClock(START + datetime.timedelta(minutes=21), speed=1)
+        fs = LocalFileSystem(self.mirror, clock=clock, publish_delay=600)
+        remotePath, _, _, _ = help.getRemotePath('s3://noaa-goes16/', PRODUCT, START)
+        listing = fs.ls(remotePath)
+        self.assertEqual(len(listing), 4)  # Bandas 8 y 13 de los escaneos de las 23:00 y 23:10
+        self.assertTrue(all(not f.startswith('s3://') for f in listing))
+        self.assertEqual(fs.find(remotePath, prefix=f'OR_{PRODUCT}-M6C13_G16_s2024011231'), [listing[3]])
+        self.assertEqual(fs.find(remotePath, prefix=f'OR_{PRODUCT}-M6C13_G16_s2024011232'), [])
+        with self.assertRaises(FileNotFoundError):
+            fs.info(remote_name(13, START + datetime.timedelta(minutes=20, seconds=20)))
+        with self.assertRaises(FileNotFoundError):
+            fs.ls('s3://noaa-goes16/ABI-L1b-RadF/2024/011/22/')
+
+        # El ETag y la fecha de publicación se comportan como los de S3
+        info = fs.info(listing[0])
+        self.assertEqual(info['LastModified'].replace(tzinfo=None), START + datetime.timedelta(seconds=620))
+        local_file = os.path.join(self.tmpdir, 'copia.nc')
+        verifier = StreamVerifier(info['size'], info['ETag'])
+        streamCopy(fs, listing[0], local_file, verifier)
+        self.assertEqual(verifier.verify(), 'md5')
+        self.assertEqual(fs.cat_file(listing[0], start=1, end=4), open(local_file, 'rb').read()[1:4])
+
+    def test_calendario_acelerado(self):
+        """
+        El calendario de escaneo espera en tiempo simulado y encuentra los escaneos a medida que se publican.
+        """
+        clock = ReplayClock(START, speed=6000)
+        fs = LocalFileSystem(self.mirror, clock=clock, publish_delay=600)
+        schedule = ScanSchedule(fs, PRODUCT, [8, 13], publish_delay=690, now=clock.now, sleep=clock.sleep)
+        downloaded = []
+        inicio = time.monotonic()
+        while len(downloaded) < 12:
+            downloaded += schedule.poll(START, downloaded)
+        self.assertLess(time.monotonic() - inicio, 5)
+        self.assertEqual(len(set(downloaded)), 12)
+        self.assertEqual(schedule.listings, 0)
+
+    def test_recuperacion(self):
+        """
+        La recuperación concurrente descarga del espejo con su interfaz asíncrona.
+        """
+        clock = ReplayClock(START + datetime.timedelta(hours=2), speed=1)
+        fs = LocalFileSystem(self.mirror, clock=clock)
+        temp_path = os.path.join(self.tmpdir, 'temp')
+        final_path = os.path.join(self.tmpdir, 'inbox')
+        os.makedirs(temp_path)
+        os.makedirs(final_path)
+        ledger = DownloadLedger(os.path.join(self.tmpdir, 'db.sqlite'), files_per_hour=12)
+        delivered = []
+        catch_up = CatchUp(ledger, PRODUCT, [8, 13], temp_path, final_path, fs=fs, on_scan=delivered.append)
+        siguiente = asyncio.run(catch_up.run(START, now=clock.now()))
+        self.assertEqual(siguiente, START + datetime.timedelta(hours=1))
+        self.assertEqual(len(delivered), 6)
+        self.assertEqual(len(os.listdir(final_path)), 12)
+        ledger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
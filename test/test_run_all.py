@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+# Asegurar que la raíz del repositorio esté en el PYTHONPATH para importar el lanzador
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from run_all import Pipeline
+
+
+def escaneo(i):
+    return {8: f'C08_{i}.nc', 13: f'C13_{i}.nc'}
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.procesados = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def crear(self, descargar, procesar=None, **kwargs):
+        return Pipeline(descargar, lambda: None, procesar or self.procesados.append, reintento=0.01, **kwargs)
+
+    def test_entrega_en_orden(self):
+        """
+        Cada escaneo llega al procesador apenas se entrega, con sus bandas en orden.
+        """
+        def descargar(on_scan, stop_event):
+            for i in range(5):
+                on_scan(escaneo(i))
+
+        health_file = os.path.join(self.tmpdir, 'salud.json')
+        pipeline = self.crear(descargar, health_file=health_file, health_interval=0.05)
+        pipeline.ejecutar()
+        self.assertEqual(self.procesados, [p for i in range(5) for p in (f'C08_{i}.nc', f'C13_{i}.nc')])
+        with open(health_file) as fp:
+            salud = json.load(fp)
+        self.assertEqual(salud['etapas']['descarga']['procesados'], 5)
+        self.assertEqual(salud['etapas']['procesamiento']['procesados'], 5)
+        self.assertEqual(salud['cola']['pendientes'], 0)
+
+    def test_contrapresion(self):
+        """
+        Con la cola llena, la descarga espera al procesamiento.
+        """
+        liberar = threading.Event()
+        entregados = []
+
+        def descargar(on_scan, stop_event):
+            for i in range(6):
+                on_scan(escaneo(i))
+                entregados.append(i)
+
+        def procesar(path):
+            liberar.wait()
+
+        pipeline = self.crear(descargar, procesar, queue_size=2)
+        pipeline.iniciar()
+        time.sleep(0.3)
+        # Uno en proceso, dos en la cola y uno esperando para entrar
+        self.assertEqual(len(entregados), 3)
+        self.assertEqual(pipeline.cola.qsize(), 2)
+        liberar.set()
+        pipeline.etapas['procesamiento'].hilo.join(5)
+        self.assertEqual(len(entregados), 6)
+        pipeline.detener()
+
+    def test_reinicia_descarga_y_tolera_errores(self):
+        """
+        Un error en la descarga la reinicia; un error al procesar un escaneo no detiene el procesamiento.
+        """
+        intentos = []
+
+        def descargar(on_scan, stop_event):
+            intentos.append(1)
+            if len(intentos) == 1:
+                raise ConnectionError('sin red')
+            on_scan(escaneo(0))
+            on_scan(escaneo(1))
+
+        def procesar(path):
+            if path == 'C08_0.nc':
+                raise ValueError('archivo dañado')
+            self.procesados.append(path)
+
+        pipeline = self.crear(descargar, procesar)
+        pipeline.ejecutar()
+        salud = pipeline.salud()
+        self.assertEqual(len(intentos), 2)
+        self.assertEqual(salud['etapas']['descarga']['reinicios'], 1)
+        self.assertEqual(salud['etapas']['procesamiento']['errores'], 1)
+        self.assertEqual(self.procesados, ['C08_1.nc', 'C13_1.nc'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+import datetime
+
+# Asegurar que la descarga esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+
+from schedule import ScanSchedule, getScanStart
+
+
+class FakeFS:
+    """
+    Repositorio remoto simulado: cada archivo se publica en un instante dado.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.published = {}
+        self.calls = []
+
+    def publish(self, path, at):
+        self.published[path] = at
+
+    def _visible(self):
+        return [f for f, at in self.published.items() if at <= self.clock.now]
+
+    def ls(self, path, refresh=False):
+        self.calls.append(('ls', path))
+        prefix = path[len('s3://'):]
+        listing = [f for f in self._visible() if f.startswith(prefix)]
+        if not listing:
+            raise FileNotFoundError(path)
+        return listing
+
+    def find(self, path, prefix=''):
+        self.calls.append(('find', prefix))
+        full = path[len('s3://'):] + prefix
+        return [f for f in self._visible() if f.startswith(full)]
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def sleep(self, seconds):
+        self.now += datetime.timedelta(seconds=seconds)
+
+
+def remote_file(scan_start):
+    return (f"noaa-goes16/ABI-L1b-RadF/{scan_start:%Y/%j/%H}/"
+            f"OR_ABI-L1b-RadF-M6C13_G16_s{scan_start:%Y%j%H%M%S}0_e0_c0.nc")
+
+
+class TestScanSchedule(unittest.TestCase):
+    def setUp(self):
+        self.hour = datetime.datetime(2024, 11, 26, 22)
+        self.clock = Clock(self.hour)
+        self.fs = FakeFS(self.clock)
+        for i in range(6):
+            scan_start = self.hour + datetime.timedelta(minutes=10 * i, seconds=20)
+            self.fs.publish(remote_file(scan_start), scan_start + datetime.timedelta(minutes=11))
+        self.schedule = ScanSchedule(self.fs, 'ABI-L1b-RadF', [13], publish_delay=700,
+                                     now=lambda: self.clock.now, sleep=self.clock.sleep)
+
+    def test_escaneos_faltantes(self):
+        downloaded = [remote_file(self.hour + datetime.timedelta(minutes=10 * i, seconds=20)) for i in range(2)]
+        self.assertEqual(getScanStart(downloaded[1]), self.hour + datetime.timedelta(minutes=10, seconds=20))
+        missing = self.schedule.missingScans(self.hour, downloaded)
+        self.assertEqual(missing[0], self.hour + datetime.timedelta(minutes=20))
+        self.assertEqual(len(missing), 4)
+
+    def test_consulta_por_prefijo(self):
+        """
+        En vivo se espera a la publicación prevista y se consulta solo el prefijo del escaneo.
+        """
+        downloaded = []
+        for i in range(6):
+            files = self.schedule.poll(self.hour, downloaded)
+            self.assertEqual(len(files), 1)
+            self.assertEqual(getScanStart(files[0]).minute, 10 * i)
+            downloaded += files
+        self.assertEqual(self.schedule.listings, 0)
+        self.assertTrue(all(call[0] == 'find' for call in self.fs.calls))
+        self.assertEqual(self.schedule.poll(self.hour, downloaded), [])
+
+    def test_listado_completo_si_falla(self):
+        """
+        Si el escaneo no aparece en el prefijo previsto se lista la hora completa.
+        """
+        self.schedule.publish_delay = 60
+        self.assertEqual(self.schedule.poll(self.hour, []), [])
+        self.assertEqual(self.schedule.listings, 1)
+
+    def test_hora_pasada(self):
+        """
+        Las horas que ya terminaron se listan completas con una sola petición.
+        """
+        self.clock.now = self.hour + datetime.timedelta(hours=2)
+        self.assertEqual(len(self.schedule.poll(self.hour, [])), 6)
+        self.assertEqual(self.fs.calls, [('ls', 's3://noaa-goes16/ABI-L1b-RadF/2024/331/22/')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que el procesador y los benchmarks estén en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Procesador')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from sintetico import CrearArchivoABI, NombreArchivoABI
+from medicion import Comparar
+from src.helpers import GetCalibratedImage, GetScanStartTime, _GetCropIndexesFromProjection
+from src.productos import GetBand
+
+
+class TestSintetico(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.tiempo = datetime(2024, 11, 26, 12, 10, 20)
+        self.path = os.path.join(self.tmpdir, NombreArchivoABI(13, self.tiempo))
+        CrearArchivoABI(self.path, 13, self.tiempo, tamano=678)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_nombre(self):
+        self.assertEqual(GetBand(self.path), 13)
+        self.assertEqual(GetScanStartTime(self.path).replace(tzinfo=None), self.tiempo)
+
+    def test_estructura_y_calibracion(self):
+        """
+        El archivo se recorta con su proyección y calibra a temperaturas de brillo plausibles.
+        """
+        with Dataset(self.path) as nc:
+            self.assertEqual(nc.variables['Rad'].shape, (678, 678))
+            self.assertTrue(nc.time_coverage_start.startswith('2024-11-26T12:10:20'))
+            idx = _GetCropIndexesFromProjection(nc, -95.0, -40.5, -60.5, -11.5)
+            self.assertTrue(0 < idx[0] < idx[1] < 678 and 339 < idx[2] < idx[3] < 678)
+            rad = nc.variables['Rad'][idx[2]:idx[3], idx[0]:idx[1]]
+            temperatura, unidad = GetCalibratedImage(nc, rad)
+            disco, _ = GetCalibratedImage(nc, nc.variables['Rad'][:])
+        self.assertIn('°C', unidad)
+        self.assertGreater(temperatura.min(), -95)
+        self.assertLess(temperatura.max(), 50)
+        # Topes fríos presentes, pero minoritarios, y sin dato fuera del disco terrestre
+        self.assertTrue(0 < np.ma.mean(temperatura < -53) < 0.5)
+        self.assertTrue(np.ma.getmaskarray(disco)[0, 0])
+
+    def test_comparar(self):
+        base = {'etapas': {'a': {'mediana': 1.0}, 'b': {'mediana': 1.0}}}
+        actual = {'etapas': {'a': {'mediana': 1.05}, 'b': {'mediana': 1.5}, 'c': {'error': 'x'}}}
+        _, regresiones = Comparar(actual, base, tolerancia=0.10)
+        self.assertEqual(regresiones, ['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+import threading
+
+# Asegurar que la descarga esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+
+from transfer import RangeDownloader
+from verificacion import StreamVerifier, VerificationError
+
+
+class FakeRangeFS:
+    """
+    Objeto remoto simulado que atiende peticiones por rango y puede fallar en una parte.
+    """
+
+    def __init__(self, content, etag='"abc"', fail_at=None, delay=0):
+        self.content = content
+        self.etag = etag
+        self.fail_at = fail_at
+        self.delay = delay
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def info(self, path):
+        return {'size': len(self.content), 'ETag': self.etag}
+
+    def cat_file(self, path, start=None, end=None):
+        with self.lock:
+            self.requests.append(start)
+        if start == self.fail_at:
+            raise ConnectionError('conexión interrumpida')
+        time.sleep(self.delay)
+        return self.content[start:end]
+
+
+class TestRangeDownloader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.local_file = os.path.join(self.tmpdir, 'OR_ABI-L1b-RadF-M6C13.nc')
+        self.content = os.urandom(10 * 1000 + 123)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_descarga_en_partes(self):
+        fs = FakeRangeFS(self.content)
+        downloader = RangeDownloader(fs, part_size=1000, max_connections=4)
+        received = []
+        info = downloader.download('bucket/file.nc', self.local_file, on_part=lambda start, data: received.append(start))
+        downloader.close()
+        with open(self.local_file, 'rb') as fp:
+            self.assertEqual(fp.read(), self.content)
+        self.assertEqual(info['size'], len(self.content))
+        self.assertEqual(len(fs.requests), 11)
+        # Las partes se entregan en orden
+        self.assertEqual(received, sorted(received))
+        self.assertFalse(os.path.exists(self.local_file + RangeDownloader.STATE_SUFFIX))
+
+    def test_reanudacion(self):
+        """
+        Tras una falla solo se piden las partes que faltan.
+        """
+        downloader = RangeDownloader(FakeRangeFS(self.content, fail_at=5000), part_size=1000, max_connections=2)
+        with self.assertRaises(ConnectionError):
+            downloader.download('bucket/file.nc', self.local_file)
+        self.assertTrue(os.path.exists(self.local_file + RangeDownloader.STATE_SUFFIX))
+
+        fs = FakeRangeFS(self.content)
+        downloader = RangeDownloader(fs, part_size=1000, max_connections=2)
+        downloader.download('bucket/file.nc', self.local_file)
+        downloader.close()
+        self.assertEqual(fs.requests, [5000])
+        with open(self.local_file, 'rb') as fp:
+            self.assertEqual(fp.read(), self.content)
+
+    def test_verificacion_fallida_a_mitad(self):
+        """
+        Si la verificación falla en una parte, se espera a las partes en curso antes de cerrar el archivo:
+        ninguna escribe en un descriptor cerrado y no queda ninguna en el pool.
+        """
+        contenido = b'\x89HDF\r\n\x1a\n' + self.content
+        fs = FakeRangeFS(contenido, delay=0.02)
+        downloader = RangeDownloader(fs, part_size=1000, max_connections=4)
+        # Se declaran menos bytes de los que tiene el objeto: la verificación falla en la tercera parte
+        verifier = StreamVerifier(2500)
+        with self.assertRaises(VerificationError):
+            downloader.download('bucket/file.nc', self.local_file, on_part=lambda start, data: verifier.update(data))
+        # Las partes pendientes se cancelaron y ninguna sigue trabajando después de cerrar el archivo
+        pedidas = len(fs.requests)
+        self.assertLess(pedidas, 11)
+        time.sleep(0.1)
+        self.assertEqual(len(fs.requests), pedidas)
+        # Los hilos del pool quedaron libres: una descarga nueva con el mismo pool termina bien
+        otro = os.path.join(self.tmpdir, 'otro.nc')
+        downloader.download('bucket/file.nc', otro)
+        downloader.close()
+        with open(otro, 'rb') as fp:
+            self.assertEqual(fp.read(), contenido)
+
+    def test_objeto_modificado(self):
+        """
+        Si el ETag del objeto cambió, la descarga parcial se descarta y se empieza de nuevo.
+        """
+        downloader = RangeDownloader(FakeRangeFS(self.content, fail_at=0), part_size=1000)
+        with self.assertRaises(ConnectionError):
+            downloader.download('bucket/file.nc', self.local_file)
+        fs = FakeRangeFS(self.content, etag='"otro"')
+        RangeDownloader(fs, part_size=1000).download('bucket/file.nc', self.local_file)
+        self.assertEqual(len(fs.requests), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import sys
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from netCDF4 import Dataset
+
+# Asegurar que la descarga esté en el PYTHONPATH para importar sus módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'descarga')))
+
+from verificacion import StreamVerifier, VerificationError, checkNetcdf, HDF5_SIGNATURE
+
+
+def feed(verifier, content, block=3 * 2**20 + 7):
+    for start in range(0, len(content), block):
+        verifier.update(content[start:start + block])
+
+
+class TestStreamVerifier(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.content = HDF5_SIGNATURE + rng.integers(0, 256, 11 * 2**20, dtype=np.uint8).tobytes()
+
+    def test_md5_simple(self):
+        etag = '"' + hashlib.md5(self.content).hexdigest() + '"'
+        verifier = StreamVerifier(len(self.content), etag)
+        feed(verifier, self.content)
+        self.assertEqual(verifier.verify(), 'md5')
+
+    def test_md5_multiparte(self):
+        """
+        Se reproduce el ETag de una subida multiparte de 8 MiB sin conocer el tamaño de parte.
+        """
+        part = 8 * 2**20
+        digests = b''.join(hashlib.md5(self.content[i:i + part]).digest() for i in range(0, len(self.content), part))
+        etag = f'"{hashlib.md5(digests).hexdigest()}-2"'
+        verifier = StreamVerifier(len(self.content), etag)
+        feed(verifier, self.content)
+        self.assertEqual(verifier.verify(), 'md5-multiparte')
+
+    def test_multiparte_alterado(self):
+        """
+        Un objeto multiparte de 8 MiB con bytes alterados se rechaza aunque el tamaño coincida.
+        """
+        part = 8 * 2**20
+        digests = b''.join(hashlib.md5(self.content[i:i + part]).digest() for i in range(0, len(self.content), part))
+        etag = f'"{hashlib.md5(digests).hexdigest()}-2"'
+        altered = self.content[:part + 10] + b'\x00' + self.content[part + 11:]
+        verifier = StreamVerifier(len(self.content), etag)
+        feed(verifier, altered)
+        with self.assertRaises(VerificationError):
+            verifier.verify()
+
+    def test_multiparte_sin_tamano_compatible(self):
+        """
+        Si ningún tamaño de parte habitual es compatible con la cantidad de partes, solo se verifica el tamaño.
+        """
+        verifier = StreamVerifier(len(self.content), f'"{hashlib.md5(b"").hexdigest()}-7"')
+        feed(verifier, self.content)
+        self.assertEqual(verifier.verify(), 'tamaño')
+
+    def test_contenido_alterado(self):
+        etag = hashlib.md5(self.content).hexdigest()
+        altered = self.content[:-1] + b'\x00'
+        verifier = StreamVerifier(len(self.content), etag)
+        feed(verifier, altered)
+        with self.assertRaises(VerificationError):
+            verifier.verify()
+
+    def test_truncado(self):
+        verifier = StreamVerifier(len(self.content), None)
+        feed(verifier, self.content[:-100])
+        with self.assertRaises(VerificationError):
+            verifier.verify()
+
+    def test_firma_invalida(self):
+        """
+        Un archivo que no es netCDF se rechaza con el primer bloque recibido.
+        """
+        verifier = StreamVerifier(len(self.content), None)
+        with self.assertRaises(VerificationError):
+            verifier.update(b'<?xml version="1.0"?><Error>')
+
+
+class TestCheckNetcdf(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.nc_file = os.path.join(self.tmpdir, 'OR_ABI-L1b-RadF-M6C13.nc')
+        with Dataset(self.nc_file, 'w') as nc:
+            nc.createDimension('y', 64)
+            nc.createDimension('x', 64)
+            rad = nc.createVariable('Rad', 'i2', ('y', 'x'), zlib=True, chunksizes=(16, 16))
+            rad.scale_factor = 0.0406
+            rad.add_offset = -1.6
+            rad[:] = np.arange(64 * 64).reshape(64, 64) % 4000
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_archivo_valido(self):
+        checkNetcdf(self.nc_file)
+
+    def test_archivo_truncado(self):
+        with open(self.nc_file, 'rb') as fp:
+            content = fp.read()
+        with open(self.nc_file, 'wb') as fp:
+            fp.write(content[:len(content) // 2])
+        with self.assertRaises(VerificationError):
+            checkNetcdf(self.nc_file)
+
+    def test_sin_variable(self):
+        with self.assertRaises(VerificationError):
+            checkNetcdf(self.nc_file, variable='CMI')
+
+
+if __name__ == '__main__':
+    unittest.main()